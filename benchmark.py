@@ -0,0 +1,377 @@
+#!/home/user/venv/bin/python
+"""Benchmark the statistics path on synthetic usage history.
+
+Fills a usage database with ``--years`` of Zipf-distributed usage over
+``--apps`` apps and times each stage of a statistics reload for the Week,
+Month, Year and Custom ranges, with a cold and a warm StatisticsCache.
+An ``icons`` section times building today's table from a cold start:
+with an empty icon disk cache, with the cache filled by a previous run,
+and from memory. Results are printed (or written with ``--output``) as
+JSON so runs from different commits can be compared.
+
+Runs headless on the offscreen Qt platform:
+
+    python benchmark.py --years 5 --apps 1000 --output bench.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from itertools import accumulate
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtWidgets  # noqa: E402
+
+from data_manager import DataManager  # noqa: E402
+
+RANGES = ("Week", "Month", "Year", "Custom")
+STAGES = ("query", "bucketing", "gap_fill", "chart", "table", "total")
+
+
+class ZipfUsageGenerator:
+    """Synthetic usage where the k-th most used app gets weight 1 / k**s."""
+
+    def __init__(self, apps=200, exponent=1.1, apps_per_day=25, seed=0):
+        self.rng = random.Random(seed)
+        self.names = [f"app{k:04d}" for k in range(1, apps + 1)]
+        weights = [1 / k**exponent for k in range(1, apps + 1)]
+        self.weight = dict(zip(self.names, weights))
+        self.cum_weights = list(accumulate(weights))
+        self.apps_per_day = apps_per_day
+
+    def day(self):
+        """Return {app: seconds} for one day."""
+        picks = self.rng.choices(
+            self.names,
+            cum_weights=self.cum_weights,
+            k=self.rng.randint(1, self.apps_per_day * 2),
+        )
+        chosen = set(picks)
+        total = self.rng.uniform(1, 10) * 3600
+        shares = {app: self.weight[app] * self.rng.uniform(0.5, 1.5) for app in chosen}
+        scale = total / sum(shares.values())
+        return {app: share * scale for app, share in shares.items()}
+
+    def fill(self, years, end=None):
+        """Write ``years`` of closed days ending at ``end`` (default: yesterday)."""
+        if end is None:
+            end = datetime.date.today() - datetime.timedelta(days=1)
+        day = end - datetime.timedelta(days=int(365 * years) - 1)
+        rows = 0
+        while day <= end:
+            iso = day.isoformat()
+            for app, seconds in self.day().items():
+                DataManager.add_daily_usage(app, seconds, iso)
+                rows += 1
+            day += datetime.timedelta(days=1)
+        DataManager.flush(wait=True)
+        return rows
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def _summary(samples):
+    # (the repo's own statistics.py shadows the stdlib module)
+    ordered = sorted(samples)
+    middle = len(ordered) // 2
+    median = (
+        ordered[middle]
+        if len(ordered) % 2
+        else (ordered[middle - 1] + ordered[middle]) / 2
+    )
+    return {
+        "median_ms": round(median, 3),
+        "min_ms": round(min(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+def _run_range(page, stats_mod, range_name, live_today, custom_days, repeat, warm):
+    today = datetime.date.today()
+    from_date, to_date, agg = stats_mod._range_for(
+        range_name,
+        today,
+        today - datetime.timedelta(days=custom_days - 1),
+        today,
+    )
+    history_to = min(to_date, today - datetime.timedelta(days=1))
+    samples = defaultdict(list)
+    app = QtWidgets.QApplication.instance()
+
+    if warm:
+        stats_mod._compute_history(from_date, history_to, agg)
+
+    for _ in range(repeat):
+        if not warm:
+            stats_mod.StatisticsCache.clear()
+        elapsed, _rows = _timed(
+            DataManager.get_daily_usage, from_date.isoformat(), to_date.isoformat()
+        )
+        samples["query"].append(elapsed)
+
+        elapsed, history = _timed(
+            stats_mod._compute_history, from_date, history_to, agg
+        )
+        samples["bucketing"].append(elapsed)
+
+        def gap_fill():
+            time_series = defaultdict(float, history[0])
+            per_app = defaultdict(float, history[1])
+            stats_mod._add_today(time_series, per_app, today, agg, live_today)
+            stats_mod._fill_gaps(
+                time_series,
+                max(from_date, history_to + datetime.timedelta(days=1)),
+                to_date,
+                agg,
+            )
+            return time_series, per_app
+
+        elapsed, (time_series, per_app) = _timed(gap_fill)
+        samples["gap_fill"].append(elapsed)
+
+        elapsed, _ = _timed(page._draw_chart, time_series)
+        samples["chart"].append(elapsed)
+
+        elapsed, _ = _timed(page._fill_table, per_app)
+        app.processEvents()
+        samples["table"].append(elapsed)
+
+        if not warm:
+            stats_mod.StatisticsCache.clear()
+        elapsed, _ = _timed(
+            stats_mod._compute_statistics, from_date, to_date, agg, live_today
+        )
+        samples["total"].append(elapsed)
+
+    return {
+        "from": from_date.isoformat(),
+        "to": to_date.isoformat(),
+        "aggregation": agg,
+        "stages": {stage: _summary(samples[stage]) for stage in STAGES},
+    }
+
+
+def _make_icon_files(directory, names):
+    """Write a 256x256 PNG per name, like the large icons themes ship."""
+    from PyQt5 import QtGui
+
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for k, name in enumerate(names):
+        image = QtGui.QImage(256, 256, QtGui.QImage.Format_ARGB32)
+        image.fill(QtGui.QColor.fromHsv(k * 37 % 360, 160, 220))
+        painter = QtGui.QPainter(image)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        painter.setBrush(QtGui.QColor.fromHsv(k * 53 % 360, 200, 120))
+        painter.drawEllipse(32, 32, 192, 192)
+        painter.end()
+        paths[name] = os.path.join(directory, f"{name}.png")
+        image.save(paths[name])
+    return paths
+
+
+def _run_icons(generator, count, mapped_share=0.8):
+    """Time today's table to first paint (``*_shown_ms``) and to full
+    icons: empty disk cache, filled disk cache (a restart) and memory.
+    ``mapped_share`` of the apps get an icon file through map.json; the
+    rest go through the lookup chain."""
+    from icon_cache import IconDiskCache
+    from icon_manager import ImprovedIconManager
+    from map_resolve import AppMapping
+    from usage_table import UsageTableModel
+
+    workdir = tempfile.mkdtemp(prefix="screentime-icons-")
+    try:
+        names = generator.names[:count]
+        mapped = names[: int(len(names) * mapped_share)]
+        icon_paths = _make_icon_files(os.path.join(workdir, "icons"), mapped)
+        mapping_path = os.path.join(workdir, "map.json")
+        with open(mapping_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    name: {"display_name": name, "icon": icon_paths[name]}
+                    for name in mapped
+                },
+                f,
+            )
+        usage = {name: generator.weight[name] * 3600 for name in names}
+        cache_path = os.path.join(workdir, "icons.sqlite")
+
+        def start():
+            # What a fresh process does: new mapping, manager and model.
+            manager = ImprovedIconManager(IconDiskCache(cache_path))
+            model = UsageTableModel(AppMapping(mapping_path), manager)
+            start = time.perf_counter()
+            model.set_usage(usage)
+            shown = time.perf_counter()
+            # Icons resolved in the background arrive via iconReady.
+            manager.wait_for_icons()
+            done = time.perf_counter()
+            return (shown - start) * 1000, (done - start) * 1000, manager, model
+
+        cold_shown_ms, cold_ms, manager, _ = start()
+        manager.disk_cache.close()
+        disk_shown_ms, disk_ms, manager, model = start()
+        disk_stats = manager.disk_cache.stats()
+        memory_ms, _ = _timed(model.invalidate)
+        return {
+            "apps": len(names),
+            "mapped": len(mapped),
+            "cold_shown_ms": round(cold_shown_ms, 2),
+            "cold_ms": round(cold_ms, 2),
+            "disk_cache_shown_ms": round(disk_shown_ms, 2),
+            "disk_cache_ms": round(disk_ms, 2),
+            "memory_ms": round(memory_ms, 2),
+            "disk_cache": disk_stats,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(args):
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    workdir = None
+    if args.db:
+        DataManager.DB_PATH = args.db
+    else:
+        workdir = tempfile.mkdtemp(prefix="screentime-bench-")
+        DataManager.DB_PATH = os.path.join(workdir, "usageData.db")
+    DataManager.initialize_database()
+
+    generator = ZipfUsageGenerator(
+        apps=args.apps,
+        exponent=args.zipf,
+        apps_per_day=args.apps_per_day,
+        seed=args.seed,
+    )
+    rows = 0
+    generate_ms = 0.0
+    if not args.no_generate:
+        generate_ms, rows = _timed(generator.fill, args.years)
+    live_today = generator.day()
+
+    # Imported after DB_PATH is set so nothing opens the real database.
+    import statistics as stats_mod
+    from history_store import get_history_store
+
+    from icon_manager import ImprovedIconManager
+    from map_resolve import AppMapping
+
+    store_ms = None
+    store = get_history_store()
+    if store is not None:
+        store_ms, _ = _timed(store.refresh)
+
+    mapping_path = os.path.join(workdir or tempfile.gettempdir(), "map.json")
+    page = stats_mod.StatisticsPage(
+        QtWidgets.QStackedWidget(),
+        ImprovedIconManager(),
+        AppMapping(mapping_path),
+        live_usage=lambda: live_today,
+    )
+    page._pool.waitForDone()
+    app.processEvents()
+
+    results = {}
+    for range_name in RANGES:
+        results[range_name] = {
+            mode: _run_range(
+                page,
+                stats_mod,
+                range_name,
+                live_today,
+                args.custom_days,
+                args.repeat,
+                warm=(mode == "warm"),
+            )
+            for mode in ("cold", "warm")
+        }
+    results["icons"] = _run_icons(generator, args.icon_apps)
+
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "years": args.years,
+            "apps": args.apps,
+            "zipf": args.zipf,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "rows": rows,
+            "generate_ms": round(generate_ms, 1),
+            "history_store_build_ms": (
+                round(store_ms, 1) if store_ms is not None else None
+            ),
+        },
+        "results": results,
+    }
+    DataManager.shutdown()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Statistics path benchmark")
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--apps", type=int, default=200)
+    parser.add_argument("--apps-per-day", type=int, default=25)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--custom-days", type=int, default=90, help="Length of the Custom range"
+    )
+    parser.add_argument(
+        "--icon-apps", type=int, default=100, help="Apps in the icon start-up run"
+    )
+    parser.add_argument(
+        "--db", help="Use this database instead of a temporary one (not cleared)"
+    )
+    parser.add_argument(
+        "--no-generate",
+        action="store_true",
+        help="Benchmark the existing --db without adding synthetic history",
+    )
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
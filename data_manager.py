@@ -1,9 +1,16 @@
 #!/home/user/venv/bin/python
+import atexit
 import datetime
 import logging
 import os
+import queue
 import sqlite3
 import sys
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
 
 if getattr(sys, "frozen", False):
     BASE_DIR = os.path.dirname(sys.executable)
@@ -23,70 +30,795 @@ logger.info("Starting...")
 # Database Manager
 ########################################################################
 
+# WAL lets the statistics readers work on a snapshot while the writer
+# commits; NORMAL sync is durable at checkpoints and safe in WAL mode.
+_WRITER_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+)
+_CONNECTION_PRAGMAS = (
+    "PRAGMA mmap_size=67108864",  # 64 MiB
+    "PRAGMA cache_size=-8000",  # ~8 MiB
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def week_key(date: datetime.date) -> str:
+    """ISO week bucket key, e.g. "2024-W07"."""
+    y, w, _ = date.isocalendar()
+    return f"{y}-W{w:02d}"
+
+
+def month_key(date: datetime.date) -> str:
+    return date.strftime("%Y-%m")
+
+
+# SQL expressions producing the same bucket keys as week_key/month_key for
+# a date column or value ``{d}``. The ISO week is the one containing the
+# Thursday of that week, whose year is also the ISO year.
+_SQL_BUCKET = {
+    "day": "{d}",
+    "week": (
+        "printf('%s-W%02d', strftime('%Y', {d}, '-3 days', 'weekday 4'), "
+        "(CAST(strftime('%j', {d}, '-3 days', 'weekday 4') AS INTEGER) - 1) / 7 + 1)"
+    ),
+    "month": "substr({d}, 1, 7)",
+}
+
+# Every day from :from to :to and the bucket it falls in, generated by SQLite.
+_SQL_CALENDAR = """
+    calendar(day) AS (
+        SELECT :from
+        UNION ALL
+        SELECT date(day, '+1 day') FROM calendar WHERE day < :to
+    ),
+    buckets(bucket, first_day, last_day) AS (
+        SELECT {bucket}, MIN(day), MAX(day)
+        FROM calendar
+        GROUP BY 1
+    )
+"""
+
+
+def _calendar_sql(aggregation):
+    return _SQL_CALENDAR.format(bucket=_SQL_BUCKET[aggregation].format(d="day"))
+
+
+class DatabaseWriter(threading.Thread):
+    """Owns the write connection and runs queued write commands in order.
+
+    Each command is a callable taking the connection; ``submit`` returns a
+    Future for its result so callers never touch SQLite on their own thread.
+    """
+
+    # Queue depth at which we start warning about a slow disk / locked database.
+    BACKLOG_WARNING = 100
+
+    def __init__(self, db_path):
+        super().__init__(name="DatabaseWriter", daemon=True)
+        self.db_path = db_path
+        self._queue: queue.Queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "max_queue_depth": 0,
+            "last_latency_ms": 0.0,
+            "max_latency_ms": 0.0,
+        }
+
+    def submit(self, command) -> Future:
+        future = Future()
+        self._queue.put((command, future, time.monotonic()))
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self._stats["submitted"] += 1
+            if depth > self._stats["max_queue_depth"]:
+                self._stats["max_queue_depth"] = depth
+        if depth >= self.BACKLOG_WARNING:
+            logger.warning("Datenbank-Schreibwarteschlange staut sich: %d", depth)
+        return future
+
+    def metrics(self) -> dict:
+        """Back-pressure metrics: queue depth, throughput and latencies."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
+
+    def stop(self, timeout=None):
+        self._queue.put(None)
+        self.join(timeout)
+
+    def run(self):
+        conn = sqlite3.connect(self.db_path)
+        for pragma in _WRITER_PRAGMAS + _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                command, future, queued_at = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = command(conn)
+                except Exception as exc:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    future.set_exception(exc)
+                    failed = True
+                else:
+                    future.set_result(result)
+                    failed = False
+                latency = (time.monotonic() - queued_at) * 1000
+                with self._stats_lock:
+                    self._stats["failed" if failed else "completed"] += 1
+                    self._stats["last_latency_ms"] = latency
+                    if latency > self._stats["max_latency_ms"]:
+                        self._stats["max_latency_ms"] = latency
+        finally:
+            conn.close()
+
+
+class ReadConnectionPool:
+    """A small pool of read-only connections reused across queries."""
+
+    def __init__(self, db_path, size=3):
+        self.db_path = db_path
+        self.size = size
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(
+            uri, uri=True, check_same_thread=False, isolation_level=None
+        )
+        for pragma in _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        return self._idle.get()
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._opened = 0
+
 
 class DataManager:
     DB_PATH = os.path.join(BASE_DIR, "usageData.db")
-    _conn: sqlite3.Connection = None  # persistent connection for hot-path writes
+    _writer: DatabaseWriter = None  # owns the only write connection
+    _read_pool: ReadConnectionPool = None
+
+    # Write-behind buffer: usage is accumulated per (date, app_name) and focus
+    # intervals are appended in memory, then written in one transaction every
+    # FLUSH_INTERVAL seconds or once FLUSH_MAX_ROWS rows are pending, instead
+    # of one commit per switch.
+    FLUSH_INTERVAL = 30.0
+    FLUSH_MAX_ROWS = 50
+    _pending: dict = {}
+    _pending_intervals: list = []
+    _pending_since: float = 0.0
+    _pending_lock = threading.Lock()
+
+    # FocusIntervals rows folded into DailyUsage per rollup transaction.
+    ROLLUP_BATCH = 5000
 
     @staticmethod
-    def _get_conn() -> sqlite3.Connection:
-        """Return (and lazily create) the persistent write connection."""
-        if DataManager._conn is None:
-            DataManager._conn = sqlite3.connect(
-                DataManager.DB_PATH, check_same_thread=False
+    def _get_writer() -> DatabaseWriter:
+        """Return (and lazily start) the database writer thread."""
+        if DataManager._writer is None:
+            DataManager._writer = DatabaseWriter(DataManager.DB_PATH)
+            DataManager._writer.start()
+        return DataManager._writer
+
+    @staticmethod
+    def _get_read_pool() -> ReadConnectionPool:
+        pool = DataManager._read_pool
+        if pool is None or pool.db_path != DataManager.DB_PATH:
+            if pool is not None:
+                pool.close()
+            pool = DataManager._read_pool = ReadConnectionPool(DataManager.DB_PATH)
+        return pool
+
+    @staticmethod
+    @contextmanager
+    def read_snapshot():
+        """Yield a pooled read-only connection inside one read transaction.
+
+        All queries issued through it see the same consistent snapshot and
+        never block (or get blocked by) the writer thread.
+        """
+        pool = DataManager._get_read_pool()
+        conn = pool.acquire()
+        try:
+            conn.execute("BEGIN")
+            yield conn
+        finally:
+            pool.release(conn)
+
+    @staticmethod
+    def submit_write(command) -> Future:
+        """Queue ``command(conn)`` on the writer thread."""
+        return DataManager._get_writer().submit(command)
+
+    @staticmethod
+    def writer_metrics() -> dict:
+        return DataManager._get_writer().metrics()
+
+    @staticmethod
+    def _create_schema(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS DailyUsage (
+                date TEXT NOT NULL,
+                app_name TEXT NOT NULL,
+                duration_seconds REAL NOT NULL,
+                PRIMARY KEY (date, app_name)
+            )
+        """)
+        # Append-only log of every focus interval; the rowid keeps inserts
+        # sequential and doubles as the rollup high-water mark.
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS FocusIntervals (
+                id INTEGER PRIMARY KEY,
+                start_ts REAL NOT NULL,
+                end_ts REAL NOT NULL,
+                app_key TEXT NOT NULL,
+                method TEXT
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS RollupState (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
             )
-        return DataManager._conn
+        """)
+        # Pre-aggregated totals for the Month/Year statistics, kept in step
+        # with DailyUsage by _upsert_daily.
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS WeeklyUsage (
+                week TEXT NOT NULL,
+                app_name TEXT NOT NULL,
+                duration_seconds REAL NOT NULL,
+                PRIMARY KEY (week, app_name)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS MonthlyUsage (
+                month TEXT NOT NULL,
+                app_name TEXT NOT NULL,
+                duration_seconds REAL NOT NULL,
+                PRIMARY KEY (month, app_name)
+            )
+        """)
+        conn.commit()
+        # Databases from before the rollup tables existed need one backfill.
+        built = conn.execute(
+            "SELECT value FROM RollupState WHERE name = 'period_rollups'"
+        ).fetchone()
+        if not built:
+            DataManager._rebuild_rollups(conn)
 
     @staticmethod
     def initialize_database():
         try:
-            conn = DataManager._get_conn()
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS DailyUsage (
-                    date TEXT NOT NULL,
-                    app_name TEXT NOT NULL,
-                    duration_seconds REAL NOT NULL,
-                    PRIMARY KEY (date, app_name)
-                )
-            """)
-            conn.commit()
+            DataManager.submit_write(DataManager._create_schema).result()
+            # Catch up on intervals logged before an unclean shutdown.
+            DataManager.submit_write(DataManager._rollup_intervals)
             logger.info("Datenbank initialisiert: %s", DataManager.DB_PATH)
         except Exception:
             logger.exception("Fehler bei der Initialisierung der Datenbank:")
 
+    @staticmethod
+    def configure(flush_interval=None, max_pending_rows=None):
+        """Change how long / how many rows usage may stay in the write buffer."""
+        if flush_interval is not None:
+            DataManager.FLUSH_INTERVAL = float(flush_interval)
+        if max_pending_rows is not None:
+            DataManager.FLUSH_MAX_ROWS = int(max_pending_rows)
+
     @staticmethod
     def add_daily_usage(app_name, seconds, date=None):
         if not date:
             date = datetime.date.today().isoformat()
-        conn = DataManager._get_conn()
-        conn.execute(
+        with DataManager._pending_lock:
+            if not DataManager._pending and not DataManager._pending_intervals:
+                DataManager._pending_since = time.monotonic()
+            key = (date, app_name)
+            DataManager._pending[key] = DataManager._pending.get(key, 0.0) + seconds
+        DataManager.maybe_flush()
+
+    @staticmethod
+    def add_focus_interval(app_key, start_ts, end_ts, method=None):
+        """Log that ``app_key`` had focus from ``start_ts`` to ``end_ts`` (epoch
+        seconds). DailyUsage is kept up to date from this log by the rollup."""
+        if end_ts <= start_ts:
+            return
+        with DataManager._pending_lock:
+            if not DataManager._pending and not DataManager._pending_intervals:
+                DataManager._pending_since = time.monotonic()
+            DataManager._pending_intervals.append((start_ts, end_ts, app_key, method))
+        DataManager.maybe_flush()
+
+    @staticmethod
+    def maybe_flush():
+        """Flush the write buffer if it is old enough or large enough."""
+        with DataManager._pending_lock:
+            pending = len(DataManager._pending) + len(DataManager._pending_intervals)
+            age = time.monotonic() - DataManager._pending_since
+        if pending and (
+            pending >= DataManager.FLUSH_MAX_ROWS or age >= DataManager.FLUSH_INTERVAL
+        ):
+            DataManager.flush()
+
+    @staticmethod
+    def flush(wait=False):
+        """Hand all buffered usage to the writer as a single transaction.
+
+        With ``wait=True`` block until it (and the rollup of any flushed
+        intervals) is committed, for readers that need up-to-date data.
+        """
+        with DataManager._pending_lock:
+            rows = [
+                (date, app_name, seconds)
+                for (date, app_name), seconds in DataManager._pending.items()
+            ]
+            intervals = DataManager._pending_intervals
+            DataManager._pending = {}
+            DataManager._pending_intervals = []
+        if not rows and not intervals:
+            if wait and DataManager._writer is not None:
+                # Still wait for flushes that are already queued.
+                DataManager.submit_write(lambda conn: None).result()
+            return None
+        future = DataManager.submit_write(
+            lambda conn: DataManager._write_batch(conn, rows, intervals)
+        )
+        if intervals:
+            future = DataManager.submit_write(DataManager._rollup_intervals)
+        if wait:
+            try:
+                future.result()
+            except Exception:
+                pass
+        return future
+
+    @staticmethod
+    def _upsert_daily(conn, rows):
+        """Add (date, app_name, seconds) rows to DailyUsage and the weekly and
+        monthly rollups, inside the caller's transaction."""
+        weekly = {}
+        monthly = {}
+        for date, app_name, seconds in rows:
+            week = (week_key(datetime.date.fromisoformat(date)), app_name)
+            month = (date[:7], app_name)
+            weekly[week] = weekly.get(week, 0.0) + seconds
+            monthly[month] = monthly.get(month, 0.0) + seconds
+        conn.executemany(
             """
             INSERT INTO DailyUsage (date, app_name, duration_seconds)
             VALUES (?, ?, ?)
             ON CONFLICT(date, app_name)
-            DO UPDATE SET duration_seconds = duration_seconds + ?
+            DO UPDATE SET duration_seconds = duration_seconds + excluded.duration_seconds
         """,
-            (date, app_name, seconds, seconds),
+            rows,
         )
-        conn.commit()
+        conn.executemany(
+            """
+            INSERT INTO WeeklyUsage (week, app_name, duration_seconds)
+            VALUES (?, ?, ?)
+            ON CONFLICT(week, app_name)
+            DO UPDATE SET duration_seconds = duration_seconds + excluded.duration_seconds
+        """,
+            [(w, app, sec) for (w, app), sec in weekly.items()],
+        )
+        conn.executemany(
+            """
+            INSERT INTO MonthlyUsage (month, app_name, duration_seconds)
+            VALUES (?, ?, ?)
+            ON CONFLICT(month, app_name)
+            DO UPDATE SET duration_seconds = duration_seconds + excluded.duration_seconds
+        """,
+            [(m, app, sec) for (m, app), sec in monthly.items()],
+        )
+        # Cached statistics over closed days key on this counter.
+        today = datetime.date.today().isoformat()
+        if any(date < today for date, _, _ in rows):
+            conn.execute("""
+                INSERT INTO RollupState (name, value) VALUES ('closed_days', 1)
+                ON CONFLICT(name) DO UPDATE SET value = value + 1
+            """)
+
+    @staticmethod
+    def _rebuild_rollups(conn):
+        """Recompute WeeklyUsage and MonthlyUsage from DailyUsage."""
+        rows = conn.execute(
+            "SELECT date, app_name, duration_seconds FROM DailyUsage"
+        ).fetchall()
+        weekly = {}
+        for date, app_name, seconds in rows:
+            key = (week_key(datetime.date.fromisoformat(date)), app_name)
+            weekly[key] = weekly.get(key, 0.0) + seconds
+        with conn:
+            conn.execute("DELETE FROM WeeklyUsage")
+            conn.execute("DELETE FROM MonthlyUsage")
+            conn.executemany(
+                "INSERT INTO WeeklyUsage (week, app_name, duration_seconds) "
+                "VALUES (?, ?, ?)",
+                [(w, app, sec) for (w, app), sec in weekly.items()],
+            )
+            conn.execute("""
+                INSERT INTO MonthlyUsage (month, app_name, duration_seconds)
+                SELECT substr(date, 1, 7), app_name, SUM(duration_seconds)
+                FROM DailyUsage
+                GROUP BY substr(date, 1, 7), app_name
+            """)
+            conn.execute("""
+                INSERT INTO RollupState (name, value) VALUES ('period_rollups', 1)
+                ON CONFLICT(name) DO UPDATE SET value = excluded.value
+            """)
+
+    @staticmethod
+    def rebuild_rollups():
+        """Repair the weekly/monthly rollups from DailyUsage (blocking)."""
+        DataManager.flush(wait=True)
+        DataManager.submit_write(DataManager._rebuild_rollups).result()
+
+    @staticmethod
+    def _write_batch(conn, rows, intervals):
+        try:
+            with conn:
+                if rows:
+                    DataManager._upsert_daily(conn, rows)
+                if intervals:
+                    conn.executemany(
+                        """
+                        INSERT INTO FocusIntervals (start_ts, end_ts, app_key, method)
+                        VALUES (?, ?, ?, ?)
+                    """,
+                        intervals,
+                    )
+        except Exception:
+            logger.exception("Fehler beim Schreiben der Nutzungsdaten:")
+            # Keep the rows so the next flush retries them.
+            with DataManager._pending_lock:
+                if not DataManager._pending and not DataManager._pending_intervals:
+                    DataManager._pending_since = time.monotonic()
+                for date, app_name, seconds in rows:
+                    key = (date, app_name)
+                    DataManager._pending[key] = (
+                        DataManager._pending.get(key, 0.0) + seconds
+                    )
+                DataManager._pending_intervals[:0] = intervals
+            raise
+
+    @staticmethod
+    def _split_by_day(start_ts, end_ts):
+        """Yield (local date, seconds) for each calendar day the interval spans."""
+        start = datetime.datetime.fromtimestamp(start_ts)
+        end = datetime.datetime.fromtimestamp(end_ts)
+        while start.date() < end.date():
+            midnight = datetime.datetime.combine(
+                start.date() + datetime.timedelta(days=1), datetime.time()
+            )
+            yield start.date().isoformat(), (midnight - start).total_seconds()
+            start = midnight
+        yield start.date().isoformat(), (end - start).total_seconds()
+
+    @staticmethod
+    def _rollup_intervals(conn):
+        """Fold FocusIntervals rows past the high-water mark into DailyUsage.
+
+        Each batch updates DailyUsage and the persisted mark in the same
+        transaction, so a restart resumes exactly where it stopped.
+        """
+        while True:
+            row = conn.execute(
+                "SELECT value FROM RollupState WHERE name = 'focus_intervals'"
+            ).fetchone()
+            mark = row[0] if row else 0
+            intervals = conn.execute(
+                """
+                SELECT id, start_ts, end_ts, app_key
+                FROM FocusIntervals
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            """,
+                (mark, DataManager.ROLLUP_BATCH),
+            ).fetchall()
+            if not intervals:
+                return
+            totals = {}
+            for _id, start_ts, end_ts, app_key in intervals:
+                for date, seconds in DataManager._split_by_day(start_ts, end_ts):
+                    if seconds > 0:
+                        key = (date, app_key)
+                        totals[key] = totals.get(key, 0.0) + seconds
+            with conn:
+                DataManager._upsert_daily(
+                    conn, [(d, app, sec) for (d, app), sec in totals.items()]
+                )
+                conn.execute(
+                    """
+                    INSERT INTO RollupState (name, value) VALUES ('focus_intervals', ?)
+                    ON CONFLICT(name) DO UPDATE SET value = excluded.value
+                """,
+                    (intervals[-1][0],),
+                )
+
+    @staticmethod
+    def shutdown():
+        """Flush the buffer, stop the writer thread and close read connections."""
+        DataManager.flush(wait=True)
+        if DataManager._writer is not None:
+            DataManager._writer.stop()
+            DataManager._writer = None
+        if DataManager._read_pool is not None:
+            DataManager._read_pool.close()
+            DataManager._read_pool = None
 
     @staticmethod
     def get_daily_usage(from_date, to_date):
-        conn = sqlite3.connect(DataManager.DB_PATH)
-        c = conn.cursor()
-        c.execute(
+        DataManager.flush(wait=True)
+        with DataManager.read_snapshot() as conn:
+            return conn.execute(
+                """
+                SELECT date, app_name, duration_seconds
+                FROM DailyUsage
+                WHERE date BETWEEN ? AND ?
+                ORDER BY date
+            """,
+                (from_date, to_date),
+            ).fetchall()
+
+    @staticmethod
+    def get_usage_totals(from_date, to_date, aggregation):
+        """Return ({bucket: seconds}, {app_name: seconds}) for ``from_date..to_date``.
+
+        ``aggregation`` is "day", "week" or "month". Bucketing, summing and
+        gap-filling all happen in SQLite: whole weeks/months come from the
+        rollup tables, partial buckets at the edges of the range are summed
+        from DailyUsage, and a generated calendar supplies every bucket in
+        the range (with 0 where nothing was used).
+        """
+        DataManager.flush(wait=True)
+        params = {"from": from_date.isoformat(), "to": to_date.isoformat()}
+
+        if aggregation == "day":
+            usage = """
+                SELECT date AS bucket, app_name, duration_seconds AS seconds
+                FROM DailyUsage
+                WHERE date BETWEEN :from AND :to
             """
-            SELECT date, app_name, duration_seconds
-            FROM DailyUsage
-            WHERE date BETWEEN ? AND ?
-            ORDER BY date
-        """,
-            (from_date, to_date),
-        )
-        rows = c.fetchall()
-        conn.close()
-        return rows
+        else:
+            if aggregation == "week":
+                table, column, key = "WeeklyUsage", "week", week_key
+                first_full = from_date + datetime.timedelta(
+                    days=-from_date.weekday() % 7
+                )
+                last_full = to_date - datetime.timedelta(
+                    days=(to_date.weekday() + 1) % 7
+                )
+            else:  # month
+                table, column, key = "MonthlyUsage", "month", month_key
+                first_full = from_date
+                if from_date.day != 1:
+                    first_full = (
+                        from_date.replace(day=28) + datetime.timedelta(days=4)
+                    ).replace(day=1)
+                last_full = to_date
+                next_day = to_date + datetime.timedelta(days=1)
+                if next_day.day != 1:
+                    last_full = to_date.replace(day=1) - datetime.timedelta(days=1)
+
+            usage = f"""
+                SELECT {_SQL_BUCKET[aggregation].format(d="date")} AS bucket,
+                       app_name, duration_seconds AS seconds
+                FROM DailyUsage
+                WHERE date BETWEEN :from AND :head_to
+                   OR date BETWEEN :tail_from AND :to
+            """
+            if first_full > last_full:
+                # No whole bucket in the range, everything is an edge.
+                params.update(head_to=params["to"], tail_from=params["to"])
+            else:
+                params.update(
+                    full_from=key(first_full),
+                    full_to=key(last_full),
+                    head_to=(first_full - datetime.timedelta(days=1)).isoformat(),
+                    tail_from=(last_full + datetime.timedelta(days=1)).isoformat(),
+                )
+                usage += f"""
+                UNION ALL
+                SELECT {column}, app_name, duration_seconds
+                FROM {table}
+                WHERE {column} BETWEEN :full_from AND :full_to
+                """
+
+        ctes = f"""
+            WITH RECURSIVE {_calendar_sql(aggregation)},
+            usage(bucket, app_name, seconds) AS ({usage})
+        """
+        with DataManager.read_snapshot() as conn:
+            time_series = dict(
+                conn.execute(
+                    ctes + """
+                    SELECT buckets.bucket, COALESCE(totals.seconds, 0)
+                    FROM buckets
+                    LEFT JOIN (
+                        SELECT bucket, SUM(seconds) AS seconds
+                        FROM usage
+                        GROUP BY bucket
+                    ) AS totals ON totals.bucket = buckets.bucket
+                """,
+                    params,
+                )
+            )
+            per_app = dict(
+                conn.execute(
+                    ctes + """
+                    SELECT app_name, SUM(seconds)
+                    FROM usage
+                    GROUP BY app_name
+                """,
+                    params,
+                )
+            )
+        return time_series, per_app
+
+    @staticmethod
+    def get_calendar(from_date, to_date, aggregation):
+        """Return [(bucket, first_day, last_day)] covering ``from_date..to_date``.
+
+        Uses the same generated calendar as get_usage_totals, so callers that
+        sum usage elsewhere get exactly its buckets, clipped to the range and
+        in order.
+        """
+        if from_date > to_date:
+            return []
+        with DataManager.read_snapshot() as conn:
+            rows = conn.execute(
+                f"""
+                WITH RECURSIVE {_calendar_sql(aggregation)}
+                SELECT bucket, first_day, last_day FROM buckets ORDER BY first_day
+            """,
+                {"from": from_date.isoformat(), "to": to_date.isoformat()},
+            ).fetchall()
+        return [
+            (
+                bucket,
+                datetime.date.fromisoformat(first),
+                datetime.date.fromisoformat(last),
+            )
+            for bucket, first, last in rows
+        ]
+
+    @staticmethod
+    def get_history_version():
+        """Counter bumped by every write to a day before today, to tell whether
+        cached aggregates over closed days are still current."""
+        with DataManager.read_snapshot() as conn:
+            row = conn.execute(
+                "SELECT value FROM RollupState WHERE name = 'closed_days'"
+            ).fetchone()
+        return row[0] if row else 0
 
     @staticmethod
     def get_data_version():
-        return os.path.getmtime(DataManager.DB_PATH)
+        # In WAL mode commits land in the -wal file until a checkpoint.
+        version = os.path.getmtime(DataManager.DB_PATH)
+        wal = DataManager.DB_PATH + "-wal"
+        if os.path.exists(wal):
+            version = max(version, os.path.getmtime(wal))
+        return version
+
+
+# Don't lose buffered usage when the interpreter exits normally.
+atexit.register(DataManager.shutdown)
+
+
+def _benchmark_reads(db_path, queries=200):
+    """Compare the old per-query connection in rollback-journal mode with
+    pooled read connections on a WAL database."""
+    import random
+    import shutil
+    import tempfile
+
+    tmp = tempfile.mkdtemp()
+    legacy = os.path.join(tmp, "legacy.db")
+    shutil.copy(db_path, legacy)
+    conn = sqlite3.connect(legacy)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
+
+    (last,) = (
+        sqlite3.connect(legacy).execute("SELECT MAX(date) FROM DailyUsage").fetchone()
+    )
+    end = datetime.date.fromisoformat(last)
+    ranges = []
+    for _ in range(queries):
+        days = random.choice((6, 30, 365))
+        ranges.append(((end - datetime.timedelta(days=days)).isoformat(), last))
+
+    sql = (
+        "SELECT date, app_name, duration_seconds FROM DailyUsage "
+        "WHERE date BETWEEN ? AND ? ORDER BY date"
+    )
+    start = time.perf_counter()
+    for lo, hi in ranges:
+        c = sqlite3.connect(legacy)
+        c.execute(sql, (lo, hi)).fetchall()
+        c.close()
+    before = (time.perf_counter() - start) / queries * 1000
+
+    DataManager.DB_PATH = os.path.join(tmp, "wal.db")
+    shutil.copy(db_path, DataManager.DB_PATH)
+    DataManager.initialize_database()
+    start = time.perf_counter()
+    for lo, hi in ranges:
+        DataManager.get_daily_usage(lo, hi)
+    after = (time.perf_counter() - start) / queries * 1000
+    DataManager.shutdown()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"fresh connection, rollback journal: {before:.3f} ms/query")
+    print(f"pooled connection, WAL:             {after:.3f} ms/query")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Usage database tools")
+    parser.add_argument(
+        "--bench-reads",
+        action="store_true",
+        help="Compare query latency of fresh vs pooled read connections",
+    )
+    parser.add_argument(
+        "--rebuild-rollups",
+        action="store_true",
+        help="Rebuild WeeklyUsage and MonthlyUsage from DailyUsage",
+    )
+    parser.add_argument("--db", default=DataManager.DB_PATH, help="Database to use")
+    args = parser.parse_args()
+
+    if args.bench_reads:
+        _benchmark_reads(args.db)
+    elif args.rebuild_rollups:
+        DataManager.DB_PATH = args.db
+        DataManager.initialize_database()
+        DataManager.rebuild_rollups()
+        print("Rollups rebuilt.")
+    else:
+        parser.print_help()
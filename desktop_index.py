@@ -0,0 +1,409 @@
+#!/home/user/venv/bin/python
+"""Index of installed .desktop entries, persisted between runs.
+
+window_resolver and icon_manager both look applications up by their
+.desktop files. This module parses them once and pickles the result to
+~/.cache/screentime/desktop_index.pickle. On the next start only files
+whose mtime or size changed are parsed again. While running, the
+application directories' mtimes are re-checked at most every
+RECHECK_INTERVAL seconds, so newly installed apps show up without a
+restart.
+"""
+
+import configparser
+import logging
+import os
+import pickle
+import re
+import shlex
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Desktop dirs to search for .desktop files on Linux (include flatpak export dirs)
+DESKTOP_DIRS: List[str] = [
+    os.path.expanduser("~/.local/share/applications"),
+    "/usr/share/applications",
+    "/usr/local/share/applications",
+    "/var/lib/flatpak/exports/share/applications",
+    os.path.expanduser("~/.local/share/flatpak/exports/share/applications"),
+]
+
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "screentime"
+)
+CACHE_PATH = os.path.join(CACHE_DIR, "desktop_index.pickle")
+
+_FORMAT_VERSION = 1
+
+# %f, %U, %i, ... (see the Desktop Entry spec); %% is a literal percent.
+_FIELD_CODE = re.compile(r"%%|%[a-zA-Z]")
+
+# Launchers that run the program given after their own options, mapped to
+# the options that take a separate value.
+_WRAPPERS = {
+    "env": {"-u", "--unset", "-C", "--chdir", "-S", "--split-string"},
+    "nice": {"-n", "--adjustment"},
+    "ionice": {"-c", "--class", "-n", "--classdata", "-t"},
+    "taskset": set(),
+    "gamemoderun": set(),
+    "mangohud": set(),
+    "prime-run": set(),
+    "primusrun": set(),
+    "optirun": set(),
+    "firejail": set(),
+    "pkexec": {"--user"},
+    "steam-run": set(),
+    "exec": set(),  # in sh -c "exec ..."
+}
+_SHELLS = frozenset({"sh", "bash", "dash", "zsh"})
+# Interpreters whose process shows up under their own name; the script
+# they run is indexed as well.
+_INTERPRETERS = re.compile(r"^(python[0-9.]*|perl|ruby|node|java|mono|wine(64)?)$")
+_FLATPAK_VALUE_OPTIONS = frozenset({"--command", "--branch", "--arch", "--runtime"})
+
+
+class DesktopEntry(NamedTuple):
+    path: str
+    name: str
+    exec: str
+    icon: str
+    startup_wm_class: str
+    # False when the file has no [Desktop Entry] group or failed to parse.
+    valid: bool
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def file_id(self) -> str:
+        """File name without the .desktop suffix."""
+        return self.filename[:-8]
+
+
+def parse_desktop_file(path: str) -> DesktopEntry:
+    try:
+        cp = configparser.ConfigParser(interpolation=None)
+        cp.read(path, encoding="utf-8")
+        if "Desktop Entry" in cp:
+            entry = cp["Desktop Entry"]
+            return DesktopEntry(
+                path,
+                entry.get("Name", "").strip(),
+                entry.get("Exec", "").strip(),
+                entry.get("Icon", "").strip(),
+                entry.get("StartupWMClass", "").strip(),
+                True,
+            )
+    except Exception:
+        logger.debug("Cannot parse .desktop file %s", path, exc_info=True)
+    return DesktopEntry(path, "", "", "", "", False)
+
+
+def _split_exec(exec_line: str) -> List[str]:
+    line = _FIELD_CODE.sub(lambda m: "%" if m.group() == "%%" else "", exec_line)
+    try:
+        return shlex.split(line)
+    except ValueError:
+        return line.split()
+
+
+def _program_names(path: str) -> List[str]:
+    """Lower-cased ``path``, its basename and the basename without suffix."""
+    path = path.lower()
+    basename = os.path.basename(path)
+    names = [path, basename]
+    stem, suffix = os.path.splitext(basename)
+    if suffix[1:].isalpha():
+        names.append(stem)  # "foo.appimage" -> "foo", but not "gimp-2.10"
+    return [name for name in names if name]
+
+
+def _flatpak_names(args: List[str]) -> List[str]:
+    """Names for ``flatpak run [options] APP-ID ...``: the --command and
+    the application id with its last component."""
+    names: List[str] = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg.startswith("--command="):
+            names += _program_names(arg.split("=", 1)[1])
+        elif arg in _FLATPAK_VALUE_OPTIONS:
+            if arg == "--command" and i + 1 < len(args):
+                names += _program_names(args[i + 1])
+            i += 1
+        elif not arg.startswith("-"):
+            app_id = arg.lower().split("//", 1)[0]  # APP-ID//BRANCH
+            names += [app_id, app_id.rsplit(".", 1)[-1]]
+            break
+        i += 1
+    return names
+
+
+def exec_program_names(exec_line: str, _depth: int = 0) -> List[str]:
+    """Lower-cased paths and names of the programs an Exec line starts.
+
+    Field codes are dropped. ``env`` with its assignments and launch
+    wrappers like ``gamemoderun`` are skipped, ``sh -c "..."`` is parsed
+    recursively, ``flatpak run`` yields the application id and --command,
+    and for shells and interpreters the script is used instead.
+    """
+    return command_program_names(_split_exec(exec_line), _depth)
+
+
+def command_program_names(argv: List[str], _depth: int = 0) -> List[str]:
+    """Like exec_program_names, for an already split command line."""
+    args = list(argv)
+    names: List[str] = []
+    while args:
+        program, args = args[0], args[1:]
+        if "=" in program and not program.startswith("/"):
+            continue  # VAR=value after env
+        basename = os.path.basename(program).lower()
+        if basename in _WRAPPERS:
+            value_options = _WRAPPERS[basename]
+            while args and (args[0].startswith("-") or "=" in args[0]):
+                option = args.pop(0)
+                if option in value_options and args:
+                    args.pop(0)
+            continue
+        if basename == "flatpak" and args and args[0] == "run":
+            names += _flatpak_names(args[1:])
+            break
+        if basename == "snap" and args and args[0] == "run":
+            args = args[1:]
+            continue
+        if basename in _SHELLS and len(args) >= 2 and args[0] == "-c":
+            if _depth < 3:
+                names += exec_program_names(args[1], _depth + 1)
+        elif basename in _SHELLS or _INTERPRETERS.match(basename):
+            # The interpreter itself would match every script it runs.
+            script = next((arg for arg in args if not arg.startswith("-")), None)
+            if script:
+                names += _program_names(script)
+            else:
+                names += _program_names(program)
+        else:
+            names += _program_names(program)
+        break
+    return list(dict.fromkeys(names))
+
+
+class DesktopIndex:
+    RECHECK_INTERVAL = 5.0
+
+    def __init__(self, dirs: Optional[List[str]] = None, cache_path=None):
+        self.dirs = list(DESKTOP_DIRS if dirs is None else dirs)
+        self.cache_path = cache_path or CACHE_PATH
+        self._lock = threading.RLock()
+        # dir -> mtime_ns (None if missing)
+        self._dir_mtimes: Dict[str, Optional[int]] = {}
+        # dir -> {path: (mtime_ns, size, DesktopEntry)}
+        self._files: Dict[str, Dict[str, tuple]] = {}
+        self._entries: Optional[List[DesktopEntry]] = None
+        self._by_path: Dict[str, DesktopEntry] = {}
+        # program name -> entries, built on first use per generation
+        self._by_exec: Optional[Dict[str, List[DesktopEntry]]] = None
+        self._checked = 0.0
+        self.generation = 0
+        self.parsed = 0
+        self._load()
+        self._refresh(full=True)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "rb") as f:
+                data = pickle.load(f)
+            if data.get("version") != _FORMAT_VERSION:
+                return
+            self._dir_mtimes = {d: m for d, m in data["dirs"].items() if d in self.dirs}
+            self._files = {
+                d: {
+                    path: (mtime, size, DesktopEntry(*entry))
+                    for path, (mtime, size, entry) in files.items()
+                }
+                for d, files in data["files"].items()
+                if d in self.dirs
+            }
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logger.info("Desktop index cache unreadable, rebuilding")
+            self._dir_mtimes = {}
+            self._files = {}
+
+    def _save(self):
+        data = {
+            "version": _FORMAT_VERSION,
+            "dirs": self._dir_mtimes,
+            "files": {
+                d: {
+                    path: (mtime, size, tuple(entry))
+                    for path, (mtime, size, entry) in files.items()
+                }
+                for d, files in self._files.items()
+            },
+        }
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            logger.debug("Cannot write desktop index cache", exc_info=True)
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _mtime(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _scan_dir(self, d: str) -> bool:
+        """Re-list ``d``, parsing new or modified files. Returns True on change."""
+        old = self._files.get(d, {})
+        new: Dict[str, tuple] = {}
+        changed = False
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    if not entry.name.endswith(".desktop"):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    known = old.get(entry.path)
+                    if known and known[0] == st.st_mtime_ns and known[1] == st.st_size:
+                        new[entry.path] = known
+                        continue
+                    self.parsed += 1
+                    new[entry.path] = (
+                        st.st_mtime_ns,
+                        st.st_size,
+                        parse_desktop_file(entry.path),
+                    )
+                    changed = True
+        except OSError:
+            pass
+        if old.keys() - new.keys():
+            changed = True
+        self._files[d] = new
+        return changed
+
+    def _refresh(self, full: bool = False):
+        """Rescan directories whose mtime changed (every directory if ``full``,
+        which also catches files edited in place)."""
+        changed = False
+        for d in self.dirs:
+            mtime = self._mtime(d)
+            if not full and mtime == self._dir_mtimes.get(d, -1):
+                continue
+            self._dir_mtimes[d] = mtime
+            if mtime is None:
+                changed |= bool(self._files.pop(d, None))
+                continue
+            changed |= self._scan_dir(d)
+        self._checked = time.monotonic()
+        if changed or self._entries is None:
+            self._entries = [
+                entry
+                for d in self.dirs
+                for _, (_, _, entry) in sorted(self._files.get(d, {}).items())
+            ]
+            self._by_path = {entry.path: entry for entry in self._entries}
+            self._by_exec = None
+            self.generation += 1
+        if changed:
+            self._save()
+
+    def refresh(self, force: bool = False):
+        with self._lock:
+            if force or time.monotonic() - self._checked >= self.RECHECK_INTERVAL:
+                self._refresh(full=force)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def entries(self) -> List[DesktopEntry]:
+        """All entries, in DESKTOP_DIRS order (sorted by file within a dir)."""
+        self.refresh()
+        return self._entries
+
+    def snapshot(self) -> Tuple[int, List[DesktopEntry]]:
+        """``(generation, entries())`` of the same refresh, for callers that
+        cache results per generation."""
+        with self._lock:
+            entries = self.entries()
+            return self.generation, entries
+
+    def find_by_exec(self, program: str) -> List[DesktopEntry]:
+        """Entries whose Exec line starts ``program`` (a path or a name,
+        matched case-insensitively; see exec_program_names)."""
+        # Under the lock, so a refresh on another thread can't slip in
+        # between reading the entries and storing the table built from them.
+        with self._lock:
+            entries = self.entries()
+            by_exec = self._by_exec
+            if by_exec is None:
+                by_exec = {}
+                for entry in entries:
+                    if entry.exec:
+                        for name in exec_program_names(entry.exec):
+                            by_exec.setdefault(name, []).append(entry)
+                self._by_exec = by_exec
+        return by_exec.get(program.lower(), [])
+
+    def get(self, path) -> DesktopEntry:
+        """The entry for ``path``, parsed directly if it is not indexed."""
+        path = str(path)
+        entry = self._by_path.get(path)
+        return entry if entry is not None else parse_desktop_file(path)
+
+
+_index: Optional[DesktopIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_desktop_index() -> DesktopIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DesktopIndex()
+        return _index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=".desktop entry index")
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Ignore the cache and parse all"
+    )
+    args = parser.parse_args()
+
+    if args.rebuild:
+        try:
+            os.remove(CACHE_PATH)
+        except OSError:
+            pass
+    start = time.perf_counter()
+    index = DesktopIndex()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(
+        f"{len(index.entries())} entries in {elapsed:.1f} ms "
+        f"({index.parsed} parsed, cache {index.cache_path})"
+    )
@@ -0,0 +1,415 @@
+#!/home/user/venv/bin/python
+"""Memory-mapped columnar cache of closed days from DailyUsage.
+
+The store is a day x app matrix of cumulative (prefix) sums, so the usage of
+any app over any day range is ``P[last] - P[first - 1]``. Column 0 holds the
+running total of all apps. Only days before today are stored; they never
+change, so new days are appended as they close and nothing is rewritten.
+
+Files (next to usageData.db):
+    usageHistory.bin   float64 rows of (app_capacity + 1) prefix sums
+    usageHistory.json  first day, number of days, app list and capacity
+"""
+
+import datetime
+import json
+import logging
+import mmap
+import os
+import threading
+from array import array
+from typing import Dict, Optional, Tuple
+
+from data_manager import DataManager
+
+logger = logging.getLogger(__name__)
+
+_ITEM_SIZE = array("d").itemsize
+_FORMAT_VERSION = 1
+
+
+class HistoryStore:
+    # Closed days re-checked against DailyUsage on every refresh; an interval
+    # running over midnight can still land on yesterday after it was stored.
+    VERIFY_DAYS = 2
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        base = os.path.splitext(db_path)[0].replace("usageData", "usageHistory")
+        if base == os.path.splitext(db_path)[0]:
+            base += "-history"
+        self.bin_path = base + ".bin"
+        self.meta_path = base + ".json"
+        self._lock = threading.Lock()
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+        self.first_day: Optional[datetime.date] = None
+        self.n_days = 0
+        self.apps: list = []
+        self.app_index: Dict[str, int] = {}
+        self.capacity = 0
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+
+    @property
+    def _row_len(self) -> int:
+        return self.capacity + 1
+
+    @property
+    def last_day(self) -> Optional[datetime.date]:
+        if self.first_day is None or not self.n_days:
+            return None
+        return self.first_day + datetime.timedelta(days=self.n_days - 1)
+
+    def _load(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != _FORMAT_VERSION or not meta["first_day"]:
+                return
+            expected = meta["n_days"] * (meta["capacity"] + 1) * _ITEM_SIZE
+            if os.path.getsize(self.bin_path) != expected:
+                logger.info("History store size mismatch, rebuilding")
+                return
+            self.first_day = datetime.date.fromisoformat(meta["first_day"])
+            self.n_days = meta["n_days"]
+            self.capacity = meta["capacity"]
+            self.apps = list(meta["apps"])
+            self.app_index = {app: i for i, app in enumerate(self.apps)}
+            self._map()
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logger.exception("Failed to load history store")
+            self._reset()
+
+    def _reset(self):
+        self._unmap()
+        self.first_day = None
+        self.n_days = 0
+        self.apps = []
+        self.app_index = {}
+        self.capacity = 0
+
+    def _map(self):
+        self._unmap()
+        if not self.n_days:
+            return
+        self._file = open(self.bin_path, "r+b")
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._view = memoryview(self._mmap).cast("d")
+
+    def _unmap(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _save_meta(self):
+        meta = {
+            "version": _FORMAT_VERSION,
+            "first_day": self.first_day.isoformat() if self.first_day else None,
+            "n_days": self.n_days,
+            "capacity": self.capacity,
+            "apps": self.apps,
+        }
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.meta_path)
+
+    def close(self):
+        with self._lock:
+            self._unmap()
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _daily_rows(from_date: datetime.date, to_date: datetime.date):
+        """Group DailyUsage rows by day: {date: [(app, seconds), ...]}."""
+        days: Dict[datetime.date, list] = {}
+        for date, app, seconds in DataManager.get_daily_usage(
+            from_date.isoformat(), to_date.isoformat()
+        ):
+            days.setdefault(datetime.date.fromisoformat(date), []).append(
+                (app, seconds)
+            )
+        return days
+
+    def _rows(self, start_row, days, first_day, n_days, previous):
+        """Yield prefix rows for ``n_days`` days starting at ``first_day``."""
+        row = array("d", previous)
+        for i in range(n_days):
+            day = first_day + datetime.timedelta(days=start_row + i)
+            for app, seconds in days.get(day, ()):
+                row[0] += seconds
+                row[self.app_index[app] + 1] += seconds
+            yield row
+
+    def rebuild(self, last_day: datetime.date):
+        """Rebuild the whole store from DailyUsage up to ``last_day``."""
+        with self._lock:
+            self._rebuild(last_day)
+
+    def _rebuild(self, last_day: datetime.date):
+        with DataManager.read_snapshot() as conn:
+            first, apps = conn.execute(
+                "SELECT MIN(date), COUNT(DISTINCT app_name) FROM DailyUsage "
+                "WHERE date <= ?",
+                (last_day.isoformat(),),
+            ).fetchone()
+        if not first:
+            # Nothing to store yet; only touch the files if something was.
+            if self.first_day is not None or os.path.exists(self.bin_path):
+                self._reset()
+                if os.path.exists(self.bin_path):
+                    os.remove(self.bin_path)
+                self._save_meta()
+            return
+
+        self._unmap()
+        self.apps = []
+        self.app_index = {}
+
+        self.first_day = datetime.date.fromisoformat(first)
+        self.n_days = (last_day - self.first_day).days + 1
+        # Leave room so new apps rarely force a rebuild.
+        self.capacity = max(16, apps * 2)
+        days = self._daily_rows(self.first_day, last_day)
+        for entries in days.values():
+            for app, _ in entries:
+                if app not in self.app_index:
+                    self.app_index[app] = len(self.apps)
+                    self.apps.append(app)
+
+        tmp = self.bin_path + ".tmp"
+        with open(tmp, "wb") as f:
+            zeros = array("d", bytes(self._row_len * _ITEM_SIZE))
+            for row in self._rows(0, days, self.first_day, self.n_days, zeros):
+                row.tofile(f)
+        os.replace(tmp, self.bin_path)
+        self._save_meta()
+        self._map()
+
+    def _drop_stale_tail(self):
+        """Truncate the last stored days if DailyUsage no longer matches them."""
+        if not self.n_days:
+            return
+        first_row = max(0, self.n_days - self.VERIFY_DAYS)
+        since = self.first_day + datetime.timedelta(days=first_row)
+        DataManager.flush(wait=True)
+        with DataManager.read_snapshot() as conn:
+            sums = dict(
+                conn.execute(
+                    "SELECT date, SUM(duration_seconds) FROM DailyUsage "
+                    "WHERE date BETWEEN ? AND ? GROUP BY date",
+                    (since.isoformat(), self.last_day.isoformat()),
+                ).fetchall()
+            )
+        for row in range(first_row, self.n_days):
+            day = self.first_day + datetime.timedelta(days=row)
+            stored = self._prefix(row, 0) - self._prefix(row - 1, 0)
+            if abs(stored - sums.get(day.isoformat(), 0.0)) > 1e-6:
+                logger.info("History store outdated from %s, re-appending", day)
+                self._unmap()
+                with open(self.bin_path, "r+b") as f:
+                    f.truncate(row * self._row_len * _ITEM_SIZE)
+                self.n_days = row
+                self._save_meta()
+                self._map()
+                return
+
+    def refresh(self, last_day: Optional[datetime.date] = None):
+        """Append days that closed since the last refresh (default: up to yesterday)."""
+        if last_day is None:
+            last_day = datetime.date.today() - datetime.timedelta(days=1)
+        with self._lock:
+            if self.first_day is None:
+                self._rebuild(last_day)
+                return
+            self._drop_stale_tail()
+            current = self.last_day
+            if current is not None and current >= last_day:
+                return
+            start = (current or self.first_day - datetime.timedelta(days=1)) + (
+                datetime.timedelta(days=1)
+            )
+            days = self._daily_rows(start, last_day)
+            new_apps = {
+                app
+                for entries in days.values()
+                for app, _ in entries
+                if app not in self.app_index
+            }
+            if len(self.apps) + len(new_apps) > self.capacity:
+                # Row width changes, lay the whole file out again.
+                self._rebuild(last_day)
+                return
+            for app in sorted(new_apps):
+                self.app_index[app] = len(self.apps)
+                self.apps.append(app)
+
+            if self.n_days:
+                offset = (self.n_days - 1) * self._row_len
+                previous = array("d", self._view[offset : offset + self._row_len])
+            else:
+                previous = array("d", bytes(self._row_len * _ITEM_SIZE))
+            added = (last_day - start).days + 1
+            self._unmap()
+            with open(self.bin_path, "ab") as f:
+                for row in self._rows(
+                    self.n_days, days, self.first_day, added, previous
+                ):
+                    row.tofile(f)
+            self.n_days += added
+            self._save_meta()
+            self._map()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    @property
+    def version(self) -> tuple:
+        """Changes whenever a stored day is added or re-appended."""
+        with self._lock:
+            total = self._prefix(self.n_days - 1, 0) if self._view is not None else 0.0
+            return self.n_days, len(self.apps), total
+
+    def covers(self, to_date: datetime.date) -> bool:
+        last = self.last_day
+        return last is not None and to_date <= last
+
+    def _prefix(self, row: int, column: int) -> float:
+        if row < 0:
+            return 0.0
+        return self._view[row * self._row_len + column]
+
+    def totals(
+        self, from_date: datetime.date, to_date: datetime.date, aggregation: str
+    ) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """Same result as DataManager.get_usage_totals, from prefix sums."""
+        calendar = DataManager.get_calendar(from_date, to_date, aggregation)
+        with self._lock:
+            first = (from_date - self.first_day).days
+            last = (to_date - self.first_day).days
+            # One prefix-sum difference per bucket, days before first_day are 0.
+            time_series: Dict[str, float] = {}
+            for bucket, bucket_first, bucket_last in calendar:
+                lo = max((bucket_first - self.first_day).days, 0) - 1
+                hi = (bucket_last - self.first_day).days
+                time_series[bucket] = (
+                    self._prefix(hi, 0) - self._prefix(lo, 0) if hi >= 0 else 0.0
+                )
+
+            per_app: Dict[str, float] = {}
+            lo = max(first, 0) - 1
+            if last >= 0:
+                for i, app in enumerate(self.apps):
+                    seconds = self._prefix(last, i + 1) - self._prefix(lo, i + 1)
+                    if seconds:
+                        per_app[app] = seconds
+            return time_series, per_app
+
+
+_store: Optional[HistoryStore] = None
+_store_failed = False
+
+
+def get_history_store() -> Optional[HistoryStore]:
+    """Return the shared store for DataManager.DB_PATH, or None if unusable."""
+    global _store, _store_failed
+    if _store_failed:
+        return None
+    if _store is None or _store.db_path != DataManager.DB_PATH:
+        try:
+            _store = HistoryStore(DataManager.DB_PATH)
+        except Exception:
+            logger.exception("History store unavailable, using SQL")
+            _store_failed = True
+            return None
+    return _store
+
+
+def _benchmark(years: int, apps: int, queries: int = 20):
+    """Compare range queries on the SQL path with the prefix-sum store."""
+    import random
+    import shutil
+    import tempfile
+    import time
+
+    tmp = tempfile.mkdtemp()
+    store = None
+    try:
+        DataManager.DB_PATH = os.path.join(tmp, "usageData.db")
+        DataManager.initialize_database()
+        end = datetime.date.today() - datetime.timedelta(days=1)
+        start = end - datetime.timedelta(days=365 * years)
+        day = start
+        while day <= end:
+            for app in random.sample(range(apps), min(apps, 40)):
+                DataManager.add_daily_usage(
+                    f"app{app}", random.random() * 3600, day.isoformat()
+                )
+            day += datetime.timedelta(days=1)
+        DataManager.flush(wait=True)
+
+        store = HistoryStore(DataManager.DB_PATH)
+        t = time.perf_counter()
+        store.refresh(end)
+        print(f"build: {time.perf_counter() - t:.3f} s ({store.n_days} days)")
+
+        for label, days, agg in (
+            ("Week", 6, "day"),
+            ("Month", 30, "week"),
+            ("Year", 365, "month"),
+        ):
+            lo = end - datetime.timedelta(days=days)
+            t = time.perf_counter()
+            for _ in range(queries):
+                DataManager.get_usage_totals(lo, end, agg)
+            sql = (time.perf_counter() - t) / queries * 1000
+            t = time.perf_counter()
+            for _ in range(queries):
+                store.totals(lo, end, agg)
+            mm = (time.perf_counter() - t) / queries * 1000
+            print(f"{label:5}  sql {sql:8.2f} ms   store {mm:8.2f} ms")
+    finally:
+        if store is not None:
+            store.close()
+        DataManager.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Columnar usage history store")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the store")
+    parser.add_argument(
+        "--bench", action="store_true", help="Benchmark against the SQL path"
+    )
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--apps", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.bench:
+        _benchmark(args.years, args.apps)
+    elif args.rebuild:
+        DataManager.initialize_database()
+        store = HistoryStore(DataManager.DB_PATH)
+        store.rebuild(datetime.date.today() - datetime.timedelta(days=1))
+        print(f"Rebuilt {store.n_days} days x {len(store.apps)} apps")
+    else:
+        parser.print_help()
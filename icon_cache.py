@@ -0,0 +1,200 @@
+#!/home/user/venv/bin/python
+"""Rendered app icons, kept on disk between runs.
+
+ImprovedIconManager resolves an icon through theme lookups, .desktop
+files and running processes. This cache stores the outcome per (app name,
+icon hint): where the icon came from, that source's mtime, and the icon
+rasterized to a PNG at table size. On the next start a still valid entry
+is turned into an icon without repeating the lookup.
+
+All rows are read with one query on first use. The file is capped at
+MAX_BYTES of PNG data; the least recently used entries are evicted.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+
+from desktop_index import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.path.join(CACHE_DIR, "icons.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS icons (
+    app TEXT NOT NULL,
+    hint TEXT NOT NULL,
+    source TEXT NOT NULL,
+    source_mtime INTEGER NOT NULL,
+    png BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (app, hint)
+)
+"""
+
+
+class CachedIcon(NamedTuple):
+    source: str
+    source_mtime: int
+    png: bytes
+
+
+class IconDiskCache:
+    MAX_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.path = path or CACHE_PATH
+        self.max_bytes = self.MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._rows: Optional[Dict[Tuple[str, str], CachedIcon]] = None
+        self._last_used: Dict[Tuple[str, str], float] = {}
+        # Hits not yet written back; flushed with the next write.
+        self._touched: Set[Tuple[str, str]] = set()
+        self.hits = 0
+        self.misses = 0
+
+    def _open(self) -> bool:
+        if self._rows is not None:
+            return self._conn is not None
+        self._rows = {}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            rows = conn.execute(
+                "SELECT app, hint, source, source_mtime, png, last_used FROM icons"
+            ).fetchall()
+        except sqlite3.Error:
+            logger.warning("Icon cache %s unusable, icons are not cached", self.path)
+            return False
+        for app, hint, source, source_mtime, png, last_used in rows:
+            self._rows[app, hint] = CachedIcon(source, source_mtime, png)
+            self._last_used[app, hint] = last_used
+        self._conn = conn
+        return True
+
+    def get(self, app: str, hint: Optional[str]) -> Optional[CachedIcon]:
+        key = (app, hint or "")
+        with self._lock:
+            if not self._open():
+                return None
+            entry = self._rows.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched.add(key)
+            return entry
+
+    def put(self, app: str, hint: Optional[str], source: str, source_mtime, png):
+        key = (app, hint or "")
+        now = time.time()
+        with self._lock:
+            if not self._open():
+                return
+            self._rows[key] = CachedIcon(source, source_mtime, png)
+            self._last_used[key] = now
+            self._touched.discard(key)
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO icons VALUES (?, ?, ?, ?, ?, ?)",
+                        (key[0], key[1], source, source_mtime, png, now),
+                    )
+                    self._write_touched(now)
+                    self._evict()
+            except sqlite3.Error:
+                logger.debug("Cannot write icon cache", exc_info=True)
+
+    def discard(self, app: str, hint: Optional[str]):
+        """Forget the entry, e.g. because its source changed."""
+        key = (app, hint or "")
+        with self._lock:
+            if not self._open() or self._rows.pop(key, None) is None:
+                return
+            self._last_used.pop(key, None)
+            self._touched.discard(key)
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "DELETE FROM icons WHERE app = ? AND hint = ?", key
+                    )
+            except sqlite3.Error:
+                logger.debug("Cannot write icon cache", exc_info=True)
+
+    def _write_touched(self, now: float):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE icons SET last_used = ? WHERE app = ? AND hint = ?",
+                [(now, app, hint) for app, hint in self._touched],
+            )
+            for key in self._touched:
+                self._last_used[key] = now
+            self._touched.clear()
+
+    def _evict(self):
+        size = sum(len(entry.png) for entry in self._rows.values())
+        if size <= self.max_bytes:
+            return
+        evicted = []
+        for key in sorted(self._rows, key=self._last_used.__getitem__):
+            if size <= self.max_bytes:
+                break
+            size -= len(self._rows.pop(key).png)
+            del self._last_used[key]
+            evicted.append(key)
+        self._conn.executemany("DELETE FROM icons WHERE app = ? AND hint = ?", evicted)
+
+    def flush(self):
+        """Write back pending last-used times."""
+        with self._lock:
+            if self._conn is None or not self._touched:
+                return
+            try:
+                with self._conn:
+                    self._write_touched(time.time())
+            except sqlite3.Error:
+                logger.debug("Cannot write icon cache", exc_info=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._rows or {}
+            return {
+                "entries": len(rows),
+                "bytes": sum(len(entry.png) for entry in rows.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rendered icon cache")
+    parser.add_argument("--clear", action="store_true", help="Delete the cache")
+    args = parser.parse_args()
+
+    if args.clear:
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(CACHE_PATH + suffix)
+            except OSError:
+                pass
+    cache = IconDiskCache()
+    with cache._lock:
+        cache._open()
+    print(cache.path, cache.stats())
@@ -1,111 +1,79 @@
 #!/home/user/venv/bin/python
-import configparser
 import logging
 import os
-import re
+import threading
+import time
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
-import psutil
-from PyQt5 import QtWidgets
-from PyQt5.QtGui import QIcon
-
-logger = logging.getLogger(__name__)
-
-# Desktop dirs to search for .desktop files on Linux (include flatpak export dirs)
-DESKTOP_DIRS: List[Path] = [
-    Path.home() / ".local" / "share" / "applications",
-    Path("/usr/share/applications"),
-    Path("/usr/local/share/applications"),
-    Path("/var/lib/flatpak/exports/share/applications"),
-    Path.home() / ".local" / "share" / "flatpak" / "exports" / "share" / "applications",
-]
+from PyQt5 import QtCore, QtWidgets
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice
+from PyQt5.QtGui import QIcon, QPixmap
 
+from desktop_index import command_program_names, get_desktop_index
+from icon_cache import IconDiskCache
+from icon_theme import IconThemeIndex, get_icon_theme
+from process_index import ProcInfo, get_process_index
 
-def _parse_desktop_file(path: Path) -> dict:
-    """Return keys 'Exec', 'Icon', 'Name', 'StartupWMClass' when present."""
-    result = {}
-    try:
-        cp = configparser.ConfigParser(interpolation=None)
-        cp.read(path, encoding="utf-8")
-        if "Desktop Entry" in cp:
-            entry = cp["Desktop Entry"]
-            for k in ("Exec", "Icon", "Name", "StartupWMClass"):
-                if k in entry:
-                    result[k] = entry[k].strip()
-    except Exception:
-        logger.exception("Fehler beim Parsen der .desktop-Datei %s", path)
-    return result
+logger = logging.getLogger(__name__)
 
+# Icon plus where it came from: a file path, or THEME_PREFIX + theme/name.
+IconSource = Tuple[QIcon, str]
+THEME_PREFIX = "theme:"
+# Edge length icons are rasterized at for the disk cache (16px table icons
+# at up to 2x scaling).
+PIXMAP_SIZE = 32
 
-# Module-level cache: maps app_key -> list of matching .desktop Paths.
-# Also caches the full directory scan so we only glob once per session.
-_desktop_all_entries: Optional[List[tuple]] = None  # list of (Path, dict)
+# Module-level cache: maps app_key -> list of matching .desktop Paths. It is
+# cleared whenever the desktop index picks up installed/removed apps. The
+# icon workers share it, so it is only touched under _desktop_key_lock.
 _desktop_key_cache: dict = {}  # app_key -> List[Path]
-
-
-def _get_all_desktop_entries() -> List[tuple]:
-    """Scan all DESKTOP_DIRS once and cache the results."""
-    global _desktop_all_entries
-    if _desktop_all_entries is not None:
-        return _desktop_all_entries
-    entries = []
-    seen = set()
-    for d in DESKTOP_DIRS:
-        try:
-            if not d.exists():
-                continue
-            for p in d.glob("*.desktop"):
-                if str(p) in seen:
-                    continue
-                seen.add(str(p))
-                info = _parse_desktop_file(p)
-                entries.append((p, info))
-        except Exception:
-            logger.exception("Fehler beim Scannen von %s", d)
-    _desktop_all_entries = entries
-    return entries
+_desktop_key_generation = None
+_desktop_key_lock = threading.Lock()
 
 
 def _find_desktop_entries_by_key(app_key: str) -> List[Path]:
     if not app_key:
         return []
+    generation, entries = get_desktop_index().snapshot()
+    with _desktop_key_lock:
+        return _match_desktop_entries(app_key, generation, entries)
+
+
+def _match_desktop_entries(app_key: str, generation: int, entries) -> List[Path]:
+    global _desktop_key_generation
+    if _desktop_key_generation != generation:
+        _desktop_key_cache.clear()
+        _desktop_key_generation = generation
     if app_key in _desktop_key_cache:
         return _desktop_key_cache[app_key]
 
     app_key_lower = app_key.lower()
     candidates: List[Path] = []
 
-    # 1) direct filename match (app_key.desktop), check quickly before full scan
-    for d in DESKTOP_DIRS:
-        try:
-            if not d.exists():
-                continue
-            p = d / f"{app_key}.desktop"
-            if p.exists():
-                candidates.append(p)
-        except Exception:
-            continue
+    # 1) direct filename match (app_key.desktop)
+    filename = f"{app_key}.desktop"
+    for entry in entries:
+        if entry.filename == filename:
+            candidates.append(Path(entry.path))
     if candidates:
         _desktop_key_cache[app_key] = candidates
         return candidates
 
-    # 2) search the cached full scan
-    for p, info in _get_all_desktop_entries():
-        name = info.get("Name", "")
-        if name and name.lower() == app_key_lower:
+    # 2) search all indexed entries
+    for entry in entries:
+        p = Path(entry.path)
+        if entry.name and entry.name.lower() == app_key_lower:
             candidates.append(p)
             continue
-        swc = info.get("StartupWMClass", "")
-        if swc and swc.lower() == app_key_lower:
+        if entry.startup_wm_class and entry.startup_wm_class.lower() == app_key_lower:
             candidates.append(p)
             continue
-        fname = p.stem.lower()
+        fname = entry.file_id.lower()
         if app_key_lower in fname or fname.startswith(app_key_lower):
             candidates.append(p)
             continue
-        execv = info.get("Exec", "")
-        if execv and app_key_lower in execv.lower():
+        if entry.exec and app_key_lower in entry.exec.lower():
             candidates.append(p)
             continue
 
@@ -113,77 +81,54 @@ def _find_desktop_entries_by_key(app_key: str) -> List[Path]:
     return candidates
 
 
-def _icon_from_desktop_entry(desktop_path: Path) -> Optional[QIcon]:
-    info = _parse_desktop_file(desktop_path)
-    icon_val = info.get("Icon")
+def _desktop_icon_candidates(desktop_path: Path) -> List[str]:
+    icon_val = get_desktop_index().get(desktop_path).icon
     if not icon_val:
-        return None
+        return []
 
+    candidates = []
     try:
         icon_path = Path(icon_val)
         if icon_path.is_absolute() and icon_path.exists():
-            q = QIcon(str(icon_path))
-            if not q.isNull():
-                return q
+            candidates.append(str(icon_path))
         candidate = desktop_path.parent / icon_val
         if candidate.exists():
-            q = QIcon(str(candidate))
-            if not q.isNull():
-                return q
-    except Exception:
-        pass
-
-    try:
-        name = icon_val
-        q = QIcon.fromTheme(name)
-        if not q.isNull():
-            return q
-    except Exception:
-        logger.exception("Fehler beim Laden von Theme-Icon für %s", icon_val)
-
-    try:
-        base = Path(icon_val).stem
-        q = QIcon.fromTheme(base)
-        if not q.isNull():
-            return q
+            candidates.append(str(candidate))
     except Exception:
         pass
-
-    return None
+    candidates.append(THEME_PREFIX + icon_val)
+    candidates.append(THEME_PREFIX + Path(icon_val).stem)
+    return candidates
 
 
-def _get_icon_for_proc(proc: psutil.Process) -> Optional[QIcon]:
+def _desktop_entries_for_proc(proc: ProcInfo) -> List[Path]:
+    """.desktop files whose Exec line starts this process, best match first:
+    the exe path, its name, the program/script from the command line, and
+    finally the process name."""
+    index = get_desktop_index()
+    names = []
+    if proc.exe:
+        names += [proc.exe, Path(proc.exe).name]
+    if proc.cmdline:
+        names += command_program_names(proc.cmdline.split())
+    if proc.name:
+        names.append(proc.name)
+    matches = {}
+    for name in names:
+        for entry in index.find_by_exec(name):
+            matches.setdefault(entry.path, Path(entry.path))
+    return list(matches.values())
+
+
+def _proc_icon_candidates(proc: ProcInfo) -> List[str]:
+    candidates = []
     try:
-        pexe = None
-        try:
-            pexe = proc.exe()
-        except Exception:
-            try:
-                pexe = os.readlink(f"/proc/{proc.pid}/exe")
-            except Exception:
-                pexe = None
-
-        basename = Path(pexe).name if pexe else (proc.name() or "")
-        desktop_matches = []
-        for d in DESKTOP_DIRS:
-            if not d.exists():
-                continue
-            for p in d.glob("*.desktop"):
-                info = _parse_desktop_file(p)
-                exec_val = info.get("Exec", "")
-                exec_clean = re.sub(r"%\w", "", exec_val).strip()
-                if pexe and pexe in exec_clean:
-                    desktop_matches.append(p)
-                elif basename and basename in exec_clean:
-                    desktop_matches.append(p)
-        for d in desktop_matches:
-            q = _icon_from_desktop_entry(d)
-            if q and not q.isNull():
-                return q
+        pexe = proc.exe
+        basename = Path(pexe).name if pexe else (proc.name or "")
+        for d in _desktop_entries_for_proc(proc):
+            candidates += _desktop_icon_candidates(d)
         if basename:
-            q = QIcon.fromTheme(Path(basename).stem)
-            if not q.isNull():
-                return q
+            candidates.append(THEME_PREFIX + Path(basename).stem)
 
         if pexe:
             p = Path(pexe).parent
@@ -191,19 +136,173 @@ def _get_icon_for_proc(proc: psutil.Process) -> Optional[QIcon]:
             for ext in ("png", "svg", "xpm", "ico"):
                 candidate = p / f"{stem}.{ext}"
                 if candidate.exists():
-                    q = QIcon(str(candidate))
-                    if not q.isNull():
-                        return q
+                    candidates.append(str(candidate))
     except Exception:
         logger.exception(
             "Fehler beim Laden des Icons für Prozess %s", getattr(proc, "pid", "n/a")
         )
-    return None
+    return candidates
+
+
+def _has_file(candidates: List[str]) -> bool:
+    return any(not c.startswith(THEME_PREFIX) for c in candidates)
+
+
+def _resolve_theme_names(
+    candidates: List[str], theme: Optional[IconThemeIndex]
+) -> List[str]:
+    """Replace THEME_PREFIX names by the theme index's file, dropping names
+    the theme lacks. Without a usable index (no theme directories, e.g. on
+    Windows) the names are left for QIcon.fromTheme."""
+    if theme is None or not theme.available:
+        return candidates
+    resolved = []
+    for candidate in candidates:
+        if candidate.startswith(THEME_PREFIX):
+            path = theme.lookup(candidate[len(THEME_PREFIX) :], PIXMAP_SIZE)
+            if path:
+                resolved.append(path)
+        else:
+            resolved.append(candidate)
+    return resolved
+
+
+def _icon_candidates(
+    app_name: str, icon_hint: Optional[str], theme: Optional[IconThemeIndex] = None
+) -> List[str]:
+    """Possible icon sources for ``app_name``, best first: existing files,
+    or THEME_PREFIX + an icon name ``theme`` could not resolve. Touches no
+    Qt objects, so it can run on a worker thread.
+
+    Later stages are skipped once a file was found, because the first file
+    always loads and nothing after it would be used.
+    """
+    candidates: List[str] = []
+    if icon_hint:
+        try:
+            p = Path(icon_hint)
+            if not p.is_absolute():
+                p = Path(__file__).parent / p
+            if p.exists():
+                return [str(p)]
+        except Exception:
+            logger.exception("Could not load mapped icon: %s", icon_hint)
+        candidates = _resolve_theme_names([THEME_PREFIX + icon_hint], theme)
+        if _has_file(candidates):
+            return candidates
+
+    # 2) treat as .desktop id / name / StartupWMClass
+    for d in _find_desktop_entries_by_key(app_name):
+        candidates += _desktop_icon_candidates(d)
+    candidates = _resolve_theme_names(candidates, theme)
+    if _has_file(candidates):
+        return candidates
+
+    # 3) try processes (match name, exe basename or stem)
+    index = get_process_index()
+    for proc in index.find(app_name) if index is not None else ():
+        candidates += _proc_icon_candidates(proc)
+    candidates = _resolve_theme_names(candidates, theme)
+    if _has_file(candidates):
+        return candidates
+
+    # 4) try the theme using app_name or its stem
+    candidates.append(THEME_PREFIX + app_name)
+    candidates.append(THEME_PREFIX + Path(app_name).stem)
+    return list(dict.fromkeys(_resolve_theme_names(candidates, theme)))
+
+
+def _file_icon(path: Path) -> Optional[IconSource]:
+    q = QIcon(str(path))
+    return (q, str(path)) if not q.isNull() else None
+
+
+def _theme_icon(name: str) -> Optional[IconSource]:
+    q = QIcon.fromTheme(name)
+    if q.isNull():
+        return None
+    return q, f"{THEME_PREFIX}{QIcon.themeName()}/{name}"
+
+
+def _load_candidate(candidate: str) -> Optional[IconSource]:
+    """Load a candidate from _icon_candidates (GUI thread only)."""
+    try:
+        if candidate.startswith(THEME_PREFIX):
+            return _theme_icon(candidate[len(THEME_PREFIX) :])
+        return _file_icon(Path(candidate))
+    except Exception:
+        logger.exception("Fehler beim Laden von Icon %s", candidate)
+        return None
+
+
+def _theme_mtime() -> int:
+    """Newest mtime of the current and the hicolor theme directories."""
+    newest = 0
+    for root in QIcon.themeSearchPaths():
+        for theme in (QIcon.themeName(), "hicolor"):
+            for path in (
+                os.path.join(root, theme),
+                os.path.join(root, theme, "icon-theme.cache"),
+            ):
+                try:
+                    newest = max(newest, os.stat(path).st_mtime_ns)
+                except OSError:
+                    pass
+    return newest
+
+
+class _IconSignals(QtCore.QObject):
+    # (app name, icon hint or "", candidate list)
+    resolved = QtCore.pyqtSignal(str, str, object)
+
+
+class _IconWorker(QtCore.QRunnable):
+    """Runs _icon_candidates for one app off the GUI thread."""
+
+    def __init__(self, app_name: str, icon_hint: str, theme_name: str):
+        super().__init__()
+        self.signals = _IconSignals()
+        self.app_name = app_name
+        self.icon_hint = icon_hint
+        self.theme_name = theme_name
 
+    def run(self):
+        try:
+            candidates = _icon_candidates(
+                self.app_name, self.icon_hint or None, get_icon_theme(self.theme_name)
+            )
+        except Exception:
+            logger.exception("Fehler bei der Icon-Suche für %s", self.app_name)
+            candidates = []
+        self.signals.resolved.emit(self.app_name, self.icon_hint, candidates)
+
+
+class ImprovedIconManager(QtCore.QObject):
+    """Icons for apps, looked up without blocking the GUI thread.
 
-class ImprovedIconManager:
-    def __init__(self):
+    get_icon_for_app answers from memory or the disk cache, and otherwise
+    returns a placeholder and queues the lookup on a worker pool (once per
+    app, however often it is asked). When the icon is found, iconReady is
+    emitted and the next get_icon_for_app call returns it. Apps without an
+    icon keep the placeholder and are looked up again after NEGATIVE_TTL.
+    """
+
+    # (app name, icon hint or "")
+    iconReady = QtCore.pyqtSignal(str, str)
+
+    NEGATIVE_TTL = 300
+
+    def __init__(self, disk_cache: Optional[IconDiskCache] = None, parent=None):
+        super().__init__(parent)
         self.app_icons: dict[str, QIcon] = {}
+        self.disk_cache = IconDiskCache() if disk_cache is None else disk_cache
+        self._theme_mtime: Optional[int] = None
+        # (app, hint) -> monotonic time until which the miss is remembered
+        self._misses: Dict[Tuple[str, str], float] = {}
+        self._pending: Set[Tuple[str, str]] = set()
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(2)
+        self._placeholder: Optional[QIcon] = None
 
     def _cache_icon(self, identifier: str, qicon: QIcon):
         self.app_icons[identifier] = qicon
@@ -211,88 +310,111 @@ class ImprovedIconManager:
     def _get_cached(self, identifier: str) -> Optional[QIcon]:
         return self.app_icons.get(identifier)
 
+    def placeholder(self) -> QIcon:
+        if self._placeholder is None:
+            self._placeholder = QtWidgets.QApplication.style().standardIcon(
+                QtWidgets.QStyle.SP_FileIcon
+            )
+        return self._placeholder
+
+    # ------------------------------------------------------------------
+    # Disk cache
+    # ------------------------------------------------------------------
+
+    def _source_mtime(self, source: str) -> Optional[int]:
+        if source.startswith(THEME_PREFIX):
+            theme = source[len(THEME_PREFIX) :].partition("/")[0]
+            if theme != QIcon.themeName():
+                return None
+            if self._theme_mtime is None:
+                self._theme_mtime = _theme_mtime()
+            return self._theme_mtime
+        try:
+            return os.stat(source).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load_from_disk(self, app_name: str, icon_hint: Optional[str]):
+        entry = self.disk_cache.get(app_name, icon_hint)
+        if entry is None:
+            return None
+        pixmap = QPixmap()
+        stale = self._source_mtime(entry.source) != entry.source_mtime
+        if stale or not pixmap.loadFromData(entry.png, "PNG"):
+            self.disk_cache.discard(app_name, icon_hint)
+            return None
+        return QIcon(pixmap)
+
+    def _save_to_disk(self, app_name, icon_hint, found: IconSource):
+        icon, source = found
+        source_mtime = self._source_mtime(source)
+        pixmap = icon.pixmap(PIXMAP_SIZE, PIXMAP_SIZE)
+        if source_mtime is None or pixmap.isNull():
+            return
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.WriteOnly)
+        if pixmap.save(buffer, "PNG"):
+            self.disk_cache.put(app_name, icon_hint, source, source_mtime, bytes(data))
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
     def get_icon_for_app(self, app_name: str, icon_hint: Optional[str] = None) -> QIcon:
         try:
             if not app_name:
-                return QtWidgets.QApplication.style().standardIcon(
-                    QtWidgets.QStyle.SP_FileIcon
-                )
+                return self.placeholder()
 
             # 1) cache
             cache_key = f"{app_name}|{icon_hint or ''}"
             cached = self._get_cached(cache_key)
             if cached and not cached.isNull():
                 return cached
-            if icon_hint:
-                try:
-                    p = Path(icon_hint)
-                    if not p.is_absolute():
-                        p = Path(__file__).parent / p
-                    if p.exists():
-                        q = QIcon(str(p))
-                        if not q.isNull():
-                            self._cache_icon(cache_key, q)
-                            return q
-
-                    q = QIcon.fromTheme(icon_hint)
-                    if not q.isNull():
-                        self._cache_icon(cache_key, q)
-                        return q
-
-                except Exception:
-                    logger.exception("Could not load mapped icon: %s", icon_hint)
-
-            # 2) treat as .desktop id / name / StartupWMClass
-            desktop_entries = _find_desktop_entries_by_key(app_name)
-            for d in desktop_entries:
-                q = _icon_from_desktop_entry(d)
-                if q and not q.isNull():
-                    self._cache_icon(cache_key, q)
-                    return q
-
-            # 3) try processes (match name or basename)
-            for proc in psutil.process_iter(["name", "exe", "cmdline"]):
-                try:
-                    pname = proc.info.get("name") or ""
-                    pexe = proc.info.get("exe") or ""
-                    if not pname and not pexe:
-                        continue
-                    # compare case-insensitive to app_name
-                    if (
-                        pname.lower() == app_name.lower()
-                        or Path(pexe).stem.lower() == app_name.lower()
-                    ):
-                        q = _get_icon_for_proc(proc)
-                        if q and not q.isNull():
-                            self._cache_icon(cache_key, q)
-                            return q
-                except Exception:
-                    continue
-
-            # 4) try QIcon.fromTheme using app_name or its stem
-            try:
-                q = QIcon.fromTheme(app_name)
-                if q and not q.isNull():
-                    self._cache_icon(cache_key, q)
-                    return q
-                q2 = QIcon.fromTheme(Path(app_name).stem)
-                if q2 and not q2.isNull():
-                    self._cache_icon(cache_key, q2)
-                    return q2
-            except Exception:
-                logger.exception("Fehler beim Laden von Theme-Icon für %s", app_name)
-
-            # 5) final fallback: standard icon
-            fallback = QtWidgets.QApplication.style().standardIcon(
-                QtWidgets.QStyle.SP_FileIcon
-            )
-            self._cache_icon(cache_key, fallback)
-            return fallback
+            cached = self._load_from_disk(app_name, icon_hint)
+            if cached is not None:
+                self._cache_icon(cache_key, cached)
+                return cached
+
+            key = (app_name, icon_hint or "")
+            if self._misses.get(key, 0) <= time.monotonic():
+                self._request(key)
+            return self.placeholder()
 
         except Exception:
             logger.exception(
                 "Fehler in ImprovedIconManager.get_icon_for_app für %s", app_name
             )
-            return QtWidgets.QApplication.style().standardIcon(
-                QtWidgets.QStyle.SP_FileIcon
-            )
+            return self.placeholder()
+
+    def _request(self, key: Tuple[str, str]):
+        if key in self._pending:
+            return
+        self._pending.add(key)
+        # Qt knows the desktop's theme; ask it here, on the GUI thread.
+        worker = _IconWorker(*key, QIcon.themeName())
+        worker.signals.resolved.connect(self._on_resolved)
+        self._pool.start(worker)
+
+    def _on_resolved(self, app_name: str, icon_hint: str, candidates):
+        key = (app_name, icon_hint)
+        self._pending.discard(key)
+        for candidate in candidates:
+            found = _load_candidate(candidate)
+            if found:
+                break
+        else:
+            # Not stored on disk, so an app installed later still gets its
+            # icon; looked up again after NEGATIVE_TTL.
+            self._misses[key] = time.monotonic() + self.NEGATIVE_TTL
+            return
+        self._misses.pop(key, None)
+        self._save_to_disk(app_name, icon_hint or None, found)
+        self._cache_icon(f"{app_name}|{icon_hint}", found[0])
+        self.iconReady.emit(app_name, icon_hint)
+
+    def wait_for_icons(self):
+        """Block until all queued lookups are done and delivered."""
+        while self._pending:
+            self._pool.waitForDone()
+            QtCore.QCoreApplication.processEvents()
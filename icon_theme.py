@@ -0,0 +1,415 @@
+#!/home/user/venv/bin/python
+"""Index of the installed icon themes, persisted between runs.
+
+Replaces probing QIcon.fromTheme for every candidate name. The active
+theme, the themes it inherits from and hicolor are read from their
+index.theme files, and every icon directory is listed once. An icon name
+is then resolved to a file for a requested size with the lookup rules of
+the freedesktop Icon Theme spec, from memory.
+
+Directory listings are pickled per theme to
+~/.cache/screentime/icon_theme-<theme>.pickle with the directories'
+mtimes; on the next start only directories whose mtime changed are
+listed again.
+"""
+
+import configparser
+import logging
+import os
+import pickle
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from desktop_index import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 2
+_EXTENSIONS = (".png", ".svg", ".xpm")
+
+
+def _data_dirs() -> List[str]:
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    data_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+    return [data_home] + [d for d in data_dirs.split(":") if d]
+
+
+def default_base_dirs() -> List[str]:
+    """Icon theme base directories in lookup order (including flatpak's
+    exported icons)."""
+    dirs = [os.path.expanduser("~/.icons")]
+    dirs += [os.path.join(d, "icons") for d in _data_dirs()]
+    dirs += [
+        "/var/lib/flatpak/exports/share/icons",
+        os.path.expanduser("~/.local/share/flatpak/exports/share/icons"),
+    ]
+    return list(dict.fromkeys(dirs))
+
+
+PIXMAP_DIRS = ["/usr/share/pixmaps"]
+
+
+def default_theme_name() -> str:
+    """The GTK icon theme from settings.ini, or hicolor.
+
+    Used when Qt does not report a theme (e.g. on the offscreen platform).
+    """
+    config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    for version in ("gtk-4.0", "gtk-3.0"):
+        cp = configparser.ConfigParser(interpolation=None)
+        try:
+            cp.read(os.path.join(config_home, version, "settings.ini"))
+            name = cp.get("Settings", "gtk-icon-theme-name", fallback="").strip()
+        except configparser.Error:
+            continue
+        if name:
+            return name
+    return "hicolor"
+
+
+def cache_path_for(theme: str) -> str:
+    return os.path.join(CACHE_DIR, f"icon_theme-{theme}.pickle")
+
+
+class ThemeDir(NamedTuple):
+    subdir: str
+    size: int
+    scale: int
+    type: str
+    min_size: int
+    max_size: int
+    threshold: int
+
+    def distance(self, size: int) -> int:
+        """DirectorySizeDistance from the Icon Theme spec (scale 1)."""
+        scale = self.scale
+        if self.type == "Fixed":
+            return abs(self.size * scale - size)
+        if self.type == "Scalable":
+            low, high = self.min_size * scale, self.max_size * scale
+        else:
+            low = (self.size - self.threshold) * scale
+            high = (self.size + self.threshold) * scale
+        if size < low:
+            return self.min_size * scale - size
+        if size > high:
+            return size - self.max_size * scale
+        return 0
+
+
+def parse_index_theme(path: str) -> Tuple[List[str], List[ThemeDir]]:
+    """Return (inherited theme names, icon directories) of an index.theme."""
+    cp = configparser.ConfigParser(interpolation=None, strict=False)
+    try:
+        cp.read(path, encoding="utf-8")
+    except configparser.Error:
+        logger.debug("Cannot parse %s", path, exc_info=True)
+        return [], []
+    if "Icon Theme" not in cp:
+        return [], []
+    main = cp["Icon Theme"]
+    inherits = [t.strip() for t in main.get("Inherits", "").split(",") if t.strip()]
+    names = main.get("Directories", "").split(",")
+    names += main.get("ScaledDirectories", "").split(",")
+    dirs = []
+    for name in dict.fromkeys(n.strip() for n in names if n.strip()):
+        if name not in cp:
+            continue
+        section = cp[name]
+        try:
+            size = int(section.get("Size", "0"))
+            dirs.append(
+                ThemeDir(
+                    name,
+                    size,
+                    int(section.get("Scale", "1")),
+                    section.get("Type", "Threshold").strip(),
+                    int(section.get("MinSize", str(size))),
+                    int(section.get("MaxSize", str(size))),
+                    int(section.get("Threshold", "2")),
+                )
+            )
+        except ValueError:
+            continue
+    return inherits, dirs
+
+
+def _icon_name(value: str) -> str:
+    """Icon names sometimes carry an extension (Icon=foo.png)."""
+    base, ext = os.path.splitext(value)
+    return base if ext.lower() in _EXTENSIONS else value
+
+
+class IconThemeIndex:
+    RECHECK_INTERVAL = 30.0
+
+    def __init__(
+        self,
+        theme: Optional[str] = None,
+        base_dirs: Optional[List[str]] = None,
+        pixmap_dirs: Optional[List[str]] = None,
+        cache_path: Optional[str] = None,
+    ):
+        self.theme = theme or default_theme_name()
+        self.base_dirs = list(default_base_dirs() if base_dirs is None else base_dirs)
+        self.pixmap_dirs = list(PIXMAP_DIRS if pixmap_dirs is None else pixmap_dirs)
+        self.cache_path = cache_path or cache_path_for(self.theme)
+        self._lock = threading.RLock()
+        # index.theme path -> (mtime_ns, inherits, dirs)
+        self._theme_files: Dict[str, tuple] = {}
+        # directory -> (mtime_ns, icon file names)
+        self._listings: Dict[str, Tuple[Optional[int], Tuple[str, ...]]] = {}
+        self.chain: List[str] = []
+        # Non-empty icon directories in lookup order:
+        # (theme position in chain, ThemeDir, path, {icon name: file name})
+        self._dirs: List[tuple] = []
+        self._pixmaps: List[tuple] = []  # (path, {icon name: file name})
+        self._changed = False
+        # (name, size) -> path or None
+        self._memo: Dict[Tuple[str, int], Optional[str]] = {}
+        self._checked = 0.0
+        self.generation = 0
+        self.listed = 0
+        self._load()
+        self._refresh()
+
+    @property
+    def available(self) -> bool:
+        """False where no theme directory exists at all (e.g. Windows)."""
+        return bool(self._dirs or self._pixmaps)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "rb") as f:
+                data = pickle.load(f)
+            if data.get("version") != _FORMAT_VERSION:
+                return
+            self._theme_files = data["theme_files"]
+            self._listings = data["listings"]
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logger.info("Icon theme cache unreadable, rebuilding")
+            self._theme_files = {}
+            self._listings = {}
+
+    def _save(self):
+        data = {
+            "version": _FORMAT_VERSION,
+            "theme_files": self._theme_files,
+            "listings": self._listings,
+        }
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            logger.debug("Cannot write icon theme cache", exc_info=True)
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _mtime(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _theme_info(self, theme: str, used: Dict[str, tuple]):
+        """(inherits, dirs) from the first index.theme of ``theme``."""
+        for base in self.base_dirs:
+            path = os.path.join(base, theme, "index.theme")
+            mtime = self._mtime(path)
+            if mtime is None:
+                continue
+            known = self._theme_files.get(path)
+            if known is None or known[0] != mtime:
+                known = (mtime,) + parse_index_theme(path)
+            used[path] = known
+            return known[1], known[2]
+        return None
+
+    def _list(self, directory: str, listings: Dict[str, tuple]) -> Dict[str, str]:
+        """Icon name -> file name in ``directory``; re-listed only when its
+        mtime changed. Sets self._changed when it was."""
+        mtime = self._mtime(directory)
+        known = self._listings.get(directory)
+        if known is not None and known[0] == mtime:
+            listings[directory] = known
+            return known[1]
+        names: Dict[str, str] = {}
+        if mtime is not None:
+            self.listed += 1
+            try:
+                with os.scandir(directory) as it:
+                    # Sorted so .png wins over .svg and .xpm, as in the spec.
+                    for filename in sorted(entry.name for entry in it):
+                        stem, _, ext = filename.rpartition(".")
+                        if stem and f".{ext.lower()}" in _EXTENSIONS:
+                            names.setdefault(stem, filename)
+            except OSError:
+                pass
+        listings[directory] = (mtime, names)
+        self._changed = True
+        return names
+
+    def _theme_chain(self, theme_files: Dict[str, tuple]):
+        chain, infos = [], {}
+        queue = [self.theme]
+        while queue:
+            theme = queue.pop(0)
+            if theme in infos:
+                continue
+            info = self._theme_info(theme, theme_files)
+            infos[theme] = info
+            if info is None:
+                continue
+            chain.append(theme)
+            queue += info[0]
+        if "hicolor" not in infos:
+            info = self._theme_info("hicolor", theme_files)
+            if info is not None:
+                chain.append("hicolor")
+                infos["hicolor"] = info
+        return chain, infos
+
+    def _refresh(self):
+        theme_files: Dict[str, tuple] = {}
+        listings: Dict[str, tuple] = {}
+        self._changed = False
+        chain, infos = self._theme_chain(theme_files)
+        dirs = []
+        for position, theme in enumerate(chain):
+            for theme_dir in infos[theme][1]:
+                for base in self.base_dirs:
+                    directory = os.path.join(base, theme, theme_dir.subdir)
+                    names = self._list(directory, listings)
+                    if names:
+                        dirs.append((position, theme_dir, directory, names))
+        pixmaps = []
+        for directory in self.pixmap_dirs:
+            names = self._list(directory, listings)
+            if names:
+                pixmaps.append((directory, names))
+
+        changed = (
+            self._changed
+            or theme_files != self._theme_files
+            or listings.keys() != self._listings.keys()
+        )
+        self._checked = time.monotonic()
+        if changed or not self.generation:
+            self.chain = chain
+            self._dirs = dirs
+            self._pixmaps = pixmaps
+            self._memo = {}
+            self.generation += 1
+        if changed:
+            self._theme_files = theme_files
+            self._listings = listings
+            self._save()
+
+    def refresh(self, force: bool = False):
+        with self._lock:
+            if force or time.monotonic() - self._checked >= self.RECHECK_INTERVAL:
+                self._refresh()
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def lookup(self, name: str, size: int = 32) -> Optional[str]:
+        """Path of the best file for icon ``name`` at ``size`` px, or None.
+
+        The first theme in the inheritance chain that has the icon wins;
+        within it the directory closest to ``size`` (an exact match first).
+        Unthemed icons in /usr/share/pixmaps are the last resort.
+        """
+        self.refresh()
+        key = (name, size)
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+            path = self._lookup(_icon_name(name), size)
+            self._memo[key] = path
+            return path
+
+    def _lookup(self, name: str, size: int) -> Optional[str]:
+        best = None
+        for position, theme_dir, directory, names in self._dirs:
+            if best is not None and position > best[0]:
+                break
+            filename = names.get(name)
+            if filename is None:
+                continue
+            distance = theme_dir.distance(size)
+            if best is None or distance < best[1]:
+                best = (position, distance, directory, filename)
+                if distance == 0:
+                    break
+        if best is None:
+            for directory, names in self._pixmaps:
+                if name in names:
+                    best = (None, None, directory, names[name])
+                    break
+        return os.path.join(best[2], best[3]) if best is not None else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "theme": self.theme,
+                "chain": self.chain,
+                "icons": len({name for _, _, _, names in self._dirs for name in names}),
+                "pixmaps": sum(len(names) for _, names in self._pixmaps),
+                "directories": len(self._listings),
+                "listed": self.listed,
+            }
+
+
+_indexes: Dict[str, IconThemeIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_icon_theme(theme: Optional[str] = None) -> IconThemeIndex:
+    """Shared index for ``theme`` (default: default_theme_name())."""
+    theme = theme or default_theme_name()
+    with _indexes_lock:
+        index = _indexes.get(theme)
+        if index is None:
+            index = _indexes[theme] = IconThemeIndex(theme)
+        return index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Icon theme index")
+    parser.add_argument("names", nargs="*", help="Icon names to look up")
+    parser.add_argument("--theme", help="Theme name (default: the GTK setting)")
+    parser.add_argument("--size", type=int, default=32)
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Ignore the cache and list all"
+    )
+    args = parser.parse_args()
+
+    theme = args.theme or default_theme_name()
+    if args.rebuild:
+        try:
+            os.remove(cache_path_for(theme))
+        except OSError:
+            pass
+    start = time.perf_counter()
+    index = IconThemeIndex(theme)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{elapsed:.1f} ms, {index.stats()}")
+    for name in args.names:
+        print(f"{name}: {index.lookup(name, args.size)}")
@@ -34,9 +34,14 @@ except Exception:
     print("falling back on xdotool")
     get_active_app = None
 
+try:
+    from tracker_daemon import acquire_tracking_lock, query_status
+except Exception:
+    acquire_tracking_lock = query_status = None
+
 import datetime
 import logging
-import sqlite3
+import signal
 from collections import defaultdict
 
 # Matplotlib in PyQt5 einbetten
@@ -50,6 +55,7 @@ import argparse
 
 import map_resolve
 from data_manager import DataManager
+from usage_table import RatioBarDelegate, RawKeyRole, UsageTableModel
 
 print(f"XDG_SESSION_TYPE: {os.environ.get('XDG_SESSION_TYPE')}")
 print(f"WAYLAND_DISPLAY: {os.environ.get('WAYLAND_DISPLAY')}")
@@ -171,20 +177,21 @@ def remove_from_autostart():
 ########################################################################
 
 
-def get_active_window_process_name():
+def get_active_window_process():
+    """Return (raw app key, resolution method) for the focused window."""
     if IS_WINDOWS:
         try:
             user32 = ctypes.windll.user32
             hwnd = user32.GetForegroundWindow()
             if hwnd == 0:
-                return ""
+                return "", None
             pid = ctypes.c_ulong()
             user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
             process = psutil.Process(pid.value)
-            return process.name()
+            return process.name(), "win32"
         except Exception:
             logger.exception("Fehler beim Ermitteln des aktiven Fensters (Windows):")
-            return ""
+            return "", None
     elif IS_LINUX:
         try:
             if get_active_app is not None:
@@ -194,17 +201,17 @@ def get_active_window_process_name():
                     info = {}
                 name = info.get("app_name") or info.get("app_id") or None
                 if name:
-                    return name
+                    return name, info.get("method")
                 proc_path = info.get("proc_path")
                 if proc_path:
                     try:
-                        return Path(proc_path).name
+                        return Path(proc_path).name, "proc_path"
                     except Exception:
                         pass
                 wm_pid = info.get("wm_pid")
                 if wm_pid:
                     try:
-                        return psutil.Process(int(wm_pid)).name()
+                        return psutil.Process(int(wm_pid)).name(), "wm_pid"
                     except Exception:
                         pass
             try:
@@ -213,23 +220,24 @@ def get_active_window_process_name():
                     stderr=subprocess.DEVNULL,
                 )
                 pid = int(out.strip())
-                return psutil.Process(pid).name()
+                return psutil.Process(pid).name(), "xdotool"
             except FileNotFoundError:
                 logger.warning(
                     "xdotool nicht gefunden; aktives Fenster unter Linux nicht bestimmt."
                 )
-                return ""
+                return "", None
             except Exception:
                 logger.exception("Fehler beim Ermitteln des aktiven Fensters (Linux):")
-                return ""
+                return "", None
         except Exception:
-            logger.exception("Fehler in get_active_window_process_name (Linux):")
-            return ""
+            logger.exception("Fehler in get_active_window_process (Linux):")
+            return "", None
     else:
-        return ""
+        return "", None
 
 
 # Dont count time on Lockscreen
+# Fallback for when ScreenLockMonitor has no D-Bus signal to listen to.
 # Cache the gdbus result for 5 seconds to avoid a subprocess call every tick.
 _lock_cache: dict = {"result": False, "ts": 0.0}
 _LOCK_CACHE_TTL = 5.0
@@ -282,6 +290,19 @@ class SettingsDialog(QtWidgets.QDialog):
         self.chk_start_with_ui.setChecked(start_with_ui)
         self.chk_start_with_ui.setEnabled(self.chk_autostart.isChecked())
         self.chk_autostart.toggled.connect(self.chk_start_with_ui.setEnabled)
+        afk_layout = QtWidgets.QHBoxLayout()
+        afk_layout.addWidget(QtWidgets.QLabel("Stop counting when AFK for"))
+        self.spin_afk = QtWidgets.QSpinBox()
+        self.spin_afk.setRange(0, 120)
+        self.spin_afk.setSuffix(" min")
+        self.spin_afk.setSpecialValueText("never")
+        self.spin_afk.setValue(
+            self.parent().qsettings.value(
+                "afk_minutes", MainWindow.AFK_MINUTES, type=int
+            )
+        )
+        afk_layout.addWidget(self.spin_afk)
+        layout.addLayout(afk_layout)
         btn_box = QtWidgets.QDialogButtonBox(
             QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel
         )
@@ -293,6 +314,7 @@ class SettingsDialog(QtWidgets.QDialog):
         return {
             "autostart": self.chk_autostart.isChecked(),
             "start_with_ui": self.chk_start_with_ui.isChecked(),
+            "afk_minutes": self.spin_afk.value(),
         }
 
 
@@ -379,6 +401,17 @@ class CustomizeAppDialog(QtWidgets.QDialog):
 
 
 class MainWindow(QtWidgets.QMainWindow):
+    # Emitted from the FocusWatcher thread with the time.time() of the switch.
+    focusChanged = QtCore.pyqtSignal(float)
+    # Emitted from the IdleWatcher thread: (idle, time.time() of the change).
+    idleChanged = QtCore.pyqtSignal(bool, float)
+
+    TICK_MS = 1000
+    # While AFK or locked nothing is counted; the timer only has to notice
+    # midnight.
+    PAUSED_TICK_MS = 30000
+    AFK_MINUTES = 5
+
     def __init__(self):
         super().__init__()
         DataManager.initialize_database()
@@ -389,6 +422,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.usage_today = defaultdict(float)
         self.current_process = ""
+        self.current_method = None
         self.last_switch_time = datetime.datetime.now()
 
         central_widget = QtWidgets.QWidget()
@@ -413,8 +447,12 @@ class MainWindow(QtWidgets.QMainWindow):
         self.header.setFont(QtGui.QFont("Segoe UI", 16))
         main_layout.addWidget(self.header)
 
-        self.table = QtWidgets.QTableWidget(0, 4)
-        self.table.setHorizontalHeaderLabels(["", "App", "Time used", "Ratio"])
+        self.table_model = UsageTableModel(app_mapping, icon_manager, self)
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.table_model)
+        self.table.setItemDelegateForColumn(
+            UsageTableModel.RATIO, RatioBarDelegate(self.table)
+        )
         self.table.horizontalHeader().setSectionResizeMode(
             1, QtWidgets.QHeaderView.Stretch
         )
@@ -458,6 +496,11 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_exit.clicked.connect(self.exit_app)
 
         self.qsettings = QtCore.QSettings("true_lock", "Screen Time")
+        DataManager.configure(
+            flush_interval=self.qsettings.value(
+                "db_flush_interval", DataManager.FLUSH_INTERVAL, type=float
+            )
+        )
         autostart_enabled = self.qsettings.value("autostart", True, type=bool)
         if autostart_enabled:
             add_to_autostart()
@@ -470,12 +513,26 @@ class MainWindow(QtWidgets.QMainWindow):
             self.show_wayland_warning_once()
 
         self.timer = QtCore.QTimer()
-        self.timer.setInterval(1000)
+        self.timer.setInterval(self.TICK_MS)
         self.timer.timeout.connect(self.update_tracking)
         self.timer.start()
-        self._last_display_usage = {}
 
-        self.load_usage_from_db()
+        self.focus_watcher = None
+        self.screen_locked = False
+        self.lock_monitor = None
+        self.user_idle = False
+        self.idle_watcher = None
+        # Only the holder of the tracking lock counts. If tracker_daemon.py
+        # holds it, this window only shows the daemon's numbers.
+        self._daemon_ticks = 0
+        self._tracking_lock = None
+        self.daemon_attached = not self.take_tracking_lock()
+        if self.daemon_attached:
+            logger.info("Tracker-Daemon läuft, zeige nur dessen Zahlen")
+            self.update_from_daemon()
+        else:
+            self.start_tracking()
+            self.load_usage_from_db()
 
         total_seconds = sum(self.usage_today.values())
         formatted_total = str(datetime.timedelta(seconds=int(total_seconds)))
@@ -514,20 +571,172 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def update_wayland_tracking(self):
         now = datetime.datetime.now()
+        self.roll_over(now)
 
-        if IS_LINUX and is_screen_locked_linux():
+        if self.tracking_paused():
             self.last_switch_time = now
             return
 
         duration = (now - self.last_switch_time).total_seconds()
         if duration > 0:
             self.usage_today["Wayland PC"] += duration
-            DataManager.add_daily_usage("Wayland PC", duration)
+            DataManager.add_focus_interval(
+                "Wayland PC",
+                self.last_switch_time.timestamp(),
+                now.timestamp(),
+                "wayland",
+            )
 
         self.last_switch_time = now
         self.update_total_usage()
         self.update_table(live_update=False)
 
+    def start_tracking(self):
+        # On X11 focus switches are pushed by a watcher thread; the timer
+        # then only refreshes the display.
+        if IS_LINUX and not IS_WAYLAND:
+            self.start_focus_watcher()
+            self.start_idle_watcher()
+        # Lock and unlock are pushed over D-Bus where possible.
+        if IS_LINUX:
+            self.start_lock_monitor()
+
+    def take_tracking_lock(self) -> bool:
+        """Whether this window may track, i.e. no daemon is counting."""
+        if acquire_tracking_lock is None:
+            return True
+        try:
+            self._tracking_lock = acquire_tracking_lock()
+        except OSError:
+            logger.exception("Tracking-Lock nicht verfügbar, zähle trotzdem")
+            return True
+        return self._tracking_lock is not None
+
+    def update_from_daemon(self):
+        """Show the daemon's numbers; track here again once it is gone."""
+        self._daemon_ticks += 1
+        # While hidden only check every 30 ticks that it still runs.
+        if not self.isVisible() and self._daemon_ticks % 30:
+            return
+        status = query_status()
+        if status is None:
+            if not self.take_tracking_lock():
+                return  # Still shutting down; look again next tick.
+            logger.info("Tracker-Daemon beendet, zähle wieder selbst")
+            self.daemon_attached = False
+            self.usage_today.clear()
+            self.load_usage_from_db()
+            self.current_process = ""
+            self.last_switch_time = datetime.datetime.now()
+            self.start_tracking()
+            return
+        self.usage_today = defaultdict(float, status["usage"])
+        self.current_process = status["current"]
+        self.current_method = status["method"]
+        self.last_switch_time = datetime.datetime.fromtimestamp(status["since"])
+        self.update_total_usage()
+        self.update_table(live_update=True)
+
+    def start_focus_watcher(self):
+        try:
+            from window_resolver import FocusWatcher
+
+            self.focus_watcher = FocusWatcher(self.focusChanged.emit)
+        except Exception:
+            logger.info("Focus watcher unavailable, polling the active window")
+            self.focus_watcher = None
+            return
+        self.focusChanged.connect(self.on_focus_changed)
+        self.focus_watcher.start()
+
+    def start_lock_monitor(self):
+        try:
+            from screen_lock import ScreenLockMonitor
+
+            monitor = ScreenLockMonitor(self)
+            if not monitor.start():
+                raise RuntimeError("no lock signal")
+        except Exception:
+            logger.info("Keine Sperr-Signale über D-Bus, frage gdbus alle 5 s")
+            return
+        self.lock_monitor = monitor
+        self.screen_locked = monitor.locked
+        monitor.lockedChanged.connect(self.on_lock_changed)
+
+    def is_screen_locked(self) -> bool:
+        if self.lock_monitor is not None:
+            return self.screen_locked
+        return IS_LINUX and is_screen_locked_linux()
+
+    def on_lock_changed(self, locked: bool, timestamp: float):
+        now = max(datetime.datetime.fromtimestamp(timestamp), self.last_switch_time)
+        self.roll_over(now)
+        if locked:
+            # Book the time up to the lock, then count nothing until unlock.
+            if IS_WAYLAND:
+                self.update_wayland_tracking()
+            else:
+                self.close_interval(now)
+            self.current_process = ""
+        self.screen_locked = locked
+        self.resume_tracking(now)
+
+    def start_idle_watcher(self):
+        minutes = self.qsettings.value("afk_minutes", self.AFK_MINUTES, type=int)
+        if minutes <= 0:
+            return
+        try:
+            from window_resolver import IdleWatcher
+
+            self.idle_watcher = IdleWatcher(self.idleChanged.emit, minutes * 60)
+        except Exception:
+            logger.info("Keine Leerlauf-Erkennung (MIT-SCREEN-SAVER fehlt)")
+            self.idle_watcher = None
+            return
+        self.idleChanged.connect(self.on_idle_changed)
+        self.idle_watcher.start()
+
+    def stop_idle_watcher(self):
+        if self.idle_watcher is not None:
+            self.idle_watcher.stop()
+            self.idle_watcher = None
+        if self.user_idle:
+            self.on_idle_changed(False, datetime.datetime.now().timestamp())
+
+    def on_idle_changed(self, idle: bool, timestamp: float):
+        # When going idle, timestamp is the last input: the AFK time before
+        # the threshold was reached is not counted either.
+        now = max(datetime.datetime.fromtimestamp(timestamp), self.last_switch_time)
+        self.roll_over(now)
+        if idle:
+            self.close_interval(now)
+            self.current_process = ""
+        self.user_idle = idle
+        self.resume_tracking(now)
+
+    def tracking_paused(self) -> bool:
+        return self.user_idle or self.is_screen_locked()
+
+    def resume_tracking(self, now):
+        """Restart counting at ``now`` after lock or AFK state changed."""
+        self.last_switch_time = now
+        paused = self.tracking_paused()
+        self.timer.setInterval(self.PAUSED_TICK_MS if paused else self.TICK_MS)
+        if not paused and not IS_WAYLAND:
+            self.switch_process(*get_active_window_process(), now)
+        self.update_total_usage()
+        self.update_table(live_update=True)
+
+    def on_focus_changed(self, timestamp: float):
+        if self.tracking_paused():
+            return
+        # Account at the moment the switch happened, not when we got here.
+        now = max(datetime.datetime.fromtimestamp(timestamp), self.last_switch_time)
+        self.roll_over(now)
+        if self.switch_process(*get_active_window_process(), now):
+            self.update_total_usage()
+            self.update_table(live_update=True)
+
     def open_settings(self):
         dlg = SettingsDialog(self)
         autostart_enabled = self.qsettings.value("autostart", True, type=bool)
@@ -540,6 +749,13 @@ class MainWindow(QtWidgets.QMainWindow):
                 add_to_autostart()
             else:
                 remove_from_autostart()
+            self.qsettings.setValue("afk_minutes", settings["afk_minutes"])
+            if settings["afk_minutes"] <= 0:
+                self.stop_idle_watcher()
+            elif self.idle_watcher is not None:
+                self.idle_watcher.set_threshold(settings["afk_minutes"] * 60)
+            elif IS_LINUX and not IS_WAYLAND and not self.daemon_attached:
+                self.start_idle_watcher()
 
     def on_stack_changed(self, index: int):
         try:
@@ -554,7 +770,7 @@ class MainWindow(QtWidgets.QMainWindow):
             from statistics import StatisticsPage
 
             self._statistics_page = StatisticsPage(
-                self.stack, icon_manager, app_mapping
+                self.stack, icon_manager, app_mapping, live_usage=self.live_usage
             )
             self.stack.addWidget(self._statistics_page)
         return self._statistics_page
@@ -564,24 +780,9 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def load_usage_from_db(self):
         today = datetime.date.today().isoformat()
-
-        conn = sqlite3.connect(DataManager.DB_PATH)
-        c = conn.cursor()
-
-        c.execute(
-            """
-            SELECT app_name, duration_seconds
-            FROM DailyUsage
-            WHERE date = ?
-        """,
-            (today,),
-        )
-
-        for app, seconds in c.fetchall():
+        for _date, app, seconds in DataManager.get_daily_usage(today, today):
             self.usage_today[app] += seconds
 
-        conn.close()
-
     def setup_tray_icon(self):
         self.tray_icon = QtWidgets.QSystemTrayIcon(self)
         self.tray_icon.setIcon(
@@ -613,6 +814,14 @@ class MainWindow(QtWidgets.QMainWindow):
         except Exception:
             pass
 
+    def live_usage(self):
+        """Today's per-app seconds including the still running interval."""
+        usage = dict(self.usage_today)
+        if self.current_process:
+            delta = (datetime.datetime.now() - self.last_switch_time).total_seconds()
+            usage[self.current_process] = usage.get(self.current_process, 0) + delta
+        return usage
+
     def update_total_usage(self):
         total_seconds = sum(self.usage_today.values())
         formatted_total = str(datetime.timedelta(seconds=int(total_seconds)))
@@ -620,40 +829,69 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def update_tracking(self):
 
+        if self.daemon_attached:
+            self.update_from_daemon()
+            return
+
         if IS_WAYLAND:
             self.update_wayland_tracking()
             return
 
         now = datetime.datetime.now()
+        self.roll_over(now)
 
-        if now.date() != self.last_switch_time.date():
-            self.last_switch_time = now
-
-        if IS_LINUX and is_screen_locked_linux():
-            # Dont count time on Lockscreen
+        if self.tracking_paused():
+            # Dont count time on Lockscreen or while AFK
             self.current_process = ""
             self.last_switch_time = now
+            DataManager.maybe_flush()
             return
 
-        raw_active_app = get_active_window_process_name()
+        # Without a focus watcher (or while nothing is focused yet) sample
+        # the active window on every tick.
+        if self.focus_watcher is None or not self.current_process:
+            self.switch_process(*get_active_window_process(), now)
+
+        DataManager.maybe_flush()
 
+        self.update_total_usage()
+        self.update_table(live_update=True)
+
+    def roll_over(self, now):
+        """On a new day, book the running interval up to midnight and start
+        today's counters from zero. Called before anything is booked at
+        ``now``, so no interval reaching over midnight lands in today."""
+        if now.date() <= self.last_switch_time.date():
+            return
+        midnight = datetime.datetime.combine(now.date(), datetime.time())
+        self.close_interval(midnight)
+        self.usage_today.clear()
+        self.last_switch_time = midnight
+
+    def switch_process(self, raw_active_app, method, now) -> bool:
+        """Close the running interval at ``now`` if the active app changed."""
         # Compare raw process keys directly, no need to resolve() here since
         # update_table resolves every visible row anyway.
         if raw_active_app == self.current_process and self.current_process:
-            self.update_total_usage()
-            self.update_table(live_update=True)
-        else:
-            duration = (now - self.last_switch_time).total_seconds()
-
-            if self.current_process and duration > 0:
-                self.usage_today[self.current_process] += duration
-                DataManager.add_daily_usage(self.current_process, duration)
+            return False
 
-            self.current_process = raw_active_app
-            self.last_switch_time = now
+        self.close_interval(now)
+        self.current_process = raw_active_app
+        self.current_method = method
+        self.last_switch_time = now
+        return True
 
-            self.update_total_usage()
-            self.update_table(live_update=False)
+    def close_interval(self, now):
+        """Account the running interval of the current app up to ``now``."""
+        duration = (now - self.last_switch_time).total_seconds()
+        if self.current_process and duration > 0:
+            self.usage_today[self.current_process] += duration
+            DataManager.add_focus_interval(
+                self.current_process,
+                self.last_switch_time.timestamp(),
+                now.timestamp(),
+                self.current_method,
+            )
 
     def update_table(self, live_update=False):
         if not self.isVisible():
@@ -666,95 +904,16 @@ class MainWindow(QtWidgets.QMainWindow):
                 display_usage.get(self.current_process, 0) + delta
             )
 
-        total = sum(display_usage.values())
-        if total == 0:
-            self.update_total_usage()
-            self.table.setRowCount(0)
-            self._last_display_usage = {}
-            return
-
         self.update_total_usage()
-
-        aggregated = {}
-        for raw_app, seconds in display_usage.items():
-            display_name, icon_hint = app_mapping.resolve(raw_app)
-            label = display_name.title() if display_name else raw_app
-            info = aggregated.get(label)
-            if info is None:
-                aggregated[label] = {
-                    "seconds": seconds,
-                    "raw": raw_app,
-                    "icon_hint": icon_hint,
-                }
-            else:
-                info["seconds"] += seconds
-
-        sorted_apps = sorted(
-            aggregated.items(), key=lambda x: x[1]["seconds"], reverse=True
-        )
-
-        needed_rows = len(sorted_apps)
-        self.table.setRowCount(needed_rows)
-
-        new_display_cache = {}
-        scroll_bar = self.table.verticalScrollBar()
-        scroll_value_before = scroll_bar.value()
-
-        for row, (label, info) in enumerate(sorted_apps):
-            seconds = info["seconds"]
-            raw_for_icon = info["raw"]
-            icon_hint = info["icon_hint"]
-
-            percentage = seconds / total * 100
-            formatted_time = str(datetime.timedelta(seconds=int(seconds)))
-            icon = icon_manager.get_icon_for_app(raw_for_icon, icon_hint)
-
-            item_icon = self.table.item(row, 0)
-            if item_icon is None:
-                item_icon = QtWidgets.QTableWidgetItem()
-                self.table.setItem(row, 0, item_icon)
-            item_icon.setIcon(icon)
-
-            item_name = self.table.item(row, 1)
-            if item_name is None:
-                item_name = QtWidgets.QTableWidgetItem()
-                self.table.setItem(row, 1, item_name)
-            item_name.setText(label)
-            # Store raw key so context menu can look it up
-            item_name.setData(QtCore.Qt.UserRole, raw_for_icon)
-
-            item_time = self.table.item(row, 2)
-            if item_time is None:
-                item_time = QtWidgets.QTableWidgetItem()
-                self.table.setItem(row, 2, item_time)
-            item_time.setText(formatted_time)
-
-            progress: QtWidgets.QProgressBar = self.table.cellWidget(row, 3)
-            if progress is None:
-                progress = QtWidgets.QProgressBar()
-                progress.setMinimum(0)
-                progress.setMaximum(100)
-                progress.setAlignment(QtCore.Qt.AlignCenter)
-                self.table.setCellWidget(row, 3, progress)
-            progress.setValue(int(percentage))
-            progress.setFormat(f"{percentage:.1f}%")
-
-            new_display_cache[label] = seconds
-
-        QtCore.QTimer.singleShot(0, lambda: scroll_bar.setValue(scroll_value_before))
-
-        self._last_display_usage = new_display_cache
+        self.table_model.set_usage(display_usage)
 
     def on_table_context_menu(self, pos):
-        item = self.table.itemAt(pos)
-        if item is None:
+        index = self.table.indexAt(pos)
+        if not index.isValid():
             return
-        row = item.row()
-        name_item = self.table.item(row, 1)
-        if name_item is None:
-            return
-        raw_key = name_item.data(QtCore.Qt.UserRole) or name_item.text()
-        display_name = name_item.text()
+        name_index = index.siblingAtColumn(UsageTableModel.APP)
+        display_name = self.table_model.data(name_index)
+        raw_key = self.table_model.data(name_index, RawKeyRole) or display_name
 
         menu = QtWidgets.QMenu(self)
         action = menu.addAction("✏  Customize - " + display_name)
@@ -770,15 +929,18 @@ class MainWindow(QtWidgets.QMainWindow):
             icon_manager.app_icons.clear() if hasattr(
                 icon_manager, "app_icons"
             ) else None
+            self.table_model.invalidate()
             self.update_table(live_update=False)
 
     def exit_app(self):
-        now = datetime.datetime.now()
-        duration = (now - self.last_switch_time).total_seconds()
+        if not self.daemon_attached:
+            self.close_interval(datetime.datetime.now())
 
-        if self.current_process and duration > 0:
-            self.usage_today[self.current_process] += duration
-            DataManager.add_daily_usage(self.current_process, duration)
+        if self.focus_watcher is not None:
+            self.focus_watcher.stop()
+        if self.idle_watcher is not None:
+            self.idle_watcher.stop()
+        DataManager.flush(wait=True)
 
         logger.info("Quitting...")
         QtWidgets.QApplication.quit()
@@ -827,6 +989,9 @@ def main():
     app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
 
     window = MainWindow()
+    # Flush buffered usage when the session ends. The tracking timer gives
+    # the interpreter a chance to run the handler while Qt's loop is active.
+    signal.signal(signal.SIGTERM, lambda *_: window.exit_app())
 
     if not args.hidden:
         window.show()
@@ -3,9 +3,12 @@ import json
 import logging
 import os
 import re
+import time
 from pathlib import Path
 from typing import Optional, Tuple
 
+from process_index import get_process_index
+
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
@@ -92,6 +95,13 @@ def _get_steam_game_info(app_id: str) -> Tuple[Optional[str], Optional[str]]:
 
 
 class AppMapping:
+    # Steam games whose name or icon could not be found yet (icon not cached
+    # before the first launch) are retried after this many seconds. Every
+    # other result stays valid until map.json changes.
+    NEGATIVE_TTL = 60.0
+    # How often resolve() may stat map.json for external edits.
+    MTIME_CHECK_INTERVAL = 2.0
+
     def __init__(self, path):
         self.path = path
         self.mapping = {}
@@ -99,9 +109,25 @@ class AppMapping:
         # second while a game is running.
         self._steam_cache: dict = {}
         self._proc_steam_cache: dict = {}
+        # raw name -> ((display_name, icon_hint), expires_at or None)
+        self._resolve_cache: dict = {}
+        self._mtime_ns: Optional[int] = None
+        self._mtime_checked = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
         self.load()
 
+    def _stat_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
     def load(self):
+        self._mtime_ns = self._stat_mtime()
+        self._mtime_checked = time.monotonic()
         try:
             with open(self.path, "r", encoding="utf-8") as f:
                 self.mapping = json.load(f)
@@ -111,8 +137,52 @@ class AppMapping:
         except Exception:
             logger.exception("Failed to load map.json")
             self.mapping = {}
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop all memoized resolve() results."""
+        self._resolve_cache.clear()
+        self.invalidations += 1
+
+    def cache_stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "invalidations": self.invalidations,
+            "size": len(self._resolve_cache),
+        }
+
+    def _check_mapping_file(self, now: float):
+        """Reload map.json if it changed on disk (checked at most every
+        MTIME_CHECK_INTERVAL seconds)."""
+        if now - self._mtime_checked < self.MTIME_CHECK_INTERVAL:
+            return
+        self._mtime_checked = now
+        if self._stat_mtime() != self._mtime_ns:
+            logger.info("map.json changed on disk, reloading")
+            self.load()
 
     def resolve(self, raw_name: str) -> Tuple[str, Optional[str]]:
+        """Return (display_name, icon_hint) for a raw process key."""
+        now = time.monotonic()
+        self._check_mapping_file(now)
+        cached = self._resolve_cache.get(raw_name)
+        if cached is not None:
+            result, expires_at = cached
+            if expires_at is None or now < expires_at:
+                self.hits += 1
+                return result
+            self.expired += 1
+        self.misses += 1
+        result, steam_miss = self._resolve_uncached(raw_name)
+        expires_at = now + self.NEGATIVE_TTL if steam_miss else None
+        self._resolve_cache[raw_name] = (result, expires_at)
+        return result
+
+    def _resolve_uncached(self, raw_name: str):
+        """Return ((display_name, icon_hint), steam_miss), where steam_miss
+        says the result came from a Steam lookup that found no icon."""
         # 1) Explicit entry in map.json always wins.
         entry = self.mapping.get(raw_name)
         if entry:
@@ -123,13 +193,13 @@ class AppMapping:
             if icon and not Path(icon).exists():
                 icon = None
             if icon:
-                return display, icon
+                return (display, icon), False
             # display_name was set but icon needs dynamic lookup, try Steam
             app_id = self._find_steam_app_id_for_process(raw_name)
             if app_id:
                 _, dyn_icon = self._get_steam_info_cached(app_id)
-                return display, dyn_icon
-            return display, None
+                return (display, dyn_icon), dyn_icon is None
+            return (display, None), False
 
         # 2) Dynamic Steam lookup for keys like "steam_app_123456" that
         #    window_resolver produces when it detects a Proton/Wine game.
@@ -138,7 +208,7 @@ class AppMapping:
             if app_id.isdigit():
                 game_name, icon_path = self._get_steam_info_cached(app_id)
                 display = game_name if game_name else raw_name
-                return display, icon_path
+                return (display, icon_path), icon_path is None
 
         # 3) Native Steam game not in map.json, try to identify via SteamAppId
         #    from the running process (e.g. "aces", "Fishards.x86_64").
@@ -146,9 +216,9 @@ class AppMapping:
         if app_id:
             game_name, icon_path = self._get_steam_info_cached(app_id)
             display = game_name if game_name else raw_name
-            return display, icon_path
+            return (display, icon_path), icon_path is None
 
-        return raw_name, None
+        return (raw_name, None), False
 
     # ------------------------------------------------------------------
     # Internal helpers
@@ -157,39 +227,34 @@ class AppMapping:
     def _get_steam_info_cached(
         self, app_id: str
     ) -> Tuple[Optional[str], Optional[str]]:
-        if app_id not in self._steam_cache:
-            self._steam_cache[app_id] = _get_steam_game_info(app_id)
-        return self._steam_cache[app_id]
+        cached = self._steam_cache.get(app_id)
+        # The icon only shows up after the first launch, so look again
+        # once a result without one is older than NEGATIVE_TTL.
+        if cached is None or (
+            cached[0][1] is None and time.monotonic() - cached[1] > self.NEGATIVE_TTL
+        ):
+            cached = (_get_steam_game_info(app_id), time.monotonic())
+            self._steam_cache[app_id] = cached
+        return cached[0]
 
     def _find_steam_app_id_for_process(self, name: str) -> Optional[str]:
-        """Scan /proc for a running process matching `name` and return its SteamAppId."""
-        # Use a short-lived cache (cleared when app switches) to avoid
-        # scanning /proc every second for the same process name.
-        if name in self._proc_steam_cache:
-            return self._proc_steam_cache[name] or None
-        import glob
-
+        """Return the SteamAppId of a running process whose exe is `name`."""
+        # Cache the answer per process name; misses are retried after
+        # NEGATIVE_TTL.
+        cached = self._proc_steam_cache.get(name)
+        if cached is not None and (
+            cached[0] or time.monotonic() - cached[1] <= self.NEGATIVE_TTL
+        ):
+            return cached[0] or None
         name_lower = name.lower()
         found_id: Optional[str] = None
-        for pid_dir in glob.glob("/proc/[0-9]*/"):
-            try:
-                pid = pid_dir.rstrip("/").split("/")[-1]
-                exe = os.readlink(f"/proc/{pid}/exe")
-                if os.path.basename(exe).lower() != name_lower:
-                    continue
-                with open(f"/proc/{pid}/environ", "rb") as f:
-                    env = f.read().decode(errors="ignore")
-                for var in env.split("\x00"):
-                    if var.startswith("SteamAppId="):
-                        val = var.split("=", 1)[1].strip()
-                        if val and val.isdigit() and val != "0":
-                            found_id = val
-                            break
-                if found_id:
+        index = get_process_index()
+        if index is not None:
+            for proc in index.find(name):
+                if proc.basename.lower() == name_lower and proc.steam_app_id:
+                    found_id = proc.steam_app_id
                     break
-            except Exception:
-                pass
-        self._proc_steam_cache[name] = found_id or ""
+        self._proc_steam_cache[name] = (found_id or "", time.monotonic())
         return found_id
 
     def save_entry(self, raw_key: str, entry: dict):
@@ -204,3 +269,6 @@ class AppMapping:
                 json.dump(self.mapping, f, indent=2, ensure_ascii=False)
         except Exception:
             logger.exception("Failed to save map.json")
+        # Our own write is not an external change.
+        self._mtime_ns = self._stat_mtime()
+        self.invalidate()
@@ -0,0 +1,363 @@
+#!/home/user/venv/bin/python
+"""Shared index of running processes, kept up to date from /proc.
+
+Each refresh pass lists /proc with scandir and only reads the files of
+pids it has not seen before; exited pids are dropped. A pid whose /proc
+entry changed inode is checked against its start time, so a recycled pid
+is re-read while a live process is not. Processes younger than
+SETTLE_SECONDS are re-read on the next pass as well, because launchers
+and wrapper scripts usually exec() the real program right after starting.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+class ProcInfo(NamedTuple):
+    pid: int
+    name: str  # comm, as shown by ps / psutil.Process.name()
+    exe: Optional[str]
+    cmdline: Optional[str]
+    steam_app_id: Optional[str]
+    start_time: int  # clock ticks since boot
+
+    @property
+    def basename(self) -> str:
+        return os.path.basename(self.exe) if self.exe else ""
+
+
+class ProcessIndex:
+    # Lookups refresh the index at most this often.
+    REFRESH_INTERVAL = 1.0
+    SETTLE_SECONDS = 2.0
+
+    def __init__(self, proc_root: str = "/proc"):
+        self.proc_root = proc_root
+        self._lock = threading.RLock()
+        self._procs: Dict[int, ProcInfo] = {}
+        self._inodes: Dict[int, int] = {}
+        # lower-case exe basename, exe stem and comm -> pids
+        self._by_name: Dict[str, Set[int]] = {}
+        self._unsettled: Set[int] = set()
+        self._last_refresh = 0.0
+        self.passes = 0
+        self.reads = 0
+        self.last_pass_ms = 0.0
+
+    @property
+    def available(self) -> bool:
+        return os.path.isdir(self.proc_root)
+
+    # ------------------------------------------------------------------
+    # Reading /proc
+    # ------------------------------------------------------------------
+
+    def _path(self, pid: int, name: str) -> str:
+        return f"{self.proc_root}/{pid}/{name}"
+
+    def _read_stat(self, pid: int):
+        """Return (comm, start_time) from /proc/<pid>/stat, or None."""
+        try:
+            with open(self._path(pid, "stat"), "rb") as f:
+                data = f.read().decode(errors="ignore")
+        except OSError:
+            return None
+        # comm may contain spaces and parentheses; it ends at the last ')'.
+        head, _, rest = data.rpartition(")")
+        fields = rest.split()
+        try:
+            return head.partition("(")[2], int(fields[19])
+        except (IndexError, ValueError):
+            return None
+
+    def _read_steam_app_id(self, pid: int) -> Optional[str]:
+        try:
+            with open(self._path(pid, "environ"), "rb") as f:
+                env = f.read()
+        except OSError:
+            return None
+        # Steam sets this for every game it launches, native or Proton.
+        for var in env.split(b"\0"):
+            if var.startswith(b"SteamAppId="):
+                value = var[len(b"SteamAppId=") :].strip().decode(errors="ignore")
+                if value.isdigit() and value != "0":
+                    return value
+        return None
+
+    def _read(self, pid: int, stat=None) -> Optional[ProcInfo]:
+        stat = stat or self._read_stat(pid)
+        if stat is None:
+            return None
+        self.reads += 1
+        comm, start_time = stat
+        try:
+            exe = os.readlink(self._path(pid, "exe"))
+        except OSError:
+            exe = None
+        cmdline = None
+        try:
+            with open(self._path(pid, "cmdline"), "rb") as f:
+                raw = f.read()
+            if raw:
+                cmdline = raw.replace(b"\0", b" ").decode(errors="ignore").strip()
+        except OSError:
+            pass
+        return ProcInfo(
+            pid, comm, exe, cmdline, self._read_steam_app_id(pid), start_time
+        )
+
+    def _uptime_ticks(self) -> Optional[float]:
+        try:
+            with open(f"{self.proc_root}/uptime", "rb") as f:
+                return float(f.read().split()[0]) * _CLK_TCK
+        except (OSError, ValueError, IndexError):
+            return None
+
+    # ------------------------------------------------------------------
+    # Index maintenance
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _keys(info: ProcInfo):
+        keys = {info.name.lower()}
+        if info.exe:
+            basename = os.path.basename(info.exe).lower()
+            keys.add(basename)
+            keys.add(os.path.splitext(basename)[0])
+        keys.discard("")
+        return keys
+
+    def _add(self, info: ProcInfo, uptime: Optional[float]):
+        self._procs[info.pid] = info
+        for key in self._keys(info):
+            self._by_name.setdefault(key, set()).add(info.pid)
+        if uptime is not None and uptime - info.start_time < (
+            self.SETTLE_SECONDS * _CLK_TCK
+        ):
+            self._unsettled.add(info.pid)
+        else:
+            self._unsettled.discard(info.pid)
+
+    def _remove(self, pid: int):
+        info = self._procs.pop(pid, None)
+        self._inodes.pop(pid, None)
+        self._unsettled.discard(pid)
+        if info is None:
+            return
+        for key in self._keys(info):
+            pids = self._by_name.get(key)
+            if pids is not None:
+                pids.discard(pid)
+                if not pids:
+                    del self._by_name[key]
+
+    def refresh(self, force: bool = False):
+        """Pick up new and exited processes (at most every REFRESH_INTERVAL)."""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_refresh < self.REFRESH_INTERVAL:
+                return
+            self._last_refresh = now
+            start = time.perf_counter()
+            uptime = self._uptime_ticks()
+            seen = set()
+            try:
+                with os.scandir(self.proc_root) as entries:
+                    for entry in entries:
+                        name = entry.name
+                        if not name.isdigit():
+                            continue
+                        pid = int(name)
+                        seen.add(pid)
+                        inode = entry.inode()
+                        known = self._procs.get(pid)
+                        if known is not None and self._inodes.get(pid) == inode:
+                            if pid not in self._unsettled:
+                                continue
+                            stat = None
+                        else:
+                            stat = self._read_stat(pid)
+                            if stat is None:
+                                continue
+                            if known is not None and stat[1] == known.start_time:
+                                # Same process, the dentry was just recycled.
+                                self._inodes[pid] = inode
+                                if pid not in self._unsettled:
+                                    continue
+                        info = self._read(pid, stat)
+                        if known is not None:
+                            self._remove(pid)
+                        if info is not None:
+                            self._inodes[pid] = inode
+                            self._add(info, uptime)
+            except OSError:
+                logger.debug("Cannot list %s", self.proc_root)
+                return
+            for pid in self._procs.keys() - seen:
+                self._remove(pid)
+            self.passes += 1
+            self.last_pass_ms = (time.perf_counter() - start) * 1000
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def get(self, pid) -> Optional[ProcInfo]:
+        """Return the process with ``pid``, re-reading it if the pid was reused."""
+        pid = int(pid)
+        with self._lock:
+            known = self._procs.get(pid)
+            stat = self._read_stat(pid)
+            if stat is None:
+                if known is not None:
+                    self._remove(pid)
+                return None
+            if (
+                known is not None
+                and known.start_time == stat[1]
+                and pid not in self._unsettled
+            ):
+                return known
+            info = self._read(pid, stat)
+            if known is not None:
+                self._remove(pid)
+            if info is not None:
+                self._add(info, self._uptime_ticks())
+            return info
+
+    def find(self, name: str) -> List[ProcInfo]:
+        """Processes whose exe basename, exe stem or comm equals ``name``
+        (case-insensitive)."""
+        self.refresh()
+        with self._lock:
+            pids = self._by_name.get(name.lower(), ())
+            return [self._procs[pid] for pid in sorted(pids)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "processes": len(self._procs),
+                "passes": self.passes,
+                "reads": self.reads,
+                "last_pass_ms": round(self.last_pass_ms, 3),
+            }
+
+
+_index: Optional[ProcessIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_process_index() -> Optional[ProcessIndex]:
+    """Return the shared index, or None where there is no /proc."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ProcessIndex()
+        return _index if _index.available else None
+
+
+def _make_fake_proc(root: str, count: int, first_pid: int = 1000):
+    """Create ``count`` fake process directories under ``root``."""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "uptime"), "w") as f:
+        f.write("100000.00 1.00\n")
+    for pid in range(first_pid, first_pid + count):
+        _make_fake_pid(root, pid)
+
+
+def _make_fake_pid(root: str, pid: int, start_time: int = 100):
+    d = os.path.join(root, str(pid))
+    os.makedirs(d, exist_ok=True)
+    name = f"proc{pid % 97}"
+    with open(os.path.join(d, "stat"), "w") as f:
+        f.write(
+            f"{pid} ({name}) S 1 1 1 0 -1 0 0 0 0 0 0 0 0 0 20 0 1 0 "
+            f"{start_time} 0 0\n"
+        )
+    with open(os.path.join(d, "cmdline"), "wb") as f:
+        f.write(f"/usr/bin/{name}\0--flag\0".encode())
+    with open(os.path.join(d, "environ"), "wb") as f:
+        f.write(b"HOME=/root\0" + (b"SteamAppId=570\0" if pid % 50 == 0 else b""))
+    link = os.path.join(d, "exe")
+    if not os.path.lexists(link):
+        os.symlink(f"/usr/bin/{name}", link)
+
+
+def _benchmark(counts, passes: int = 20):
+    """Refresh cost on a synthetic proc root of growing size."""
+    import shutil
+    import tempfile
+
+    results = []
+    for count in counts:
+        root = tempfile.mkdtemp(prefix="proc-bench-")
+        try:
+            _make_fake_proc(root, count)
+            index = ProcessIndex(root)
+            start = time.perf_counter()
+            index.refresh(force=True)
+            initial = (time.perf_counter() - start) * 1000
+
+            # Steady state: a few processes start and exit between passes.
+            steady = []
+            next_pid = 1000 + count
+            for i in range(passes):
+                shutil.rmtree(os.path.join(root, str(1000 + i)))
+                _make_fake_pid(root, next_pid)
+                next_pid += 1
+                start = time.perf_counter()
+                index.refresh(force=True)
+                steady.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            for i in range(1000):
+                index.find(f"proc{i % 97}")
+            lookup_us = (time.perf_counter() - start) * 1000
+
+            results.append(
+                {
+                    "processes": count,
+                    "initial_ms": round(initial, 2),
+                    "refresh_ms": round(sorted(steady)[len(steady) // 2], 3),
+                    "reads_per_refresh": round((index.reads - count) / passes, 2),
+                    "find_us": round(lookup_us, 3),
+                }
+            )
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Process index")
+    parser.add_argument(
+        "--bench", action="store_true", help="Benchmark on a synthetic proc root"
+    )
+    parser.add_argument(
+        "--counts", default="250,1000,4000", help="Process counts for --bench"
+    )
+    parser.add_argument("--find", help="Look up processes by exe/comm name")
+    args = parser.parse_args()
+
+    if args.bench:
+        counts = [int(c) for c in args.counts.split(",")]
+        print(json.dumps(_benchmark(counts), indent=2))
+    elif args.find:
+        index = ProcessIndex()
+        for info in index.find(args.find):
+            print(info)
+        print(index.stats())
+    else:
+        index = ProcessIndex()
+        index.refresh(force=True)
+        print(index.stats())
@@ -0,0 +1,237 @@
+#!/home/user/venv/bin/python
+"""Screen lock state, pushed over D-Bus instead of polled.
+
+ScreenLockMonitor keeps one session and one system bus connection open and
+subscribes to the signals lock screens send when they come and go:
+
+- ``ActiveChanged(b)`` of org.gnome.ScreenSaver and org.freedesktop.ScreenSaver
+  (GNOME, KDE, Cinnamon, xfce4-screensaver, ...)
+- ``Lock`` / ``Unlock`` and the ``LockedHint`` property of our logind session
+
+The screen counts as locked while any of them says so. The current state is
+asked for once at start; after that nothing is polled.
+"""
+
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from PyQt5 import QtCore
+
+try:
+    from PyQt5 import QtDBus
+except ImportError:  # PyQt5 built without QtDBus
+    QtDBus = None
+
+# window_resolver.LockWatcher watches the same sources without Qt.
+from window_resolver import LOGIND, SCREENSAVERS, logind_session_path
+
+logger = logging.getLogger(__name__)
+
+LOGIND_SESSION = "org.freedesktop.login1.Session"
+PROPERTIES = "org.freedesktop.DBus.Properties"
+
+# Timeout of the one-off state queries at start.
+CALL_TIMEOUT_MS = 1000
+
+
+class ScreenLockMonitor(QtCore.QObject):
+    """Emits ``lockedChanged(locked, time.time())`` when the screen (un)locks.
+
+    ``session_bus`` / ``system_bus`` may be D-Bus addresses to use instead
+    of the user's buses, and ``session_path`` a logind session object path
+    instead of the one of $XDG_SESSION_ID.
+    """
+
+    lockedChanged = QtCore.pyqtSignal(bool, float)
+
+    def __init__(
+        self,
+        parent=None,
+        session_bus: Optional[str] = None,
+        system_bus: Optional[str] = None,
+        session_path: Optional[str] = None,
+    ):
+        super().__init__(parent)
+        self._session_address = session_bus
+        self._system_address = system_bus
+        self._session_path = session_path
+        self._session = None
+        self._system = None
+        # source -> locked; the screen is locked if any source says so
+        self._sources: Dict[str, bool] = {}
+        self._watchers = set()
+        self.locked = False
+
+    @property
+    def available(self) -> bool:
+        """Whether at least one lock signal is subscribed."""
+        return bool(self._sources)
+
+    # ------------------------------------------------------------------
+    # Setup
+    # ------------------------------------------------------------------
+
+    def _bus(self, address: Optional[str], kind: str):
+        if address:
+            bus = QtDBus.QDBusConnection.connectToBus(address, f"screen-lock-{kind}")
+        elif kind == "session":
+            bus = QtDBus.QDBusConnection.sessionBus()
+        else:
+            bus = QtDBus.QDBusConnection.systemBus()
+        if not bus.isConnected():
+            logger.info("Kein %s-Bus für die Sperrbildschirm-Erkennung", kind)
+            return None
+        return bus
+
+    def start(self) -> bool:
+        """Subscribe to all lock signals; return whether any is available."""
+        if QtDBus is None:
+            return False
+        self._session = self._bus(self._session_address, "session")
+        if self._session is not None:
+            for service, path in SCREENSAVERS:
+                # Any sender: the lock screen may (re)start after us.
+                if self._session.connect(
+                    "", path, service, "ActiveChanged", self._on_active_changed
+                ):
+                    self._sources.setdefault(service, False)
+                    self._query(
+                        self._session, service, path, service, "GetActive", service
+                    )
+
+        self._system = self._bus(self._system_address, "system")
+        path = self._session_path or self._own_session_path()
+        if self._system is not None and path:
+            connected = [
+                self._system.connect(
+                    LOGIND, path, LOGIND_SESSION, "Lock", self._on_logind_lock
+                ),
+                self._system.connect(
+                    LOGIND, path, LOGIND_SESSION, "Unlock", self._on_logind_unlock
+                ),
+                self._system.connect(
+                    LOGIND, path, PROPERTIES, "PropertiesChanged", self._on_properties
+                ),
+            ]
+            if any(connected):
+                self._sources.setdefault(LOGIND, False)
+                self._query(
+                    self._system,
+                    LOGIND,
+                    path,
+                    PROPERTIES,
+                    "Get",
+                    LOGIND,
+                    LOGIND_SESSION,
+                    "LockedHint",
+                )
+
+        if self._sources:
+            logger.info(
+                "Sperrbildschirm-Erkennung über D-Bus: %s", ", ".join(self._sources)
+            )
+        return self.available
+
+    def _own_session_path(self) -> Optional[str]:
+        session_id = os.environ.get("XDG_SESSION_ID")
+        if session_id:
+            return logind_session_path(session_id)
+        if self._system is None:
+            return None
+        # Not started from a login session (e.g. a systemd user unit).
+        message = QtDBus.QDBusMessage.createMethodCall(
+            LOGIND, "/org/freedesktop/login1", LOGIND + ".Manager", "GetSessionByPID"
+        )
+        message.setArguments([QtDBus.QDBusArgument(os.getpid(), QtCore.QMetaType.UInt)])
+        reply = self._system.call(message, QtDBus.QDBus.Block, CALL_TIMEOUT_MS)
+        if reply.type() != QtDBus.QDBusMessage.ReplyMessage:
+            return None
+        path = reply.arguments()[0]
+        return path.path() if hasattr(path, "path") else str(path)
+
+    def _query(self, bus, service, path, interface, method, source, *arguments):
+        """Ask for the current state without blocking the event loop."""
+        message = QtDBus.QDBusMessage.createMethodCall(service, path, interface, method)
+        if arguments:
+            message.setArguments(list(arguments))
+        watcher = QtDBus.QDBusPendingCallWatcher(
+            bus.asyncCall(message, CALL_TIMEOUT_MS), self
+        )
+        self._watchers.add(watcher)
+
+        def finished(watcher, source=source):
+            self._watchers.discard(watcher)
+            reply = QtDBus.QDBusPendingReply(watcher).reply()
+            watcher.deleteLater()
+            if reply.type() != QtDBus.QDBusMessage.ReplyMessage:
+                return  # Service not running; its signal may still come.
+            value = reply.arguments()[0] if reply.arguments() else False
+            self._set(source, bool(_unwrap(value)))
+
+        watcher.finished.connect(finished)
+
+    # ------------------------------------------------------------------
+    # Signals
+    # ------------------------------------------------------------------
+
+    def _set(self, source: str, locked: bool):
+        self._sources[source] = locked
+        state = any(self._sources.values())
+        if state != self.locked:
+            self.locked = state
+            logger.info(
+                "Bildschirm %s (%s)", "gesperrt" if state else "entsperrt", source
+            )
+            self.lockedChanged.emit(state, time.time())
+
+    @QtCore.pyqtSlot(QtDBus.QDBusMessage if QtDBus else "QVariant")
+    def _on_active_changed(self, message):
+        arguments = message.arguments()
+        if arguments:
+            self._set(message.interface(), bool(arguments[0]))
+
+    @QtCore.pyqtSlot()
+    def _on_logind_lock(self):
+        self._set(LOGIND, True)
+
+    @QtCore.pyqtSlot()
+    def _on_logind_unlock(self):
+        self._set(LOGIND, False)
+
+    @QtCore.pyqtSlot(QtDBus.QDBusMessage if QtDBus else "QVariant")
+    def _on_properties(self, message):
+        arguments = message.arguments()
+        if len(arguments) >= 2 and arguments[0] == LOGIND_SESSION:
+            changed = arguments[1]
+            if "LockedHint" in changed:
+                self._set(LOGIND, bool(_unwrap(changed["LockedHint"])))
+
+
+def _unwrap(value):
+    return value.variant() if hasattr(value, "variant") else value
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Screen lock monitor")
+    parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    app = QtCore.QCoreApplication(sys.argv)
+    monitor = ScreenLockMonitor()
+    monitor.lockedChanged.connect(
+        lambda locked, ts: print(
+            time.strftime("%H:%M:%S"), "locked" if locked else "unlocked"
+        )
+    )
+    if not monitor.start():
+        sys.exit("No lock signal available")
+    print("Watching, Ctrl+C to stop")
+    import signal
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    app.exec_()
@@ -1,96 +1,215 @@
 #!/home/user/venv/bin/python
 import datetime
+import logging
 import os
 import platform
 import sys
-from collections import defaultdict
+import threading
+from collections import OrderedDict, defaultdict
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 import map_resolve
 from data_manager import DataManager
+from history_store import get_history_store
+from usage_table import RatioBarDelegate, RatioRole
 
 IS_WINDOWS = platform.system() == "Windows"
 IS_LINUX = platform.system() == "Linux"
 
+logger = logging.getLogger(__name__)
+
 
 class StatisticsCache:
-    _cache = {}
+    """LRU cache for aggregates over days before today.
+
+    Closed days rarely change, but they can: an interval running over
+    midnight lands on yesterday, or a database is restored. Keys therefore
+    carry a version of the stored history. Today's usage is merged in from
+    the live counters on every request.
+    """
+
+    _cache = OrderedDict()
     _MAX = 20  # cap to avoid unbounded growth
+    _lock = threading.Lock()
+    hits = 0
+    misses = 0
 
     @classmethod
     def get(cls, key):
-        return cls._cache.get(key)
+        with cls._lock:
+            value = cls._cache.get(key)
+            if value is None:
+                cls.misses += 1
+            else:
+                cls.hits += 1
+                cls._cache.move_to_end(key)
+            return value
 
     @classmethod
     def set(cls, key, value):
-        if len(cls._cache) >= cls._MAX:
-            # Drop the oldest entry
-            cls._cache.pop(next(iter(cls._cache)))
-        cls._cache[key] = value
+        with cls._lock:
+            cls._cache[key] = value
+            cls._cache.move_to_end(key)
+            while len(cls._cache) > cls._MAX:
+                # Drop the least recently used entry
+                cls._cache.popitem(last=False)
 
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._cache.clear()
 
-def _compute_statistics(from_date, to_date, aggregation):
-    """Compute statistics synchronously. Returns (time_series, per_app, total_seconds)."""
-    cache_key = (
-        from_date.isoformat(),
-        to_date.isoformat(),
-        aggregation,
-        DataManager.get_data_version(),
-    )
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            return {
+                "hits": cls.hits,
+                "misses": cls.misses,
+                "size": len(cls._cache),
+                "max_size": cls._MAX,
+            }
+
+
+def _bucket_key(date, aggregation):
+    if aggregation == "day":
+        return date.isoformat()
+    if aggregation == "week":
+        y, w, _ = date.isocalendar()
+        return f"{y}-W{w:02d}"
+    return date.strftime("%Y-%m")
+
+
+def _compute_history(from_date, to_date, aggregation):
+    """Aggregate closed days; cached while they stay unchanged.
+    Returns (time_series, per_app)."""
+    # Closed days come from the prefix-sum store (one subtraction per app);
+    # SQLite does the bucketing if the store is unavailable or behind.
+    store = get_history_store()
+    try:
+        if store is not None:
+            store.refresh(to_date)
+    except Exception:
+        logger.exception("History store refresh failed, using SQL")
+        store = None
+    if store is not None and store.covers(to_date):
+        version = store.version
+    else:
+        store = None
+        version = DataManager.get_history_version()
+
+    cache_key = (from_date.isoformat(), to_date.isoformat(), aggregation, version)
     cached = StatisticsCache.get(cache_key)
     if cached:
-        return cached["time_series"], cached["per_app"], cached["total_seconds"]
+        return cached
 
-    rows = DataManager.get_daily_usage(from_date.isoformat(), to_date.isoformat())
+    if store is not None:
+        time_series, per_app = store.totals(from_date, to_date, aggregation)
+    else:
+        time_series, per_app = DataManager.get_usage_totals(
+            from_date, to_date, aggregation
+        )
+
+    result = (time_series, per_app)
+    StatisticsCache.set(cache_key, result)
+    return result
+
+
+def _add_today(time_series, per_app, today, aggregation, live_today=None):
+    """Merge today's per-app seconds into the aggregates."""
+    if live_today is None:
+        today_iso = today.isoformat()
+        live_today = {
+            app: seconds
+            for _, app, seconds in DataManager.get_daily_usage(today_iso, today_iso)
+        }
+    bucket_key = _bucket_key(today, aggregation)
+    for app_name, seconds in live_today.items():
+        time_series[bucket_key] += seconds
+        per_app[app_name] += seconds
+
+
+def _fill_gaps(time_series, from_date, to_date, aggregation):
+    """Buckets after the cached history (today, or future days of a custom
+    range) still need to show up with 0."""
+    for bucket, _first, _last in DataManager.get_calendar(
+        from_date, to_date, aggregation
+    ):
+        time_series.setdefault(bucket, 0)
+
+
+def _range_for(name, today, custom_from=None, custom_to=None):
+    """Return (from_date, to_date, aggregation) for a range name, or None."""
+    match name:
+        case "Week":
+            return today - datetime.timedelta(days=6), today, "day"
+        case "Month":
+            return today - datetime.timedelta(days=30), today, "week"
+        case "Year":
+            return today - datetime.timedelta(days=365), today, "month"
+        case "Custom":
+            return custom_from, custom_to, "day"
+    return None
+
+
+def _compute_statistics(from_date, to_date, aggregation, live_today=None):
+    """Compute statistics synchronously. Returns (time_series, per_app, total_seconds).
+
+    ``live_today`` maps app -> seconds for today (the tracker's in-memory
+    counters). Without it, today's rows are read from the database.
+    """
+    today = datetime.date.today()
+    history_to = min(to_date, today - datetime.timedelta(days=1))
 
     time_series = defaultdict(float)
     per_app = defaultdict(float)
 
-    for date, app_name, seconds in rows:
-        if aggregation == "day":
-            bucket_key = date
-        elif aggregation == "week":
-            y, w, _ = datetime.date.fromisoformat(date).isocalendar()
-            bucket_key = f"{y}-W{w:02d}"
-        else:  # month
-            bucket_key = date[:7]
-        time_series[bucket_key] += seconds
-        per_app[app_name] += seconds
+    if from_date <= history_to:
+        hist_series, hist_apps = _compute_history(from_date, history_to, aggregation)
+        time_series.update(hist_series)
+        per_app.update(hist_apps)
 
-    # Fill missing buckets with 0
-    if aggregation == "day":
-        current = from_date
-        while current <= to_date:
-            time_series.setdefault(current.isoformat(), 0)
-            current += datetime.timedelta(days=1)
-    elif aggregation == "week":
-        current = from_date
-        while current <= to_date:
-            y, w, _ = current.isocalendar()
-            time_series.setdefault(f"{y}-W{w:02d}", 0)
-            current += datetime.timedelta(weeks=1)
-    else:  # month
-        current = from_date
-        while current <= to_date:
-            time_series.setdefault(current.strftime("%Y-%m"), 0)
-            if current.month == 12:
-                current = current.replace(year=current.year + 1, month=1)
-            else:
-                current = current.replace(month=current.month + 1)
+    if from_date <= today <= to_date:
+        _add_today(time_series, per_app, today, aggregation, live_today)
 
-    total_seconds = sum(time_series.values())
-    StatisticsCache.set(
-        cache_key,
-        {
-            "time_series": dict(time_series),
-            "per_app": dict(per_app),
-            "total_seconds": total_seconds,
-        },
+    _fill_gaps(
+        time_series,
+        max(from_date, history_to + datetime.timedelta(days=1)),
+        to_date,
+        aggregation,
     )
+
+    total_seconds = sum(time_series.values())
     return time_series, per_app, total_seconds
 
 
+class _StatisticsSignals(QtCore.QObject):
+    # (request token, (time_series, per_app, total_seconds) or None on error)
+    ready = QtCore.pyqtSignal(int, object)
+
+
+class _StatisticsWorker(QtCore.QRunnable):
+    """Runs _compute_statistics off the GUI thread for one reload request."""
+
+    def __init__(self, token, is_current, from_date, to_date, aggregation, live_today):
+        super().__init__()
+        self.signals = _StatisticsSignals()
+        self.token = token
+        self.is_current = is_current
+        self.args = (from_date, to_date, aggregation, live_today)
+
+    def run(self):
+        # A newer range was selected while this one waited in the pool.
+        if not self.is_current(self.token):
+            return
+        try:
+            result = _compute_statistics(*self.args)
+        except Exception:
+            logger.exception("Fehler beim Berechnen der Statistiken")
+            result = None
+        self.signals.ready.emit(self.token, result)
+
+
 class LoadingOverlay(QtWidgets.QWidget):
     def __init__(self, parent):
         super().__init__(parent)
@@ -110,7 +229,7 @@ class LoadingOverlay(QtWidgets.QWidget):
 
 
 class StatisticsPage(QtWidgets.QWidget):
-    def __init__(self, stack, icon_manager, app_mapping, parent=None):
+    def __init__(self, stack, icon_manager, app_mapping, parent=None, live_usage=None):
         # Lazy-import matplotlib here so it is only loaded when the Statistics
         # page is first created (i.e. when the user opens it), not at startup.
         from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
@@ -123,6 +242,13 @@ class StatisticsPage(QtWidgets.QWidget):
         self.stack = stack
         self.icon_manager = icon_manager
         self.app_mapping = app_mapping
+        # (app, icon hint) -> table row, for icons that arrive later
+        self._icon_rows = {}
+        icon_ready = getattr(icon_manager, "iconReady", None)
+        if icon_ready is not None:
+            icon_ready.connect(self._on_icon_ready)
+        # Callable returning today's live per-app seconds from the tracker.
+        self.live_usage = live_usage
         layout = QtWidgets.QVBoxLayout(self)
 
         top = QtWidgets.QHBoxLayout()
@@ -166,8 +292,9 @@ class StatisticsPage(QtWidgets.QWidget):
         layout.addWidget(self.canvas, stretch=2)
 
         self.table = QtWidgets.QTableWidget()
-        self.table.setColumnCount(3)
-        self.table.setHorizontalHeaderLabels(["Icon", "App", "Total Time"])
+        self.table.setColumnCount(4)
+        self.table.setHorizontalHeaderLabels(["Icon", "App", "Total Time", "Ratio"])
+        self.table.setItemDelegateForColumn(3, RatioBarDelegate(self.table))
         self.table.horizontalHeader().setSectionResizeMode(
             1, QtWidgets.QHeaderView.Stretch
         )
@@ -178,39 +305,58 @@ class StatisticsPage(QtWidgets.QWidget):
         self.overlay = LoadingOverlay(self)
         self.overlay.hide()
 
+        # Statistics are computed on a worker; only the result of the latest
+        # request (by token) is shown.
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._request_token = 0
+
         self.reload()
 
     def go_back(self):
         self.stack.setCurrentIndex(0)
 
     def reload(self):
-        now = datetime.date.today()
-
-        match self.range_combo.currentText():
-            case "Week":
-                from_date = now - datetime.timedelta(days=6)
-                agg = "day"
-            case "Month":
-                from_date = now - datetime.timedelta(days=30)
-                agg = "week"
-            case "Year":
-                from_date = now - datetime.timedelta(days=365)
-                agg = "month"
-            case "Custom":
-                self.from_date.setVisible(True)
-                self.to_date.setVisible(True)
-                from_date = self.from_date.date().toPyDate()
-                now = self.to_date.date().toPyDate()
-                agg = "day"
-            case _:
-                return
+        range_name = self.range_combo.currentText()
+        if range_name == "Custom":
+            self.from_date.setVisible(True)
+            self.to_date.setVisible(True)
+        selected = _range_for(
+            range_name,
+            datetime.date.today(),
+            self.from_date.date().toPyDate(),
+            self.to_date.date().toPyDate(),
+        )
+        if selected is None:
+            return
+        from_date, now, agg = selected
 
         self.overlay.resize(self.size())
         self.overlay.show()
-        QtWidgets.QApplication.processEvents()  # force repaint before blocking call
 
-        time_series, per_app, total_seconds = _compute_statistics(from_date, now, agg)
-        self.on_ready(time_series, per_app, total_seconds)
+        self._request_token += 1
+        live_today = self.live_usage() if self.live_usage else None
+        worker = _StatisticsWorker(
+            self._request_token,
+            self._is_current_request,
+            from_date,
+            now,
+            agg,
+            live_today,
+        )
+        worker.signals.ready.connect(self._on_worker_ready)
+        self._pool.start(worker)
+
+    def _is_current_request(self, token):
+        return token == self._request_token
+
+    def _on_worker_ready(self, token, result):
+        if token != self._request_token:
+            return  # stale result from an earlier range selection
+        if result is None:
+            self.overlay.hide()
+            return
+        self.on_ready(*result)
 
     def on_ready(self, time_series, per_app, total_seconds):
 
@@ -218,6 +364,10 @@ class StatisticsPage(QtWidgets.QWidget):
         formatted_total = str(datetime.timedelta(seconds=int(total_seconds)))
         self.total_label.setText(f"Total Usage: {formatted_total}")
 
+        self._draw_chart(time_series)
+        self._fill_table(per_app)
+
+    def _draw_chart(self, time_series):
         self.figure.clear()
         ax = self.figure.add_subplot(111)
         keys = sorted(time_series.keys())
@@ -228,11 +378,23 @@ class StatisticsPage(QtWidgets.QWidget):
         ax.tick_params(axis="x", rotation=45)
         self.canvas.draw()
 
+    def _on_icon_ready(self, app_name, icon_hint):
+        row = self._icon_rows.get((app_name, icon_hint))
+        item = self.table.item(row, 0) if row is not None else None
+        if item is not None:
+            item.setIcon(
+                self.icon_manager.get_icon_for_app(app_name, icon_hint or None)
+            )
+
+    def _fill_table(self, per_app):
         sorted_apps = sorted(per_app.items(), key=lambda x: x[1], reverse=True)
+        total = sum(per_app.values())
         self.table.setRowCount(len(sorted_apps))
+        self._icon_rows = {}
         for row_idx, (app, seconds) in enumerate(sorted_apps):
             display_name, icon_hint = self.app_mapping.resolve(app)
             icon = self.icon_manager.get_icon_for_app(app, icon_hint)
+            self._icon_rows[app, icon_hint or ""] = row_idx
 
             icon_item = QtWidgets.QTableWidgetItem()
             icon_item.setIcon(icon)
@@ -241,6 +403,11 @@ class StatisticsPage(QtWidgets.QWidget):
                 str(datetime.timedelta(seconds=int(seconds)))
             )
 
+            ratio = seconds / total if total else 0.0
+            ratio_item = QtWidgets.QTableWidgetItem(f"{ratio * 100:.1f}%")
+            ratio_item.setData(RatioRole, ratio)
+
             self.table.setItem(row_idx, 0, icon_item)
             self.table.setItem(row_idx, 1, name_item)
             self.table.setItem(row_idx, 2, time_item)
+            self.table.setItem(row_idx, 3, ratio_item)
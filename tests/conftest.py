@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top level of the repository, not in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """An empty usage database in tmp_path, shut down after the test."""
+    from data_manager import DataManager
+
+    monkeypatch.setattr(DataManager, "DB_PATH", str(tmp_path / "usageData.db"))
+    DataManager.initialize_database()
+    yield DataManager
+    DataManager.shutdown()
@@ -0,0 +1,89 @@
+"""Exec line parsing and the Exec-program index of DesktopIndex."""
+
+import pytest
+
+from desktop_index import DesktopIndex, command_program_names, exec_program_names
+
+
+@pytest.mark.parametrize(
+    "exec_line, names",
+    [
+        ("/usr/bin/gedit %U", ["/usr/bin/gedit", "gedit"]),
+        (
+            "env GDK_BACKEND=x11 MOZ_ENABLE_WAYLAND=0 /usr/lib/firefox/firefox %u",
+            ["/usr/lib/firefox/firefox", "firefox"],
+        ),
+        ("env -u DISPLAY nice -n 5 code --new-window %F", ["code"]),
+        ("gamemoderun mangohud %%-literal", ["%-literal"]),
+        (
+            "/usr/bin/flatpak run --branch=stable --arch=x86_64 "
+            "--command=spotify --file-forwarding com.spotify.Client @@u %U @@",
+            ["spotify", "com.spotify.client", "client"],
+        ),
+        (
+            "flatpak run --command gimp-2.10 org.gimp.GIMP//stable",
+            ["gimp-2.10", "org.gimp.gimp", "gimp"],
+        ),
+        (
+            'sh -c "env FOO=1 /opt/Game/Game.AppImage --fullscreen"',
+            ["/opt/game/game.appimage", "game.appimage", "game"],
+        ),
+        (
+            "bash -c 'exec steam-run ./start.sh'",
+            ["./start.sh", "start.sh", "start"],
+        ),
+        ("python3 /opt/app/main.py", ["/opt/app/main.py", "main.py", "main"]),
+        ('"/opt/My App/app" %F', ["/opt/my app/app", "app"]),
+    ],
+)
+def test_exec_program_names(exec_line, names):
+    assert exec_program_names(exec_line) == names
+
+
+def test_nested_shells_stop_recursing():
+    line = 'sh -c "sh -c \'sh -c \\"sh -c tool\\"\'"'
+    assert exec_program_names(line) == []
+
+
+def test_command_line_of_a_process():
+    argv = ["/usr/bin/python3", "-u", "/home/me/bin/notes.py", "--tray"]
+    assert command_program_names(argv) == [
+        "/home/me/bin/notes.py",
+        "notes.py",
+        "notes",
+    ]
+
+
+def test_find_by_exec(tmp_path):
+    apps = tmp_path / "applications"
+    apps.mkdir()
+    entries = {
+        "firefox": "env MOZ_ENABLE_WAYLAND=1 /usr/lib/firefox/firefox %u",
+        "spotify": "flatpak run --command=spotify com.spotify.Client",
+        "game": 'sh -c "gamemoderun /opt/Game/game.x86_64"',
+        "broken": "",
+    }
+    for file_id, exec_line in entries.items():
+        (apps / f"{file_id}.desktop").write_text(
+            f"[Desktop Entry]\nName={file_id}\nExec={exec_line}\n", encoding="utf-8"
+        )
+    index = DesktopIndex(dirs=[str(apps)], cache_path=str(tmp_path / "cache"))
+
+    def found(program):
+        return [entry.file_id for entry in index.find_by_exec(program)]
+
+    assert found("/usr/lib/firefox/firefox") == ["firefox"]
+    assert found("Firefox") == ["firefox"]
+    assert found("spotify") == ["spotify"]
+    assert found("com.spotify.Client") == ["spotify"]
+    assert found("game.x86_64") == ["game"]
+    assert found("gamemoderun") == []
+    assert found("env") == []
+    assert found("sh") == []
+
+    # Rebuilt when the index picks up a new file.
+    (apps / "code.desktop").write_text(
+        "[Desktop Entry]\nName=Code\nExec=/usr/share/code/code %F\n", encoding="utf-8"
+    )
+    index.refresh(force=True)
+    assert found("code") == ["code"]
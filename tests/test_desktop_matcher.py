@@ -0,0 +1,74 @@
+"""_DesktopMatcher must return what the four linear scans return."""
+
+import random
+
+import pytest
+
+from desktop_index import DesktopEntry
+from window_resolver import _DesktopMatcher, _find_desktop_linear
+
+# A small alphabet so names, classes and substrings collide often.
+_SYLLABLES = ["fi", "re", "fox", "Code", "term", "ORG", "-", ".", "gnome", "x"]
+
+
+def _word(rng, max_parts=4):
+    return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(1, max_parts)))
+
+
+def _candidates(rng, count):
+    entries = []
+    for i in range(count):
+        name = _word(rng) if rng.random() < 0.9 else ""
+        wm_class = _word(rng) if rng.random() < 0.4 else ""
+        exec_line = f"/usr/bin/{_word(rng)} %U" if rng.random() < 0.9 else ""
+        entries.append(
+            DesktopEntry(
+                f"/usr/share/applications/{_word(rng)}{i % 7}.desktop",
+                name,
+                exec_line,
+                "",
+                wm_class,
+                True,
+            )
+        )
+    return entries
+
+
+def _queries(rng, candidates):
+    words = [None, "", "a", "Zz", "x", "no-such-window-class"]
+    for entry in candidates:
+        for text in (entry.startup_wm_class, entry.name, entry.file_id, entry.exec):
+            if text:
+                words.append(text)
+                start = rng.randrange(len(text))
+                words.append(text[start : start + rng.randint(1, 12)])
+                words.append(text.upper())
+    words.extend(_word(rng) for _ in range(50))
+    return words
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matcher_matches_linear_scans(seed):
+    rng = random.Random(seed)
+    candidates = _candidates(rng, 300)
+    matcher = _DesktopMatcher(candidates, generation=0)
+    words = _queries(rng, candidates)
+
+    for _ in range(3000):
+        wm_class, wm_name = rng.choice(words), rng.choice(words)
+        expected = _find_desktop_linear(candidates, wm_class, wm_name)
+        assert matcher.find(wm_class, wm_name) == expected, (wm_class, wm_name)
+
+
+def test_memo_is_bounded(monkeypatch):
+    monkeypatch.setattr(_DesktopMatcher, "MEMO_SIZE", 16)
+    rng = random.Random(0)
+    candidates = _candidates(rng, 50)
+    matcher = _DesktopMatcher(candidates, generation=0)
+
+    for i in range(100):
+        title = f"Document {i} - Editor"
+        assert matcher.find("fox", title) == _find_desktop_linear(
+            candidates, "fox", title
+        )
+    assert len(matcher._memo) <= 16
@@ -0,0 +1,199 @@
+"""End-to-end focus tracking on a virtual X server.
+
+The test plays the window manager: it creates windows and marks one active
+by setting _NET_ACTIVE_WINDOW on the root window. MainWindow must book the
+time between those switches, as pushed by the FocusWatcher thread.
+"""
+
+import ctypes
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import pytest
+
+if not sys.platform.startswith("linux") or shutil.which("Xvfb") is None:
+    pytest.skip("needs Xvfb", allow_module_level=True)
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+
+import window_resolver  # noqa: E402
+
+PROP_MODE_REPLACE = 0
+# Allowed difference between a switch and the interval booked for it.
+TOLERANCE = 0.25
+
+
+class _WindowManager:
+    """Just enough of a window manager to move the focus around."""
+
+    def __init__(self, display_name: str):
+        xlib = window_resolver._X11Display._load_xlib()
+        xlib.XCreateSimpleWindow.argtypes = [
+            ctypes.c_void_p,  # display
+            ctypes.c_ulong,  # parent
+            ctypes.c_int,  # x
+            ctypes.c_int,  # y
+            ctypes.c_uint,  # width
+            ctypes.c_uint,  # height
+            ctypes.c_uint,  # border_width
+            ctypes.c_ulong,  # border
+            ctypes.c_ulong,  # background
+        ]
+        xlib.XCreateSimpleWindow.restype = ctypes.c_ulong
+        xlib.XChangeProperty.argtypes = [
+            ctypes.c_void_p,  # display
+            ctypes.c_ulong,  # window
+            ctypes.c_ulong,  # property
+            ctypes.c_ulong,  # type
+            ctypes.c_int,  # format
+            ctypes.c_int,  # mode
+            ctypes.c_void_p,  # data
+            ctypes.c_int,  # nelements
+        ]
+        xlib.XChangeProperty.restype = ctypes.c_int
+        self.xlib = xlib
+        self.display = xlib.XOpenDisplay(display_name.encode())
+        assert self.display, display_name
+        self.root = xlib.XDefaultRootWindow(self.display)
+
+    def _atom(self, name: str) -> int:
+        return self.xlib.XInternAtom(self.display, name.encode(), False)
+
+    def create(self, wm_class: str) -> int:
+        window = self.xlib.XCreateSimpleWindow(
+            self.display, self.root, 0, 0, 100, 100, 0, 0, 0
+        )
+        data = ctypes.create_string_buffer(f"{wm_class.lower()}\0{wm_class}\0".encode())
+        self.xlib.XChangeProperty(
+            self.display,
+            window,
+            self._atom("WM_CLASS"),
+            self._atom("STRING"),
+            8,
+            PROP_MODE_REPLACE,
+            ctypes.cast(data, ctypes.c_void_p),
+            len(data) - 1,
+        )
+        self.xlib.XFlush(self.display)
+        return window
+
+    def activate(self, window: int):
+        data = (ctypes.c_long * 1)(window)
+        self.xlib.XChangeProperty(
+            self.display,
+            self.root,
+            self._atom("_NET_ACTIVE_WINDOW"),
+            self._atom("WINDOW"),
+            32,
+            PROP_MODE_REPLACE,
+            ctypes.cast(data, ctypes.c_void_p),
+            1,
+        )
+        self.xlib.XFlush(self.display)
+
+    def close(self):
+        self.xlib.XCloseDisplay(self.display)
+
+
+@pytest.fixture
+def xvfb(tmp_path, monkeypatch):
+    number = next(
+        n
+        for n in range(90, 200)
+        if not os.path.exists(f"/tmp/.X11-unix/X{n}")
+        and not os.path.exists(f"/tmp/.X{n}-lock")
+    )
+    display = f":{number}"
+    proc = subprocess.Popen(
+        ["Xvfb", display, "-screen", "0", "640x480x24", "-nolisten", "tcp"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while not os.path.exists(f"/tmp/.X11-unix/X{number}"):
+        if proc.poll() is not None or time.monotonic() > deadline:
+            proc.kill()
+            pytest.skip("Xvfb did not start")
+        time.sleep(0.05)
+
+    monkeypatch.setenv("DISPLAY", display)
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    # The shared resolver connection must go to this server.
+    monkeypatch.setattr(window_resolver, "_x11", None)
+    monkeypatch.setattr(window_resolver, "_x11_failed", False)
+    wm = _WindowManager(display)
+    yield wm
+    wm.close()
+    if window_resolver._x11 is not None:
+        window_resolver._x11.close()
+    proc.terminate()
+    proc.wait(10)
+
+
+def _run(app, seconds: float):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+
+
+def test_focus_switches_are_booked_with_their_durations(xvfb, database, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["main.py"])  # parsed when main is imported
+    main = pytest.importorskip("main")
+    monkeypatch.setattr(main, "IS_WAYLAND", False)
+    # No D-Bus here: the screen is never locked.
+    monkeypatch.setattr(main.MainWindow, "start_lock_monitor", lambda self: None)
+    monkeypatch.setattr(main, "is_screen_locked_linux", lambda: False)
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+    alpha = xvfb.create("ScreentimeTestAlpha")
+    beta = xvfb.create("ScreentimeTestBeta")
+    xvfb.activate(beta)
+    key_beta, _ = main.get_active_window_process()
+    xvfb.activate(alpha)
+    key_alpha, _ = main.get_active_window_process()
+    assert key_alpha and key_beta and key_alpha != key_beta
+
+    window = main.MainWindow()
+    try:
+        assert not window.daemon_attached
+        assert window.focus_watcher is not None
+        _run(app, 1.5)  # the first tick starts counting alpha
+        assert window.current_process == key_alpha
+
+        switches = []
+        for target, seconds in ((beta, 1.5), (alpha, 1.0), (beta, 0.5)):
+            xvfb.activate(target)
+            switches.append(time.time())
+            _run(app, seconds)
+
+        assert window.current_process == key_beta
+        assert window.usage_today[key_beta] == pytest.approx(1.5, abs=TOLERANCE)
+    finally:
+        window.exit_app()
+        if window.focus_watcher is not None:
+            window.focus_watcher.join(2)
+        if window._tracking_lock is not None:
+            os.close(window._tracking_lock)
+
+    with database.read_snapshot() as conn:
+        intervals = conn.execute(
+            "SELECT app_key, start_ts, end_ts FROM FocusIntervals ORDER BY start_ts"
+        ).fetchall()
+    booked = [
+        (app, start, end)
+        for app, start, end in intervals
+        if start >= switches[0] - TOLERANCE
+    ]
+    assert [app for app, _start, _end in booked] == [key_beta, key_alpha, key_beta]
+    for (_app, start, end), switch, following in zip(
+        booked, switches, switches[1:] + [None]
+    ):
+        assert start == pytest.approx(switch, abs=TOLERANCE)
+        if following is not None:
+            assert end == pytest.approx(following, abs=TOLERANCE)
@@ -0,0 +1,101 @@
+"""Prefix-sum range totals must match summing DailyUsage in SQL."""
+
+import datetime
+import math
+import os
+import random
+
+import pytest
+
+import history_store
+
+
+def _sql_totals(data_manager, from_date, to_date):
+    """Total and per-app seconds over a day range, straight from DailyUsage."""
+    with data_manager.read_snapshot() as conn:
+        rows = conn.execute(
+            "SELECT app_name, SUM(duration_seconds) FROM DailyUsage "
+            "WHERE date BETWEEN ? AND ? GROUP BY app_name",
+            (from_date.isoformat(), to_date.isoformat()),
+        ).fetchall()
+    return sum(seconds for _, seconds in rows), dict(rows)
+
+
+def _store_totals(store, from_date, to_date):
+    """The same totals as one prefix-sum difference per column."""
+    lo = max((from_date - store.first_day).days, 0) - 1
+    hi = (to_date - store.first_day).days
+    if hi < 0:
+        return 0.0, {}
+    per_app = {}
+    for i, app in enumerate(store.apps):
+        seconds = store._prefix(hi, i + 1) - store._prefix(lo, i + 1)
+        if seconds:
+            per_app[app] = seconds
+    return store._prefix(hi, 0) - store._prefix(lo, 0), per_app
+
+
+def _fill(data_manager, rng, first_day, days, apps):
+    for offset in range(days):
+        day = (first_day + datetime.timedelta(days=offset)).isoformat()
+        for app in rng.sample(apps, max(1, len(apps) // 3)):
+            data_manager.add_daily_usage(app, rng.random() * 3000, day)
+    data_manager.flush(wait=True)
+
+
+def _check_ranges(data_manager, store, rng, first_day, last_day):
+    span = (last_day - first_day).days
+    for _ in range(200):
+        from_date = first_day + datetime.timedelta(days=rng.randint(-30, span))
+        to_date = min(last_day, from_date + datetime.timedelta(rng.randint(0, span)))
+        total, per_app = _store_totals(store, from_date, to_date)
+        expected_total, expected_apps = _sql_totals(data_manager, from_date, to_date)
+        assert math.isclose(total, expected_total, abs_tol=1e-6)
+        assert per_app.keys() == expected_apps.keys()
+        for app, seconds in expected_apps.items():
+            assert math.isclose(per_app[app], seconds, abs_tol=1e-6), app
+
+
+@pytest.fixture
+def store(database):
+    store = history_store.HistoryStore(database.DB_PATH)
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_range_totals_match_sql(database, store, seed):
+    rng = random.Random(seed)
+    first_day = datetime.date(2020, 2, 20)
+    apps = [f"app{i}" for i in range(10)]
+    _fill(database, rng, first_day, 120, apps)
+    last_day = first_day + datetime.timedelta(days=119)
+    store.refresh(last_day)
+    _check_ranges(database, store, rng, first_day, last_day)
+
+    # Appending closed days, with a few new apps that still fit the row.
+    _fill(database, rng, last_day + datetime.timedelta(days=1), 60, apps + ["new"])
+    last_day += datetime.timedelta(days=60)
+    store.refresh(last_day)
+    _check_ranges(database, store, rng, first_day, last_day)
+
+    # More new apps than the capacity lays the file out again.
+    more = [f"more{i}" for i in range(store.capacity)]
+    _fill(database, rng, last_day + datetime.timedelta(days=1), 30, more)
+    last_day += datetime.timedelta(days=30)
+    store.refresh(last_day)
+    assert store.capacity > len(more)
+    _check_ranges(database, store, rng, first_day, last_day)
+
+
+def test_refresh_of_empty_database_keeps_files(database, store):
+    store.refresh()
+    assert not os.path.exists(store.meta_path)
+    assert not os.path.exists(store.bin_path)
+
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    database.add_daily_usage("editor", 60, yesterday.isoformat())
+    database.flush(wait=True)
+    store.refresh()
+    assert store.covers(yesterday)
+    assert os.path.exists(store.meta_path)
@@ -0,0 +1,67 @@
+"""Icon candidates for a process, found through the .desktop Exec index."""
+
+import logging
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+import desktop_index  # noqa: E402
+from icon_manager import THEME_PREFIX, _proc_icon_candidates  # noqa: E402
+from process_index import ProcInfo  # noqa: E402
+
+
+@pytest.fixture
+def applications(tmp_path, monkeypatch):
+    """A desktop index over an empty applications dir in tmp_path."""
+    apps = tmp_path / "applications"
+    apps.mkdir()
+    index = desktop_index.DesktopIndex(
+        dirs=[str(apps)], cache_path=str(tmp_path / "desktop_index.pickle")
+    )
+    monkeypatch.setattr(desktop_index, "_index", index)
+    return apps
+
+
+def _write_entry(apps, file_id, exec_line, icon):
+    (apps / f"{file_id}.desktop").write_text(
+        f"[Desktop Entry]\nType=Application\nName={file_id}\n"
+        f"Exec={exec_line}\nIcon={icon}\n",
+        encoding="utf-8",
+    )
+    desktop_index.get_desktop_index().refresh(force=True)
+
+
+def test_exec_match_and_exe_dir_icon(applications, tmp_path, caplog):
+    bin_dir = tmp_path / "opt" / "tool"
+    bin_dir.mkdir(parents=True)
+    exe = bin_dir / "tool-bin"
+    exe.write_text("")
+    (bin_dir / "tool-bin.png").write_bytes(b"")
+    icon = tmp_path / "tool.svg"
+    icon.write_text("<svg/>")
+    _write_entry(
+        applications, "org.example.Tool", f"env GDK_BACKEND=x11 {exe} %U", icon
+    )
+    _write_entry(applications, "other", "/usr/bin/other", "other")
+
+    proc = ProcInfo(1234, "tool-bin", str(exe), f"{exe} --new-window", None, 0)
+    with caplog.at_level(logging.ERROR):
+        candidates = _proc_icon_candidates(proc)
+
+    assert not caplog.records
+    assert candidates[0] == str(icon)
+    assert THEME_PREFIX + "tool-bin" in candidates
+    assert str(bin_dir / "tool-bin.png") in candidates
+    assert THEME_PREFIX + "other" not in candidates
+
+
+def test_script_found_through_interpreter_command_line(applications):
+    _write_entry(applications, "script", "python3 /opt/app/run-app.py", "run-app")
+
+    proc = ProcInfo(
+        99, "python3", "/usr/bin/python3.12", "python3 /opt/app/run-app.py", None, 0
+    )
+    candidates = _proc_icon_candidates(proc)
+
+    assert candidates[0] == THEME_PREFIX + "run-app"
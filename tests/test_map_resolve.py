@@ -0,0 +1,69 @@
+"""Memoization of AppMapping.resolve."""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import map_resolve
+from map_resolve import AppMapping
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(map_resolve, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def mapping(tmp_path, clock, monkeypatch):
+    path = tmp_path / "map.json"
+    path.write_text(json.dumps({"code": {"display_name": "VS Code"}}))
+    # No running processes: nothing is identified as a Steam game.
+    monkeypatch.setattr(map_resolve, "get_process_index", lambda: None)
+    return AppMapping(str(path))
+
+
+def test_results_without_icon_stay_cached(mapping, clock, monkeypatch):
+    calls = []
+    uncached = mapping._resolve_uncached
+    monkeypatch.setattr(
+        mapping, "_resolve_uncached", lambda raw: calls.append(raw) or uncached(raw)
+    )
+
+    assert mapping.resolve("firefox") == ("firefox", None)
+    assert mapping.resolve("code") == ("VS Code", None)
+    clock[0] += AppMapping.NEGATIVE_TTL * 10
+    assert mapping.resolve("firefox") == ("firefox", None)
+    assert mapping.resolve("code") == ("VS Code", None)
+
+    assert calls == ["firefox", "code"]
+    assert mapping.cache_stats()["expired"] == 0
+
+
+def test_steam_miss_is_retried(mapping, clock, monkeypatch):
+    icons = iter([(None, None), ("Some Game", "/icons/steam_icon_42.png")])
+    monkeypatch.setattr(map_resolve, "_get_steam_game_info", lambda _id: next(icons))
+
+    assert mapping.resolve("steam_app_42") == ("steam_app_42", None)
+    clock[0] += AppMapping.NEGATIVE_TTL / 2
+    assert mapping.resolve("steam_app_42") == ("steam_app_42", None)
+
+    # The first launch cached the icon meanwhile.
+    clock[0] += AppMapping.NEGATIVE_TTL
+    assert mapping.resolve("steam_app_42") == (
+        "Some Game",
+        "/icons/steam_icon_42.png",
+    )
+    assert mapping.cache_stats()["expired"] == 1
+
+
+def test_mapping_change_on_disk_invalidates(mapping, clock, tmp_path):
+    assert mapping.resolve("firefox") == ("firefox", None)
+    (tmp_path / "map.json").write_text(
+        json.dumps({"firefox": {"display_name": "Firefox"}})
+    )
+    mapping._mtime_ns = -1  # a coarse mtime may not have moved
+    clock[0] += AppMapping.MTIME_CHECK_INTERVAL
+    assert mapping.resolve("firefox") == ("Firefox", None)
@@ -0,0 +1,106 @@
+"""ScreenLockMonitor driven by stub lock screen services on a private bus."""
+
+import shutil
+import subprocess
+import time
+
+import pytest
+
+if shutil.which("dbus-daemon") is None:
+    pytest.skip("needs dbus-daemon", allow_module_level=True)
+QtCore = pytest.importorskip("PyQt5.QtCore")
+QtDBus = pytest.importorskip("PyQt5.QtDBus")
+
+from screen_lock import LOGIND_SESSION, PROPERTIES, ScreenLockMonitor  # noqa: E402
+from window_resolver import LOGIND, logind_session_path  # noqa: E402
+
+SESSION_PATH = logind_session_path("2")
+
+
+class StubScreenSaver(QtCore.QObject):
+    QtCore.Q_CLASSINFO("D-Bus Interface", "org.gnome.ScreenSaver")
+
+    # The stub lock screen is already active when the monitor starts.
+    @QtCore.pyqtSlot(result=bool)
+    def GetActive(self):
+        return True
+
+
+@pytest.fixture
+def bus_address():
+    proc = subprocess.Popen(
+        ["dbus-daemon", "--session", "--nofork", "--nopidfile", "--print-address=1"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    try:
+        yield proc.stdout.readline().strip()
+    finally:
+        proc.terminate()
+        proc.wait()
+        proc.stdout.close()
+
+
+@pytest.fixture
+def stub(bus_address):
+    """A connection owning the GNOME screen saver and logind names."""
+    connection = QtDBus.QDBusConnection.connectToBus(bus_address, "screen-lock-stub")
+    screensaver = StubScreenSaver()
+    connection.registerObject(
+        "/org/gnome/ScreenSaver", screensaver, QtDBus.QDBusConnection.ExportAllSlots
+    )
+    for service in ("org.gnome.ScreenSaver", LOGIND):
+        connection.registerService(service)
+    yield connection
+    QtDBus.QDBusConnection.disconnectFromBus("screen-lock-stub")
+
+
+def test_lock_signals(bus_address, stub):
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    # One daemon stands in for both the session and the system bus.
+    monitor = ScreenLockMonitor(
+        session_bus=bus_address, system_bus=bus_address, session_path=SESSION_PATH
+    )
+    events = []
+    monitor.lockedChanged.connect(lambda locked, _ts: events.append(locked))
+
+    def wait(count, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while len(events) < count and time.monotonic() < deadline:
+            app.processEvents(QtCore.QEventLoop.AllEvents, 50)
+
+    def signal(path, interface, name, *arguments):
+        message = QtDBus.QDBusMessage.createSignal(path, interface, name)
+        message.setArguments(list(arguments))
+        stub.send(message)
+
+    assert monitor.start()
+    wait(1)
+    assert events == [True]  # initial GetActive
+
+    signal("/org/gnome/ScreenSaver", "org.gnome.ScreenSaver", "ActiveChanged", False)
+    wait(2)
+    assert events == [True, False]
+
+    signal(SESSION_PATH, LOGIND_SESSION, "Lock")
+    wait(3)
+    assert events == [True, False, True]
+
+    # Still locked by logind: the screensaver going away changes nothing.
+    signal("/ScreenSaver", "org.freedesktop.ScreenSaver", "ActiveChanged", False)
+    signal(
+        SESSION_PATH,
+        PROPERTIES,
+        "PropertiesChanged",
+        LOGIND_SESSION,
+        {"LockedHint": QtDBus.QDBusVariant(False)},
+        [],
+    )
+    wait(4)
+    assert events == [True, False, True, False]
+
+    # Another session's lock is not ours.
+    signal(logind_session_path("7"), LOGIND_SESSION, "Lock")
+    wait(5, timeout=0.3)
+    assert events == [True, False, True, False]
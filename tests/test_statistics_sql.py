@@ -0,0 +1,177 @@
+"""The SQL/prefix-sum statistics must match the old per-row Python version."""
+
+import datetime
+import math
+import random
+from collections import defaultdict
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+import history_store  # noqa: E402
+from statistics import StatisticsCache, _compute_statistics  # noqa: E402
+
+
+def _bucket(day, aggregation):
+    if aggregation == "day":
+        return day.isoformat()
+    if aggregation == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    return day.strftime("%Y-%m")
+
+
+def _reference(data_manager, from_date, to_date, aggregation):
+    """The former _compute_statistics: bucket every row in Python, then add a
+    0 for every bucket any day of the range falls in."""
+    time_series = defaultdict(float)
+    per_app = defaultdict(float)
+    for date, app, seconds in data_manager.get_daily_usage(
+        from_date.isoformat(), to_date.isoformat()
+    ):
+        time_series[_bucket(datetime.date.fromisoformat(date), aggregation)] += seconds
+        per_app[app] += seconds
+    day = from_date
+    while day <= to_date:
+        time_series.setdefault(_bucket(day, aggregation), 0)
+        day += datetime.timedelta(days=1)
+    return time_series, per_app
+
+
+def _assert_close(actual, expected, skip_zero=False):
+    if skip_zero:
+        # Apps without usage in the range may or may not be listed.
+        actual = {k: v for k, v in actual.items() if v}
+        expected = {k: v for k, v in expected.items() if v}
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        assert math.isclose(actual[key], value, abs_tol=1e-6), key
+
+
+def _fill(data_manager, rng, first_day, days, apps=8):
+    for offset in range(days):
+        day = (first_day + datetime.timedelta(days=offset)).isoformat()
+        for app in range(apps):
+            if rng.random() < 0.3:
+                data_manager.add_daily_usage(f"app{app}", rng.random() * 3000, day)
+    data_manager.flush(wait=True)
+
+
+@pytest.fixture
+def statistics_db(database, monkeypatch):
+    StatisticsCache.clear()
+    monkeypatch.setattr(history_store, "_store", None)
+    monkeypatch.setattr(history_store, "_store_failed", False)
+    yield database
+    if history_store._store is not None:
+        history_store._store.close()
+    StatisticsCache.clear()
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_compute_statistics_matches_reference(statistics_db, seed):
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    # History over a few year and month boundaries, up to and including today.
+    first_day = today - datetime.timedelta(days=800)
+    _fill(statistics_db, rng, first_day, 801)
+
+    for _ in range(150):
+        from_date = first_day + datetime.timedelta(days=rng.randint(-40, 820))
+        to_date = from_date + datetime.timedelta(days=rng.randint(0, 400))
+        aggregation = rng.choice(["day", "week", "month"])
+
+        time_series, per_app, total = _compute_statistics(
+            from_date, to_date, aggregation
+        )
+        expected_series, expected_apps = _reference(
+            statistics_db, from_date, to_date, aggregation
+        )
+        _assert_close(time_series, expected_series)
+        _assert_close(per_app, expected_apps, skip_zero=True)
+        assert math.isclose(total, sum(expected_series.values()), abs_tol=1e-6)
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_history_store_matches_sql(statistics_db, seed):
+    rng = random.Random(seed)
+    first_day = datetime.date(2019, 12, 20)
+    _fill(statistics_db, rng, first_day, 500)
+    last_day = first_day + datetime.timedelta(days=499)
+
+    store = history_store.HistoryStore(statistics_db.DB_PATH)
+    try:
+        store.refresh(last_day)
+        assert store.covers(last_day)
+        for _ in range(150):
+            from_date = first_day + datetime.timedelta(days=rng.randint(-40, 499))
+            to_date = min(
+                last_day, from_date + datetime.timedelta(days=rng.randint(0, 300))
+            )
+            aggregation = rng.choice(["day", "week", "month"])
+            expected = statistics_db.get_usage_totals(from_date, to_date, aggregation)
+            actual = store.totals(from_date, to_date, aggregation)
+            _assert_close(actual[0], expected[0])
+            _assert_close(actual[1], expected[1], skip_zero=True)
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize("aggregation", ["day", "week", "month"])
+def test_calendar_covers_range(database, aggregation):
+    from_date = datetime.date(2020, 12, 29)
+    to_date = datetime.date(2021, 3, 2)
+    calendar = database.get_calendar(from_date, to_date, aggregation)
+
+    assert calendar[0][1] == from_date
+    assert calendar[-1][2] == to_date
+    day = from_date
+    for bucket, first, last in calendar:
+        assert first == day
+        assert {_bucket(first, aggregation), _bucket(last, aggregation)} == {bucket}
+        day = last + datetime.timedelta(days=1)
+    assert day == to_date + datetime.timedelta(days=1)
+
+
+def test_cache_sees_changed_closed_days(statistics_db):
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    week_ago = yesterday - datetime.timedelta(days=6)
+    statistics_db.add_daily_usage("editor", 600, week_ago.isoformat())
+    statistics_db.flush(wait=True)
+    assert _compute_statistics(week_ago, yesterday, "day")[2] == 600
+
+    # An interval over midnight is booked on yesterday after the first read.
+    statistics_db.add_daily_usage("editor", 60, yesterday.isoformat())
+    statistics_db.flush(wait=True)
+    time_series, per_app, total = _compute_statistics(week_ago, yesterday, "day")
+    assert total == 660
+    assert time_series[yesterday.isoformat()] == 60
+    assert per_app["editor"] == 660
+
+
+def test_cache_sees_changed_closed_days_without_store(statistics_db, monkeypatch):
+    monkeypatch.setattr(history_store, "_store_failed", True)
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    statistics_db.add_daily_usage("editor", 600, yesterday.isoformat())
+    statistics_db.flush(wait=True)
+    assert _compute_statistics(yesterday, yesterday, "day")[2] == 600
+    hits = StatisticsCache.stats()["hits"]
+
+    statistics_db.add_daily_usage("shell", 60, yesterday.isoformat())
+    statistics_db.flush(wait=True)
+    assert _compute_statistics(yesterday, yesterday, "day")[2] == 660
+    assert StatisticsCache.stats()["hits"] == hits
+
+
+def test_history_version_ignores_today(statistics_db):
+    today = datetime.date.today()
+    version = statistics_db.get_history_version()
+    statistics_db.add_daily_usage("editor", 60, today.isoformat())
+    statistics_db.flush(wait=True)
+    assert statistics_db.get_history_version() == version
+
+    yesterday = today - datetime.timedelta(days=1)
+    statistics_db.add_daily_usage("editor", 60, yesterday.isoformat())
+    statistics_db.flush(wait=True)
+    assert statistics_db.get_history_version() != version
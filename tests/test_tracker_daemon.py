@@ -0,0 +1,99 @@
+"""Tracker bookkeeping of the headless daemon, without any watcher running."""
+
+import datetime
+import os
+
+import pytest
+
+tracker_daemon = pytest.importorskip("tracker_daemon")
+
+MIDNIGHT = datetime.datetime(2026, 3, 2).timestamp()
+
+
+@pytest.fixture
+def daemon(database, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        tracker_daemon, "get_active_window_process", lambda: ("shell", "test")
+    )
+    daemon = tracker_daemon.TrackerDaemon(socket_path=str(tmp_path / "status.sock"))
+    yield daemon
+    os.close(daemon._wake_r)
+    os.close(daemon._wake_w)
+
+
+def _focus(tracker, app, since):
+    tracker.current_process = app
+    tracker.current_method = "test"
+    tracker.last_switch_time = since
+
+
+def test_switch_after_midnight_splits_the_interval(daemon, database):
+    tracker = daemon.tracker
+    _focus(tracker, "editor", MIDNIGHT - 600)
+    tracker.usage_today["editor"] = 3000
+
+    # The first event of the new day comes before the housekeeping tick.
+    daemon._post("focus", None, MIDNIGHT + 60)
+    daemon._handle_events()
+
+    assert dict(tracker.usage_today) == {"editor": 60}
+    assert tracker.current_process == "shell"
+    assert tracker.last_switch_time == MIDNIGHT + 60
+
+    database.flush(wait=True)
+    rows = database.get_daily_usage("2026-03-01", "2026-03-02")
+    assert sorted(rows) == [
+        ("2026-03-01", "editor", pytest.approx(600)),
+        ("2026-03-02", "editor", pytest.approx(60)),
+    ]
+
+
+def test_late_event_from_before_midnight_keeps_today(daemon):
+    tracker = daemon.tracker
+    _focus(tracker, "editor", MIDNIGHT - 600)
+    tracker.roll_over(MIDNIGHT + 5)
+    tracker.usage_today["editor"] = 5
+
+    # Queued just before midnight, handled after the rollover.
+    daemon._post("idle", True, MIDNIGHT - 1)
+    daemon._handle_events()
+
+    assert tracker.usage_today["editor"] == 5
+    assert tracker.idle and tracker.last_switch_time == MIDNIGHT
+
+
+def test_idle_over_midnight_starts_a_new_day(daemon):
+    tracker = daemon.tracker
+    _focus(tracker, "editor", MIDNIGHT - 600)
+    daemon._post("idle", True, MIDNIGHT - 300)
+    daemon._handle_events()
+    assert tracker.usage_today["editor"] == 300
+
+    daemon._post("idle", False, MIDNIGHT + 3600)
+    daemon._handle_events()
+    assert dict(tracker.usage_today) == {}
+    assert tracker.current_process == "shell"
+    assert tracker.last_switch_time == MIDNIGHT + 3600
+
+
+def test_daemon_refuses_while_another_process_tracks(daemon):
+    lock = tracker_daemon.acquire_tracking_lock(
+        tracker_daemon.tracking_lock_path(daemon.socket_path)
+    )
+    assert lock is not None
+    try:
+        assert daemon.run() == 1
+        assert not os.path.exists(daemon.socket_path)
+    finally:
+        os.close(lock)
+
+
+def test_tracking_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / "tracking.lock")
+    first = tracker_daemon.acquire_tracking_lock(path)
+    assert first is not None
+    assert tracker_daemon.acquire_tracking_lock(path) is None
+    os.close(first)
+    second = tracker_daemon.acquire_tracking_lock(path)
+    assert second is not None
+    os.close(second)
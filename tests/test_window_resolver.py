@@ -0,0 +1,39 @@
+"""Window properties are decoded by their X property type."""
+
+import pytest
+
+import window_resolver
+
+
+@pytest.fixture
+def display(monkeypatch):
+    # No X server needed: _get_text only looks at what _get_property returns.
+    display = window_resolver._X11Display.__new__(window_resolver._X11Display)
+    properties = {}
+    monkeypatch.setattr(
+        display, "_get_property", lambda window, atom: properties.get(atom)
+    )
+    return display, properties
+
+
+def test_string_is_latin1(display):
+    display, properties = display
+    raw = "Café Übersicht".encode("latin-1")
+    properties["WM_NAME"] = (8, raw, len(raw), window_resolver._XA_STRING)
+    assert display._get_text(1, "WM_NAME") == "Café Übersicht"
+
+
+def test_utf8_string_is_utf8(display):
+    display, properties = display
+    raw = "Café – Übersicht".encode()
+    properties["_NET_WM_NAME"] = (8, raw, len(raw), 300)
+    assert display._get_text(1, "_NET_WM_NAME") == "Café – Übersicht"
+
+
+def test_window_info_keeps_latin1_title(display):
+    display, properties = display
+    properties["WM_CLASS"] = (8, b"xterm\0XTerm\0", 12, window_resolver._XA_STRING)
+    properties["WM_NAME"] = (8, b"M\xfcller", 7, window_resolver._XA_STRING)
+    info = display.get_window_info(0x400001)
+    assert info["wm_class"] == "xterm"
+    assert info["wm_name"] == "Müller"
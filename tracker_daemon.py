@@ -0,0 +1,523 @@
+#!/home/user/venv/bin/python
+"""Headless tracker: records screen time without the Qt GUI.
+
+Only window_resolver, data_manager and map_resolve are imported, so the
+process stays small. Focus switches, AFK and screen lock are pushed by the
+watcher threads of window_resolver; the main loop sleeps in select() and
+only wakes for those events, status requests and a slow housekeeping tick
+(buffer flush, midnight while nothing happens). Where focus changes cannot
+be watched (xprop fallback) the active window is sampled every second
+instead.
+
+The GUI attaches as a client: ``query_status()`` reads today's numbers,
+including the running interval, from a unix socket. Only one process tracks
+at a time, whichever holds the tracking lock (``acquire_tracking_lock``):
+the daemon refuses to start while the GUI tracks, and the GUI leaves
+tracking to a running daemon until it exits.
+"""
+
+import datetime
+import fcntl
+import json
+import logging
+import os
+import queue
+import select
+import signal
+import socket
+import time
+from collections import defaultdict
+from typing import Optional
+
+import window_resolver
+from data_manager import DataManager
+
+logger = logging.getLogger(__name__)
+
+IS_WAYLAND = os.environ.get("XDG_SESSION_TYPE", "").lower() == "wayland"
+MAPPING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "map.json")
+
+
+def default_socket_path() -> str:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, "screentime.sock")
+    return f"/tmp/screentime-{os.getuid()}.sock"
+
+
+def tracking_lock_path(socket_path: Optional[str] = None) -> str:
+    return (socket_path or default_socket_path()) + ".lock"
+
+
+def acquire_tracking_lock(path: Optional[str] = None) -> Optional[int]:
+    """Take the lock a process must hold while it tracks.
+
+    Returns the file descriptor holding it (closing it releases the lock),
+    or None if another process tracks. The kernel drops the lock when its
+    holder dies, so a crash never leaves it behind.
+    """
+    fd = os.open(path or tracking_lock_path(), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def query_status(path: Optional[str] = None, timeout: float = 0.5) -> Optional[dict]:
+    """Live numbers of a running daemon, or None if none is listening."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path or default_socket_path())
+            data = b""
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+        return json.loads(data)
+    except (OSError, ValueError):
+        return None
+
+
+def get_active_window_process():
+    """Return (raw app key, resolution method) for the focused window."""
+    try:
+        info = window_resolver.get_active_app(mapping_path=MAPPING_PATH)
+    except Exception:
+        logger.exception("Fehler beim Ermitteln des aktiven Fensters:")
+        return "", None
+    name = info.get("app_name") or info.get("app_id")
+    if name:
+        return name, info.get("method")
+    if info.get("proc_path"):
+        return os.path.basename(info["proc_path"]), "proc_path"
+    return "", None
+
+
+class Tracker:
+    """Today's usage and the running focus interval (epoch seconds)."""
+
+    def __init__(self):
+        self.usage_today = defaultdict(float)
+        self.current_process = ""
+        self.current_method = None
+        self.last_switch_time = time.time()
+        self.locked = False
+        self.idle = False
+        today = datetime.date.today().isoformat()
+        for _date, app, seconds in DataManager.get_daily_usage(today, today):
+            self.usage_today[app] += seconds
+
+    @property
+    def paused(self) -> bool:
+        return self.locked or self.idle
+
+    def close_interval(self, now: float):
+        """Account the running interval of the current app up to ``now``."""
+        duration = now - self.last_switch_time
+        if self.current_process and duration > 0:
+            self.usage_today[self.current_process] += duration
+            DataManager.add_focus_interval(
+                self.current_process,
+                self.last_switch_time,
+                now,
+                self.current_method,
+            )
+
+    def switch_process(self, raw_active_app, method, now: float) -> bool:
+        """Close the running interval at ``now`` if the active app changed."""
+        if raw_active_app == self.current_process and self.current_process:
+            return False
+        self.close_interval(now)
+        self.current_process = raw_active_app
+        self.current_method = method
+        self.last_switch_time = now
+        return True
+
+    def sample(self, now: float):
+        if self.paused:
+            return
+        if IS_WAYLAND:
+            # Per-app tracking is not possible there, count the PC as a whole.
+            self.switch_process("Wayland PC", "wayland", now)
+        else:
+            self.switch_process(*get_active_window_process(), now)
+
+    def set_paused(self, locked: bool, idle: bool, now: float):
+        """Stop counting at ``now`` (last input / lock) or resume there."""
+        now = max(now, self.last_switch_time)
+        was_paused = self.paused
+        self.locked, self.idle = locked, idle
+        if self.paused and not was_paused:
+            self.close_interval(now)
+            self.current_process = ""
+            self.last_switch_time = now
+        elif was_paused and not self.paused:
+            self.last_switch_time = now
+            self.sample(now)
+
+    def roll_over(self, now: float):
+        """Book the running interval up to midnight when the day changed.
+
+        Called before anything is booked at ``now``, so no interval reaching
+        over midnight is counted into today.
+        """
+        last = datetime.datetime.fromtimestamp(self.last_switch_time)
+        today = datetime.date.fromtimestamp(now)
+        if last.date() >= today:
+            return
+        midnight = datetime.datetime.combine(today, datetime.time()).timestamp()
+        self.close_interval(midnight)
+        self.usage_today.clear()
+        self.last_switch_time = midnight
+
+    def status(self) -> dict:
+        return {
+            "date": datetime.date.today().isoformat(),
+            "usage": dict(self.usage_today),
+            "current": self.current_process,
+            "method": self.current_method,
+            "since": self.last_switch_time,
+            "locked": self.locked,
+            "idle": self.idle,
+            "pid": os.getpid(),
+        }
+
+
+class TrackerDaemon:
+    # Without a focus watcher the active window is sampled this often.
+    SAMPLE_INTERVAL = 1.0
+    # Otherwise only the write buffer and midnight need looking after.
+    HOUSEKEEPING_INTERVAL = 30.0
+    AFK_MINUTES = 5
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        afk_minutes: float = AFK_MINUTES,
+    ):
+        self.socket_path = socket_path or default_socket_path()
+        self.afk_minutes = afk_minutes
+        self.tracker = Tracker()
+        # (kind, value, time.time()) from the watcher threads
+        self._events: queue.Queue = queue.Queue()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
+        self._running = False
+        self._server: Optional[socket.socket] = None
+        self.focus_watcher = None
+        self.idle_watcher = None
+        self.lock_watcher = None
+
+    # ------------------------------------------------------------------
+    # Watchers
+    # ------------------------------------------------------------------
+
+    def _post(self, kind: str, value, timestamp: float):
+        """Called from the watcher threads."""
+        self._events.put((kind, value, timestamp))
+        try:
+            os.write(self._wake_w, b"\0")
+        except BlockingIOError:
+            pass  # Wake-up already pending.
+
+    def _start_watchers(self):
+        if not IS_WAYLAND:
+            try:
+                self.focus_watcher = window_resolver.FocusWatcher(
+                    lambda ts: self._post("focus", None, ts)
+                )
+                self.focus_watcher.start()
+            except Exception:
+                logger.info("Focus watcher unavailable, polling the active window")
+            if self.afk_minutes > 0:
+                try:
+                    self.idle_watcher = window_resolver.IdleWatcher(
+                        lambda idle, ts: self._post("idle", idle, ts),
+                        self.afk_minutes * 60,
+                    )
+                    self.idle_watcher.start()
+                except Exception:
+                    logger.info("Keine Leerlauf-Erkennung (MIT-SCREEN-SAVER fehlt)")
+        try:
+            self.lock_watcher = window_resolver.LockWatcher(
+                lambda locked, ts: self._post("lock", locked, ts)
+            )
+            self.tracker.locked = self.lock_watcher.locked
+            self.lock_watcher.start()
+        except Exception:
+            logger.info("Keine Sperrbildschirm-Erkennung (gdbus fehlt)")
+
+    def _stop_watchers(self):
+        for watcher in (self.focus_watcher, self.idle_watcher, self.lock_watcher):
+            if watcher is not None:
+                watcher.stop()
+
+    def _handle_events(self):
+        tracker = self.tracker
+        while True:
+            try:
+                kind, value, timestamp = self._events.get_nowait()
+            except queue.Empty:
+                return
+            tracker.roll_over(timestamp)
+            if kind == "focus":
+                if not tracker.paused:
+                    tracker.switch_process(
+                        *get_active_window_process(),
+                        max(timestamp, tracker.last_switch_time),
+                    )
+            elif kind == "idle":
+                tracker.set_paused(tracker.locked, value, timestamp)
+            elif kind == "lock":
+                tracker.set_paused(value, tracker.idle, timestamp)
+
+    # ------------------------------------------------------------------
+    # Status socket
+    # ------------------------------------------------------------------
+
+    def _listen(self):
+        # Holding the tracking lock, so any socket left here is from a crash.
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self._server.listen(4)
+        self._server.setblocking(False)
+
+    def _serve(self):
+        # Today's numbers, even if the day changed since the last event.
+        self.tracker.roll_over(time.time())
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except BlockingIOError:
+                return
+            with conn:
+                try:
+                    conn.settimeout(0.5)
+                    conn.sendall(json.dumps(self.tracker.status()).encode())
+                except OSError:
+                    pass
+
+    # ------------------------------------------------------------------
+    # Main loop
+    # ------------------------------------------------------------------
+
+    def stop(self, *_args):
+        self._running = False
+        try:
+            os.write(self._wake_w, b"\0")
+        except BlockingIOError:
+            pass
+
+    def run(self) -> int:
+        lock = acquire_tracking_lock(tracking_lock_path(self.socket_path))
+        if lock is None:
+            # The GUI or another daemon is counting; both would book every
+            # second twice.
+            logger.error("Es zählt bereits ein Tracker (%s)", self.socket_path)
+            return 1
+        try:
+            self._listen()
+        except OSError:
+            os.close(lock)
+            raise
+        self._running = True
+        self._start_watchers()
+        polling = self.focus_watcher is None and not IS_WAYLAND
+        tracker = self.tracker
+        logger.info("Tracker gestartet, Status unter %s", self.socket_path)
+        try:
+            tracker.sample(time.time())
+            next_tick = time.monotonic()
+            while self._running:
+                interval = (
+                    self.SAMPLE_INTERVAL
+                    if polling and not tracker.paused
+                    else self.HOUSEKEEPING_INTERVAL
+                )
+                timeout = max(0.0, next_tick + interval - time.monotonic())
+                readable, _, _ = select.select(
+                    [self._wake_r, self._server], [], [], timeout
+                )
+                if self._wake_r in readable:
+                    os.read(self._wake_r, 4096)
+                self._handle_events()
+                if self._server in readable:
+                    self._serve()
+                if time.monotonic() >= next_tick + interval:
+                    next_tick = time.monotonic()
+                    now = time.time()
+                    tracker.roll_over(now)
+                    if polling:
+                        tracker.sample(now)
+                    DataManager.maybe_flush()
+        finally:
+            tracker.close_interval(time.time())
+            self._stop_watchers()
+            DataManager.shutdown()
+            self._server.close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+            # Released last, so a GUI taking over finds everything in the
+            # database.
+            os.close(lock)
+            logger.info("Tracker beendet")
+        return 0
+
+
+def _proc_status(pid) -> dict:
+    """VmRSS / RssAnon (kB) and CPU seconds of ``pid`` from /proc."""
+    result = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon"):
+                result[key] = int(value.split()[0])
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rpartition(")")[2].split()
+    result["cpu_s"] = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return result
+
+
+def _children(pid) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def measure(seconds: float, queries: int = 0) -> dict:
+    """Run a daemon on a scratch database and report its footprint.
+
+    ``queries`` status requests are spread over the run, as an attached GUI
+    would send them.
+    """
+    import subprocess
+    import sys
+    import tempfile
+
+    workdir = tempfile.mkdtemp(prefix="screentime-daemon-")
+    sock_path = os.path.join(workdir, "status.sock")
+    db_path = os.path.join(workdir, "usage.db")
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--socket",
+            sock_path,
+            "--db",
+            db_path,
+        ]
+    )
+    try:
+        deadline = time.monotonic() + 10
+        while query_status(sock_path) is None:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("daemon did not start")
+            time.sleep(0.05)
+        start = _proc_status(proc.pid)
+        started = time.monotonic()
+        latencies = []
+        for i in range(queries):
+            time.sleep(max(0.0, started + seconds * i / queries - time.monotonic()))
+            t = time.perf_counter()
+            query_status(sock_path)
+            latencies.append((time.perf_counter() - t) * 1000)
+        time.sleep(max(0.0, started + seconds - time.monotonic()))
+        end = _proc_status(proc.pid)
+        children = [_proc_status(child) for child in _children(proc.pid)]
+        cpu = end["cpu_s"] - start["cpu_s"]
+        return {
+            "seconds": seconds,
+            "rss_kb": end["VmRSS"],
+            "rss_anon_kb": end["RssAnon"],
+            "children": len(children),
+            "children_rss_kb": sum(c["VmRSS"] for c in children),
+            "children_rss_anon_kb": sum(c["RssAnon"] for c in children),
+            "cpu_s": round(cpu, 3),
+            "cpu_percent": round(100 * cpu / seconds, 3),
+            "status_queries": queries,
+            "status_ms": (
+                round(sorted(latencies)[len(latencies) // 2], 3) if latencies else None
+            ),
+        }
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(10)
+        import shutil
+
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Headless Screen Time tracker")
+    parser.add_argument("--socket", help="Status socket path")
+    parser.add_argument("--db", help="Database path (default: usageData.db)")
+    parser.add_argument(
+        "--afk-minutes",
+        type=float,
+        default=TrackerDaemon.AFK_MINUTES,
+        help="Stop counting after this many minutes without input (0: never)",
+    )
+    parser.add_argument(
+        "--status",
+        action="store_true",
+        help="Print the live numbers of the running daemon and exit",
+    )
+    parser.add_argument(
+        "--measure",
+        type=float,
+        metavar="SECONDS",
+        help="Run a daemon on a scratch database and report its RSS and CPU",
+    )
+    parser.add_argument(
+        "--queries",
+        type=int,
+        default=0,
+        help="Status requests to send during --measure",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    if args.status:
+        import map_resolve
+
+        status = query_status(args.socket)
+        if status is None:
+            raise SystemExit("No tracker running")
+        usage = defaultdict(float, status["usage"])
+        if status["current"]:
+            usage[status["current"]] += time.time() - status["since"]
+        mapping = map_resolve.AppMapping(MAPPING_PATH)
+        totals = defaultdict(float)
+        for raw, seconds in usage.items():
+            display_name, _icon = mapping.resolve(raw)
+            totals[display_name.title() if display_name else raw] += seconds
+        for name, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+            print(f"{datetime.timedelta(seconds=int(seconds))!s:>9}  {name}")
+        state = "locked" if status["locked"] else "idle" if status["idle"] else ""
+        print(f"Focused: {status['current'] or '-'} {state}".rstrip())
+    elif args.measure:
+        print(json.dumps(measure(args.measure, args.queries), indent=2))
+    else:
+        if args.db:
+            DataManager.DB_PATH = args.db
+        DataManager.initialize_database()
+        daemon = TrackerDaemon(args.socket, args.afk_minutes)
+        signal.signal(signal.SIGTERM, daemon.stop)
+        signal.signal(signal.SIGINT, daemon.stop)
+        raise SystemExit(daemon.run())
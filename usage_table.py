@@ -0,0 +1,264 @@
+#!/home/user/venv/bin/python
+import datetime
+from typing import Dict, List
+
+from PyQt5 import QtCore, QtWidgets
+
+# Raw process key of a row (the context menu looks the mapping up by it).
+RawKeyRole = QtCore.Qt.UserRole
+# Share of the total as a float in 0..1, on the ratio column.
+RatioRole = QtCore.Qt.UserRole + 1
+
+
+class _Row:
+    __slots__ = ("label", "raw", "icon_hint", "seconds", "icon", "shown_ratio")
+
+    def __init__(self, label, raw, icon_hint, seconds, icon):
+        self.label = label
+        self.raw = raw
+        self.icon_hint = icon_hint
+        self.seconds = seconds
+        self.icon = icon
+        # Ratio as last announced to the view (see _ratio_key).
+        self.shown_ratio = None
+
+
+class UsageTableModel(QtCore.QAbstractTableModel):
+    """Today's usage per display name, sorted by time used.
+
+    ``set_usage`` is called every tick with the raw per-process seconds and
+    diffs them against the rows it already has. Only rows whose time changed
+    (normally just the focused app) and ratio cells whose shown value moved
+    are announced via ``dataChanged``. Icons are fetched when a row is
+    created and again when its icon hint changes, and rows are re-sorted
+    only when a changed row overtakes a neighbour. If the icon manager
+    resolves icons in the background (``iconReady``), a row shows a
+    placeholder until its icon arrives.
+    """
+
+    ICON, APP, TIME, RATIO = range(4)
+    HEADERS = ("", "App", "Time used", "Ratio")
+
+    def __init__(self, app_mapping, icon_manager, parent=None):
+        super().__init__(parent)
+        self.app_mapping = app_mapping
+        self.icon_manager = icon_manager
+        self._rows: List[_Row] = []
+        self._row_of: Dict[str, int] = {}
+        self._usage: Dict[str, float] = {}
+        self._total = 0.0
+        icon_ready = getattr(icon_manager, "iconReady", None)
+        if icon_ready is not None:
+            icon_ready.connect(self._on_icon_ready)
+
+    # ------------------------------------------------------------------
+    # Qt model API
+    # ------------------------------------------------------------------
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = index.column()
+        if role == QtCore.Qt.DisplayRole:
+            if column == self.APP:
+                return row.label
+            if column == self.TIME:
+                return str(datetime.timedelta(seconds=int(row.seconds)))
+            if column == self.RATIO:
+                return f"{self.ratio(index.row()) * 100:.1f}%"
+        elif role == QtCore.Qt.DecorationRole and column == self.ICON:
+            return row.icon
+        elif role == RawKeyRole:
+            return row.raw
+        elif role == RatioRole and column == self.RATIO:
+            return self.ratio(index.row())
+        return None
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def ratio(self, row: int) -> float:
+        return self._rows[row].seconds / self._total if self._total else 0.0
+
+    def total(self) -> float:
+        return self._total
+
+    def invalidate(self):
+        """Rebuild all rows, re-fetching icons (after map.json or icons changed)."""
+        usage = self._usage
+        self.beginResetModel()
+        self._rows = []
+        self._row_of = {}
+        self._total = 0.0
+        self._usage = {}
+        self.endResetModel()
+        self.set_usage(usage)
+
+    def _on_icon_ready(self, app_name: str, icon_hint: str):
+        for i, row in enumerate(self._rows):
+            if row.raw == app_name and (row.icon_hint or "") == icon_hint:
+                row.icon = self.icon_manager.get_icon_for_app(row.raw, row.icon_hint)
+                index = self.index(i, self.ICON)
+                self.dataChanged.emit(index, index)
+
+    def _aggregate(self, usage: Dict[str, float]) -> Dict[str, list]:
+        """Sum raw keys that map to the same display name."""
+        aggregated: Dict[str, list] = {}
+        for raw, seconds in usage.items():
+            # AppMapping.resolve is memoized.
+            display_name, icon_hint = self.app_mapping.resolve(raw)
+            label = display_name.title() if display_name else raw
+            info = aggregated.get(label)
+            if info is None:
+                aggregated[label] = [seconds, raw, icon_hint]
+            else:
+                info[0] += seconds
+        return aggregated
+
+    def set_usage(self, usage: Dict[str, float]):
+        """Show ``usage`` (raw key -> seconds), updating only what changed."""
+        self._usage = dict(usage)
+        aggregated = self._aggregate(usage)
+        total = sum(info[0] for info in aggregated.values())
+        if not total:
+            aggregated = {}
+
+        if any(label not in aggregated for label in self._row_of):
+            # Rows only disappear at midnight; start over.
+            self.beginResetModel()
+            self._rows = []
+            self._row_of = {}
+            self.endResetModel()
+
+        changed: List[int] = []
+        new_labels = [label for label in aggregated if label not in self._row_of]
+        if new_labels:
+            first = len(self._rows)
+            self.beginInsertRows(
+                QtCore.QModelIndex(), first, first + len(new_labels) - 1
+            )
+            for label in new_labels:
+                seconds, raw, icon_hint = aggregated[label]
+                icon = self.icon_manager.get_icon_for_app(raw, icon_hint)
+                self._row_of[label] = len(self._rows)
+                self._rows.append(_Row(label, raw, icon_hint, seconds, icon))
+                changed.append(self._row_of[label])
+            self.endInsertRows()
+
+        new_icons: List[int] = []
+        for label, (seconds, raw, icon_hint) in aggregated.items():
+            i = self._row_of[label]
+            row = self._rows[i]
+            if row.seconds != seconds:
+                row.seconds = seconds
+                changed.append(i)
+            if (row.raw, row.icon_hint) != (raw, icon_hint):
+                # The mapping was edited, e.g. a new icon for the label.
+                row.raw, row.icon_hint = raw, icon_hint
+                row.icon = self.icon_manager.get_icon_for_app(raw, icon_hint)
+                new_icons.append(i)
+
+        self._total = total
+
+        if changed and not self._is_sorted_around(changed):
+            self._sort()
+        else:
+            for i in changed:
+                index = self.index(i, self.TIME)
+                self.dataChanged.emit(index, index)
+            for i in new_icons:
+                index = self.index(i, self.ICON)
+                self.dataChanged.emit(index, index)
+        self._announce_ratios()
+
+    @staticmethod
+    def _ratio_key(ratio: float):
+        # What the view shows: whole percent on the bar, 0.1% as text.
+        return int(ratio * 100), round(ratio * 1000)
+
+    def _announce_ratios(self):
+        """Emit dataChanged for runs of ratio cells whose shown value moved."""
+        first = None
+        for i, row in enumerate(self._rows):
+            key = self._ratio_key(self.ratio(i))
+            if key != row.shown_ratio:
+                row.shown_ratio = key
+                if first is None:
+                    first = i
+            elif first is not None:
+                self._emit_ratio_range(first, i - 1)
+                first = None
+        if first is not None:
+            self._emit_ratio_range(first, len(self._rows) - 1)
+
+    def _emit_ratio_range(self, first: int, last: int):
+        self.dataChanged.emit(
+            self.index(first, self.RATIO), self.index(last, self.RATIO)
+        )
+
+    def _is_sorted_around(self, rows: List[int]) -> bool:
+        for i in rows:
+            seconds = self._rows[i].seconds
+            if i > 0 and self._rows[i - 1].seconds < seconds:
+                return False
+            if i + 1 < len(self._rows) and self._rows[i + 1].seconds > seconds:
+                return False
+        return True
+
+    def _sort(self):
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        moved = [(self._rows[index.row()], index.column()) for index in persistent]
+        self._rows.sort(key=lambda row: row.seconds, reverse=True)
+        self._row_of = {row.label: i for i, row in enumerate(self._rows)}
+        self.changePersistentIndexList(
+            persistent,
+            [self.index(self._row_of[row.label], column) for row, column in moved],
+        )
+        self.layoutChanged.emit()
+
+
+class RatioBarDelegate(QtWidgets.QStyledItemDelegate):
+    """Paints a cell's RatioRole value as a progress bar with its text.
+
+    Used instead of a QProgressBar widget per row, so the number of widgets
+    does not grow with the number of apps.
+    """
+
+    def paint(self, painter, option, index):
+        ratio = index.data(RatioRole)
+        if ratio is None:
+            super().paint(painter, option, index)
+            return
+        widget = option.widget
+        style = widget.style() if widget else QtWidgets.QApplication.style()
+        # Selection / hover background of the cell.
+        style.drawPrimitive(
+            QtWidgets.QStyle.PE_PanelItemViewItem, option, painter, widget
+        )
+
+        bar = QtWidgets.QStyleOptionProgressBar()
+        bar.rect = option.rect.adjusted(2, 2, -2, -2)
+        bar.palette = option.palette
+        bar.state = option.state | QtWidgets.QStyle.State_Horizontal
+        bar.fontMetrics = option.fontMetrics
+        bar.minimum = 0
+        bar.maximum = 100
+        bar.progress = int(ratio * 100)
+        bar.text = index.data() or f"{ratio * 100:.1f}%"
+        bar.textVisible = True
+        bar.textAlignment = QtCore.Qt.AlignCenter
+        style.drawControl(QtWidgets.QStyle.CE_ProgressBar, bar, painter, widget)
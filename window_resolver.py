@@ -1,17 +1,17 @@
 #!/home/user/venv/bin/python
-import configparser
+import ctypes
+import ctypes.util
 import json
 import os
 import re
+import select
 import subprocess
-from typing import Dict, List, Optional, Tuple
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
 
-DESKTOP_DIRS = [
-    os.path.expanduser("~/.local/share/applications"),
-    "/usr/share/applications",
-    "/var/lib/flatpak/exports/share/applications",
-    os.path.expanduser("~/.local/share/flatpak/exports/share/applications"),
-]
+from desktop_index import DesktopEntry, get_desktop_index
+from process_index import get_process_index
 
 # WM_CLASS values that are generic Wine/Proton placeholders.
 # When the active window has one of these, WM_NAME is tried first
@@ -60,7 +60,794 @@ def _run_cmd(cmd: List[str]) -> str:
         return ""
 
 
-def get_active_window_id() -> Optional[str]:
+# ---------------------------------------------------------------------------
+# Native X11 backend
+# ---------------------------------------------------------------------------
+
+_XA_ANY_PROPERTY_TYPE = 0
+_XA_STRING = 31
+_X_SUCCESS = 0
+_X_PROPERTY_NOTIFY = 28
+_X_NO_EVENT_MASK = 0
+_X_PROPERTY_CHANGE_MASK = 1 << 22
+_X_GENERIC_EVENT = 35
+# XInput2: all master devices, raw key / button / motion events.
+_XI_ALL_MASTER_DEVICES = 1
+_XI_RAW_EVENTS = (13, 15, 17)
+
+
+class _XPropertyEvent(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("serial", ctypes.c_ulong),
+        ("send_event", ctypes.c_int),
+        ("display", ctypes.c_void_p),
+        ("window", ctypes.c_ulong),
+        ("atom", ctypes.c_ulong),
+        ("time", ctypes.c_ulong),
+        ("state", ctypes.c_int),
+    ]
+
+
+class _XGenericEventCookie(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("serial", ctypes.c_ulong),
+        ("send_event", ctypes.c_int),
+        ("display", ctypes.c_void_p),
+        ("extension", ctypes.c_int),
+        ("evtype", ctypes.c_int),
+        ("cookie", ctypes.c_uint),
+        ("data", ctypes.c_void_p),
+    ]
+
+
+class _XEvent(ctypes.Union):
+    # XEvent is a union padded to 24 longs.
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("xproperty", _XPropertyEvent),
+        ("xcookie", _XGenericEventCookie),
+        ("pad", ctypes.c_long * 24),
+    ]
+
+
+class _XScreenSaverInfo(ctypes.Structure):
+    _fields_ = [
+        ("window", ctypes.c_ulong),
+        ("state", ctypes.c_int),
+        ("kind", ctypes.c_int),
+        ("til_or_since", ctypes.c_ulong),
+        ("idle", ctypes.c_ulong),  # ms since the last input
+        ("event_mask", ctypes.c_ulong),
+    ]
+
+
+class _XIEventMask(ctypes.Structure):
+    _fields_ = [
+        ("deviceid", ctypes.c_int),
+        ("mask_len", ctypes.c_int),
+        ("mask", ctypes.POINTER(ctypes.c_ubyte)),
+    ]
+
+
+class _X11Display:
+    """A persistent Xlib connection used to read window properties directly.
+
+    Replaces the two ``xprop`` processes that used to be spawned on every
+    tracking tick. Atoms are interned once; each lookup is a couple of
+    round-trips on the already open socket.
+    """
+
+    _xlib = None
+    _error_handler = None
+
+    @classmethod
+    def _load_xlib(cls):
+        if cls._xlib is not None:
+            return cls._xlib
+        path = ctypes.util.find_library("X11")
+        if not path:
+            raise OSError("libX11 not found")
+        xlib = ctypes.cdll.LoadLibrary(path)
+
+        # Must be the first Xlib call: the watcher threads each open their
+        # own display connection.
+        xlib.XInitThreads.argtypes = []
+        xlib.XInitThreads.restype = ctypes.c_int
+        xlib.XInitThreads()
+
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        xlib.XCloseDisplay.restype = ctypes.c_int
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        xlib.XInternAtom.restype = ctypes.c_ulong
+        xlib.XGetWindowProperty.argtypes = [
+            ctypes.c_void_p,  # display
+            ctypes.c_ulong,  # window
+            ctypes.c_ulong,  # property
+            ctypes.c_long,  # long_offset
+            ctypes.c_long,  # long_length
+            ctypes.c_int,  # delete
+            ctypes.c_ulong,  # req_type
+            ctypes.POINTER(ctypes.c_ulong),  # actual_type_return
+            ctypes.POINTER(ctypes.c_int),  # actual_format_return
+            ctypes.POINTER(ctypes.c_ulong),  # nitems_return
+            ctypes.POINTER(ctypes.c_ulong),  # bytes_after_return
+            ctypes.POINTER(ctypes.c_void_p),  # prop_return
+        ]
+        xlib.XGetWindowProperty.restype = ctypes.c_int
+        xlib.XFree.argtypes = [ctypes.c_void_p]
+        xlib.XFree.restype = ctypes.c_int
+        xlib.XSelectInput.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_long]
+        xlib.XSelectInput.restype = ctypes.c_int
+        xlib.XConnectionNumber.argtypes = [ctypes.c_void_p]
+        xlib.XConnectionNumber.restype = ctypes.c_int
+        xlib.XPending.argtypes = [ctypes.c_void_p]
+        xlib.XPending.restype = ctypes.c_int
+        xlib.XNextEvent.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XEvent)]
+        xlib.XNextEvent.restype = ctypes.c_int
+        xlib.XFlush.argtypes = [ctypes.c_void_p]
+        xlib.XFlush.restype = ctypes.c_int
+
+        # The default Xlib error handler terminates the process, which would
+        # happen whenever the focused window disappears between reading
+        # _NET_ACTIVE_WINDOW and reading its properties. Ignore such errors.
+        handler_type = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+        cls._error_handler = handler_type(lambda _dpy, _event: 0)
+        xlib.XSetErrorHandler.argtypes = [handler_type]
+        xlib.XSetErrorHandler.restype = ctypes.c_void_p
+        xlib.XSetErrorHandler(cls._error_handler)
+
+        xlib.XQueryExtension.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_char_p,
+            ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_int),
+        ]
+        xlib.XQueryExtension.restype = ctypes.c_int
+
+        cls._xlib = xlib
+        return xlib
+
+    @staticmethod
+    def _load_extension_lib(name: str):
+        path = ctypes.util.find_library(name)
+        if not path:
+            raise OSError(f"lib{name} not found")
+        return ctypes.cdll.LoadLibrary(path)
+
+    def __init__(self, display_name: Optional[str] = None):
+        self.xlib = self._load_xlib()
+        name = display_name.encode() if display_name else None
+        self.display = self.xlib.XOpenDisplay(name)
+        if not self.display:
+            raise OSError(
+                f"Cannot open X display {display_name or os.environ.get('DISPLAY')!r}"
+            )
+        self.root = self.xlib.XDefaultRootWindow(self.display)
+        self.atoms = {
+            name: self.xlib.XInternAtom(self.display, name.encode(), 0)
+            for name in (
+                "_NET_ACTIVE_WINDOW",
+                "_NET_WM_PID",
+                "_NET_WM_NAME",
+                "WM_CLASS",
+                "WM_NAME",
+            )
+        }
+
+        self._xss = None
+        self._xss_info = None
+        self._xi = None
+        self._xi_opcode: Optional[int] = None
+
+    def close(self):
+        if self.display:
+            self.xlib.XCloseDisplay(self.display)
+            self.display = None
+
+    def idle_seconds(self) -> Optional[float]:
+        """Seconds since the last keyboard or pointer input (MIT-SCREEN-SAVER).
+
+        Returns None if the server or the client lacks the extension.
+        """
+        if self._xss is None:
+            try:
+                xss = self._load_extension_lib("Xss")
+            except OSError:
+                self._xss = False
+                return None
+            xss.XScreenSaverQueryExtension.argtypes = [
+                ctypes.c_void_p,
+                ctypes.POINTER(ctypes.c_int),
+                ctypes.POINTER(ctypes.c_int),
+            ]
+            xss.XScreenSaverQueryExtension.restype = ctypes.c_int
+            xss.XScreenSaverQueryInfo.argtypes = [
+                ctypes.c_void_p,
+                ctypes.c_ulong,
+                ctypes.POINTER(_XScreenSaverInfo),
+            ]
+            xss.XScreenSaverQueryInfo.restype = ctypes.c_int
+            event_base, error_base = ctypes.c_int(), ctypes.c_int()
+            if not xss.XScreenSaverQueryExtension(
+                self.display, ctypes.byref(event_base), ctypes.byref(error_base)
+            ):
+                self._xss = False
+                return None
+            self._xss = xss
+            self._xss_info = _XScreenSaverInfo()
+        if not self._xss:
+            return None
+        if not self._xss.XScreenSaverQueryInfo(
+            self.display, self.root, ctypes.byref(self._xss_info)
+        ):
+            return None
+        return self._xss_info.idle / 1000.0
+
+    def _xinput(self):
+        """libXi with XInput 2 announced to the server, or None."""
+        if self._xi is None:
+            self._xi = False
+            opcode, event, error = ctypes.c_int(), ctypes.c_int(), ctypes.c_int()
+            if not self.xlib.XQueryExtension(
+                self.display,
+                b"XInputExtension",
+                ctypes.byref(opcode),
+                ctypes.byref(event),
+                ctypes.byref(error),
+            ):
+                return None
+            try:
+                xi = self._load_extension_lib("Xi")
+            except OSError:
+                return None
+            xi.XIQueryVersion.argtypes = [
+                ctypes.c_void_p,
+                ctypes.POINTER(ctypes.c_int),
+                ctypes.POINTER(ctypes.c_int),
+            ]
+            xi.XIQueryVersion.restype = ctypes.c_int
+            xi.XISelectEvents.argtypes = [
+                ctypes.c_void_p,
+                ctypes.c_ulong,
+                ctypes.POINTER(_XIEventMask),
+                ctypes.c_int,
+            ]
+            xi.XISelectEvents.restype = ctypes.c_int
+            major, minor = ctypes.c_int(2), ctypes.c_int(0)
+            if xi.XIQueryVersion(
+                self.display, ctypes.byref(major), ctypes.byref(minor)
+            ):
+                return None
+            self._xi = xi
+            self._xi_opcode = opcode.value
+        return self._xi or None
+
+    def watch_raw_input(self, enable: bool = True) -> bool:
+        """(Un)select XInput2 raw key, button and motion events on the root.
+
+        Returns False if XInput 2 is not available.
+        """
+        xi = self._xinput()
+        if xi is None:
+            return False
+        bits = (ctypes.c_ubyte * 4)()
+        if enable:
+            for event in _XI_RAW_EVENTS:
+                bits[event >> 3] |= 1 << (event & 7)
+        mask = _XIEventMask(_XI_ALL_MASTER_DEVICES, len(bits), bits)
+        xi.XISelectEvents(self.display, self.root, ctypes.byref(mask), 1)
+        self.xlib.XFlush(self.display)
+        return True
+
+    def pending_input_events(self) -> bool:
+        """Drain the event queue; return whether it held raw input events."""
+        seen = False
+        event = _XEvent()
+        while self.xlib.XPending(self.display):
+            self.xlib.XNextEvent(self.display, ctypes.byref(event))
+            if (
+                event.type == _X_GENERIC_EVENT
+                and event.xcookie.extension == self._xi_opcode
+            ):
+                seen = True
+        return seen
+
+    def fileno(self) -> int:
+        return self.xlib.XConnectionNumber(self.display)
+
+    def watch_properties(self, window: int, enable: bool = True):
+        mask = _X_PROPERTY_CHANGE_MASK if enable else _X_NO_EVENT_MASK
+        self.xlib.XSelectInput(self.display, window, mask)
+        self.xlib.XFlush(self.display)
+
+    def pending_property_events(self):
+        """Yield (window, atom) for every PropertyNotify already queued."""
+        event = _XEvent()
+        while self.xlib.XPending(self.display):
+            self.xlib.XNextEvent(self.display, ctypes.byref(event))
+            if event.type == _X_PROPERTY_NOTIFY:
+                yield event.xproperty.window, event.xproperty.atom
+
+    def _get_property(self, window: int, atom_name: str):
+        """Return (format, raw bytes, item count, type atom) of a window
+        property, or None."""
+        actual_type = ctypes.c_ulong()
+        actual_format = ctypes.c_int()
+        nitems = ctypes.c_ulong()
+        bytes_after = ctypes.c_ulong()
+        prop = ctypes.c_void_p()
+        status = self.xlib.XGetWindowProperty(
+            self.display,
+            window,
+            self.atoms[atom_name],
+            0,
+            1024,
+            0,
+            _XA_ANY_PROPERTY_TYPE,
+            ctypes.byref(actual_type),
+            ctypes.byref(actual_format),
+            ctypes.byref(nitems),
+            ctypes.byref(bytes_after),
+            ctypes.byref(prop),
+        )
+        if status != _X_SUCCESS or not prop.value:
+            return None
+        try:
+            if actual_type.value == 0 or nitems.value == 0:
+                return None
+            fmt = actual_format.value
+            # Xlib returns 32-bit items as C longs.
+            item_size = {
+                8: 1,
+                16: ctypes.sizeof(ctypes.c_short),
+                32: ctypes.sizeof(ctypes.c_long),
+            }[fmt]
+            raw = ctypes.string_at(prop.value, item_size * nitems.value)
+            return fmt, raw, nitems.value, actual_type.value
+        except KeyError:
+            return None
+        finally:
+            self.xlib.XFree(prop)
+
+    def _get_cardinal(self, window: int, atom_name: str) -> Optional[int]:
+        res = self._get_property(window, atom_name)
+        if not res or res[0] != 32:
+            return None
+        return ctypes.c_ulong.from_buffer_copy(
+            res[1][: ctypes.sizeof(ctypes.c_ulong)]
+        ).value
+
+    def _get_text(self, window: int, atom_name: str) -> Optional[str]:
+        res = self._get_property(window, atom_name)
+        if not res or res[0] != 8:
+            return None
+        # Legacy STRING properties (WM_NAME of older clients) are Latin-1,
+        # UTF8_STRING and anything else is read as UTF-8.
+        if res[3] == _XA_STRING:
+            return res[1].decode("latin-1")
+        return res[1].decode(errors="ignore")
+
+    def get_active_window(self) -> Optional[int]:
+        win = self._get_cardinal(self.root, "_NET_ACTIVE_WINDOW")
+        return win or None
+
+    def get_window_info(self, window: int) -> Dict[str, Optional[str]]:
+        # WM_CLASS is "instance\0class\0"; xprop's first quoted value is the
+        # instance name, keep returning that.
+        wm_class = None
+        raw_class = self._get_text(window, "WM_CLASS")
+        if raw_class:
+            wm_class = raw_class.split("\0", 1)[0] or None
+
+        pid = self._get_cardinal(window, "_NET_WM_PID")
+        wm_name = self._get_text(window, "WM_NAME") or None
+
+        return {
+            "window": hex(window),
+            "wm_class": wm_class,
+            "wm_pid": str(pid) if pid else None,
+            "wm_name": wm_name,
+        }
+
+
+_x11: Optional[_X11Display] = None
+_x11_failed = False
+
+
+def _get_x11() -> Optional[_X11Display]:
+    """Return the shared X connection, or None if the display can't be opened."""
+    global _x11, _x11_failed
+    if _x11 is None and not _x11_failed:
+        try:
+            _x11 = _X11Display()
+        except Exception:
+            # No X server (or no libX11), stay on the xprop path for good.
+            _x11_failed = True
+    return _x11
+
+
+class FocusWatcher(threading.Thread):
+    """Calls ``callback(timestamp)`` whenever the focused window or its title changes.
+
+    Uses its own X connection and listens for PropertyNotify on the root
+    window (_NET_ACTIVE_WINDOW) and on the currently active window (WM_NAME /
+    _NET_WM_NAME), so nothing is sampled while the focus stays put; the
+    thread only wakes for those events and for stop(). ``timestamp`` is the
+    ``time.time()`` at which the event was read.
+    Raises OSError from the constructor if the display can't be opened.
+    """
+
+    def __init__(self, callback, display_name: Optional[str] = None):
+        super().__init__(name="FocusWatcher", daemon=True)
+        self.callback = callback
+        self._x11 = _X11Display(display_name)
+        self._quit = threading.Event()
+        self._wake_r, self._wake_w = os.pipe()
+        self._active: Optional[int] = None
+        self._title_atoms = (
+            self._x11.atoms["WM_NAME"],
+            self._x11.atoms["_NET_WM_NAME"],
+        )
+
+    def stop(self):
+        self._quit.set()
+        try:
+            os.write(self._wake_w, b"\0")
+        except OSError:
+            pass  # Already stopped.
+
+    def _follow_active_window(self):
+        if self._active:
+            self._x11.watch_properties(self._active, False)
+        self._active = self._x11.get_active_window()
+        if self._active:
+            self._x11.watch_properties(self._active)
+
+    def run(self):
+        x11 = self._x11
+        active_atom = x11.atoms["_NET_ACTIVE_WINDOW"]
+        x11.watch_properties(x11.root)
+        self._follow_active_window()
+        fd = x11.fileno()
+        try:
+            while not self._quit.is_set():
+                # Replies to our own requests may have queued events already;
+                # only block when there are none. stop() writes to the pipe.
+                if not x11.xlib.XPending(x11.display):
+                    readable, _, _ = select.select([fd, self._wake_r], [], [])
+                    if self._wake_r in readable:
+                        os.read(self._wake_r, 64)
+                        continue
+                changed = False
+                for window, atom in x11.pending_property_events():
+                    if window == x11.root and atom == active_atom:
+                        self._follow_active_window()
+                        changed = True
+                    elif window == self._active and atom in self._title_atoms:
+                        changed = True
+                if changed:
+                    self.callback(time.time())
+        finally:
+            x11.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+
+
+class IdleWatcher(threading.Thread):
+    """Calls ``callback(idle, timestamp)`` when the user goes AFK and comes back.
+
+    The user is idle after ``threshold`` seconds without keyboard or pointer
+    input, as the MIT-SCREEN-SAVER extension counts it. ``timestamp`` is the
+    ``time.time()`` of the last input when going idle and of the first input
+    when coming back, so neither depends on when the thread woke up.
+
+    While the user is active the thread only wakes when the threshold could
+    have been reached. While idle it blocks on XInput2 raw input events and
+    reports the first one; without XInput2 it checks every IDLE_POLL
+    seconds. Either way the idle time is re-read every RECHECK seconds,
+    since video players reset it without any input. Raises OSError from
+    the constructor if the display or the extension is unavailable.
+    """
+
+    IDLE_POLL = 5.0
+    RECHECK = 60.0
+
+    def __init__(self, callback, threshold: float, display_name: Optional[str] = None):
+        super().__init__(name="IdleWatcher", daemon=True)
+        self.callback = callback
+        self.threshold = threshold
+        self._x11 = _X11Display(display_name)
+        if self._x11.idle_seconds() is None:
+            self._x11.close()
+            raise OSError("MIT-SCREEN-SAVER extension not available")
+        self._quit = threading.Event()
+        self._wake_r, self._wake_w = os.pipe()
+        self.idle = False
+
+    def _wake(self):
+        try:
+            os.write(self._wake_w, b"\0")
+        except OSError:
+            pass  # Already stopped.
+
+    def set_threshold(self, threshold: float):
+        self.threshold = threshold
+        self._wake()
+
+    def stop(self):
+        self._quit.set()
+        self._wake()
+
+    def _wait(self, timeout: Optional[float], fds=()) -> bool:
+        """Sleep until ``timeout``, an fd is readable or stop()/set_threshold().
+
+        Returns whether one of ``fds`` became readable.
+        """
+        readable, _, _ = select.select([self._wake_r, *fds], [], [], timeout)
+        if self._wake_r in readable:
+            os.read(self._wake_r, 64)
+        return any(fd in readable for fd in fds)
+
+    def _wait_for_idle(self) -> Optional[float]:
+        """Block until the user is idle; return the time of the last input."""
+        while not self._quit.is_set():
+            idle = self._x11.idle_seconds()
+            if idle is None:
+                return None
+            if idle >= self.threshold:
+                return time.time() - idle
+            self._wait(self.threshold - idle)
+        return None
+
+    def _wait_for_input(self) -> Optional[float]:
+        """Block until the next input; return its time."""
+        x11 = self._x11
+        raw = x11.watch_raw_input()
+        try:
+            last_idle = 0.0
+            while not self._quit.is_set():
+                # Checked after selecting the events, so input that came in
+                # between is not missed.
+                idle = x11.idle_seconds()
+                if idle is None:
+                    return None
+                if idle < last_idle or idle < self.threshold:
+                    return time.time() - idle
+                last_idle = idle
+                if raw:
+                    if (
+                        self._wait(self.RECHECK, [x11.fileno()])
+                        and x11.pending_input_events()
+                    ):
+                        return time.time()
+                else:
+                    self._wait(self.IDLE_POLL)
+        finally:
+            if raw:
+                x11.watch_raw_input(False)
+                x11.pending_input_events()
+        return None
+
+    def run(self):
+        try:
+            while not self._quit.is_set():
+                since = self._wait_for_idle()
+                if since is None:
+                    break
+                self.idle = True
+                self.callback(True, since)
+                back = self._wait_for_input()
+                if back is None:
+                    break
+                self.idle = False
+                self.callback(False, back)
+        finally:
+            self._x11.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+
+
+# Screen savers that send ActiveChanged(b), watched by LockWatcher here and by
+# screen_lock.ScreenLockMonitor in the GUI.
+SCREENSAVERS = (
+    ("org.gnome.ScreenSaver", "/org/gnome/ScreenSaver"),
+    ("org.freedesktop.ScreenSaver", "/org/freedesktop/ScreenSaver"),
+    # KDE also exports the interface at the root-level path.
+    ("org.freedesktop.ScreenSaver", "/ScreenSaver"),
+)
+LOGIND = "org.freedesktop.login1"
+
+
+def logind_session_path(session_id: str) -> str:
+    """Object path of a logind session, escaped the way logind does it."""
+    label = "".join(
+        c if c.isascii() and (c.isalpha() or (c.isdigit() and i)) else f"_{ord(c):02x}"
+        for i, c in enumerate(session_id)
+    )
+    return "/org/freedesktop/login1/session/" + (label or "_")
+
+
+class LockWatcher(threading.Thread):
+    """Calls ``callback(locked, timestamp)`` when the screen locks or unlocks.
+
+    The Qt-free counterpart of screen_lock.ScreenLockMonitor, for processes
+    without an event loop. screen_lock can't be reused here: it talks to
+    D-Bus through QtDBus, and the tracking daemon must not import Qt. Both
+    watch the same sources, though: ActiveChanged of every SCREENSAVERS
+    entry and Lock/Unlock/LockedHint of our logind session. One ``gdbus
+    monitor`` child per source prints its signals and this thread blocks
+    reading them. The screen counts as locked while any source says so.
+    ``session_address`` / ``system_address`` replace the user's buses,
+    ``session_path`` the logind session of $XDG_SESSION_ID.
+    Raises OSError from the constructor if gdbus is missing.
+    """
+
+    _SIGNALS = re.compile(
+        r"\.(?:ActiveChanged \((?P<active>true|false),"
+        r"|Session\.(?P<lock>Lock|Unlock) \(\)"
+        r"|Properties\.PropertiesChanged .*'LockedHint': <+(?P<hint>true|false)>)"
+    )
+
+    def __init__(
+        self,
+        callback,
+        session_address: Optional[str] = None,
+        system_address: Optional[str] = None,
+        session_path: Optional[str] = None,
+    ):
+        super().__init__(name="LockWatcher", daemon=True)
+        self.callback = callback
+        self._session = (
+            ["--address", session_address] if session_address else ["--session"]
+        )
+        self._system = ["--address", system_address] if system_address else ["--system"]
+        self._session_path = session_path
+        self._procs: Dict[int, Tuple[str, subprocess.Popen]] = {}
+        self._sources: Dict[str, bool] = {}
+        self._quit = threading.Event()
+        self._wake_r, self._wake_w = os.pipe()
+        self.locked = False
+        try:
+            self._start_monitors()
+        except OSError:
+            self._close()
+            raise
+
+    def _gdbus(self, bus: List[str], *args: str) -> str:
+        return _run_cmd(["gdbus", "call", *bus, "--timeout", "1", *args])
+
+    def _monitor(self, source: str, bus: List[str], dest: str, path=None):
+        cmd = ["gdbus", "monitor", *bus, "--dest", dest]
+        if path:
+            cmd += ["--object-path", path]
+        proc = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0
+        )
+        self._procs[proc.stdout.fileno()] = (source, proc)
+        self._sources[source] = False
+
+    def _own_session_path(self) -> Optional[str]:
+        session_id = os.environ.get("XDG_SESSION_ID")
+        if session_id:
+            return logind_session_path(session_id)
+        out = self._gdbus(
+            self._system,
+            "--dest",
+            LOGIND,
+            "--object-path",
+            "/org/freedesktop/login1",
+            "--method",
+            LOGIND + ".Manager.GetSessionByPID",
+            str(os.getpid()),
+        )
+        m = re.search(r"'(/org/freedesktop/login1/session/[^']+)'", out)
+        return m.group(1) if m else None
+
+    def _start_monitors(self):
+        # The screen savers may start after us; gdbus monitor waits for them.
+        for service, obj_path in SCREENSAVERS:
+            self._monitor(service, self._session, service, obj_path)
+        path = self._session_path or self._own_session_path()
+        if path:
+            self._monitor(LOGIND, self._system, LOGIND, path)
+
+        # Current state, asked once.
+        for service, obj_path in SCREENSAVERS:
+            out = self._gdbus(
+                self._session,
+                "--dest",
+                service,
+                "--object-path",
+                obj_path,
+                "--method",
+                service + ".GetActive",
+            )
+            if "true" in out:
+                self._sources[service] = True
+        if path:
+            out = self._gdbus(
+                self._system,
+                "--dest",
+                LOGIND,
+                "--object-path",
+                path,
+                "--method",
+                "org.freedesktop.DBus.Properties.Get",
+                LOGIND + ".Session",
+                "LockedHint",
+            )
+            self._sources[LOGIND] = "true" in out
+        self.locked = any(self._sources.values())
+
+    def stop(self):
+        self._quit.set()
+        try:
+            os.write(self._wake_w, b"\0")
+        except OSError:
+            pass  # Already stopped.
+
+    def _set(self, source: str, locked: bool):
+        self._sources[source] = locked
+        state = any(self._sources.values())
+        if state != self.locked:
+            self.locked = state
+            self.callback(state, time.time())
+
+    def _handle(self, source: str, line: str):
+        m = self._SIGNALS.search(line)
+        if m is None:
+            return
+        if m.group("active"):
+            if source != LOGIND:
+                self._set(source, m.group("active") == "true")
+        elif source == LOGIND:
+            self._set(source, (m.group("lock") or m.group("hint")) in ("Lock", "true"))
+
+    def run(self):
+        buffers = {fd: b"" for fd in self._procs}
+        try:
+            while not self._quit.is_set() and buffers:
+                readable, _, _ = select.select([self._wake_r, *buffers], [], [])
+                for fd in readable:
+                    if fd == self._wake_r:
+                        continue
+                    chunk = os.read(fd, 4096)
+                    if not chunk:
+                        # That monitor died; the others carry on.
+                        del buffers[fd]
+                        continue
+                    *lines, buffers[fd] = (buffers[fd] + chunk).split(b"\n")
+                    for line in lines:
+                        self._handle(self._procs[fd][0], line.decode(errors="ignore"))
+        finally:
+            self._close()
+
+    def _close(self):
+        for _source, proc in self._procs.values():
+            proc.kill()
+            proc.wait()
+            proc.stdout.close()
+        self._procs.clear()
+        for fd in (self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+# ---------------------------------------------------------------------------
+# xprop fallback
+# ---------------------------------------------------------------------------
+
+
+def _get_active_window_id_xprop() -> Optional[str]:
     out = _run_cmd(["xprop", "-root", "_NET_ACTIVE_WINDOW"])
     if not out:
         return None
@@ -82,8 +869,8 @@ def _extract_first_quoted(s: str) -> Optional[str]:
     return m.group(1) if m else None
 
 
-def get_active_window_info() -> Dict[str, Optional[str]]:
-    win = get_active_window_id()
+def _get_active_window_info_xprop() -> Dict[str, Optional[str]]:
+    win = _get_active_window_id_xprop()
     if not win:
         return {"window": None, "wm_class": None, "wm_pid": None, "wm_name": None}
 
@@ -106,123 +893,194 @@ def get_active_window_info() -> Dict[str, Optional[str]]:
     return {"window": win, "wm_class": wm_class, "wm_pid": wm_pid, "wm_name": wm_name}
 
 
+def get_active_window_id() -> Optional[str]:
+    x11 = _get_x11()
+    if x11 is not None:
+        win = x11.get_active_window()
+        return hex(win) if win else None
+    return _get_active_window_id_xprop()
+
+
+def get_active_window_info() -> Dict[str, Optional[str]]:
+    x11 = _get_x11()
+    if x11 is None:
+        return _get_active_window_info_xprop()
+    win = x11.get_active_window()
+    if not win:
+        return {"window": None, "wm_class": None, "wm_pid": None, "wm_name": None}
+    return x11.get_window_info(win)
+
+
 def _get_steam_app_id_from_environ(pid: str) -> Optional[str]:
-    """Read SteamAppId from /proc/{pid}/environ.
+    """SteamAppId from the environment of process ``pid``.
 
     Steam sets this env-var for every Proton game process, so it is the
     most reliable way to identify which game is running under Wine.
     """
-    try:
-        with open(f"/proc/{pid}/environ", "rb") as f:
-            env = f.read().decode(errors="ignore")
-        for var in env.split("\0"):
-            if var.startswith("SteamAppId="):
-                app_id = var.split("=", 1)[1].strip()
-                if app_id and app_id.isdigit() and app_id != "0":
-                    return app_id
-    except Exception:
-        pass
-    return None
+    index = get_process_index()
+    proc = index.get(pid) if index is not None else None
+    return proc.steam_app_id if proc else None
 
 
 def resolve_proc_from_pid(pid: str) -> Optional[Dict[str, str]]:
-    try:
-        exe_path = os.readlink(f"/proc/{pid}/exe")
-    except Exception:
-        exe_path = None
-    cmdline = None
-    try:
-        with open(f"/proc/{pid}/cmdline", "rb") as f:
-            raw = f.read()
-            if raw:
-                cmdline = raw.replace(b"\x00", b" ").decode(errors="ignore").strip()
-    except Exception:
-        cmdline = None
-    if exe_path or cmdline:
-        return {"exe": exe_path, "cmdline": cmdline}
+    index = get_process_index()
+    proc = index.get(pid) if index is not None else None
+    if proc and (proc.exe or proc.cmdline):
+        return {"exe": proc.exe, "cmdline": proc.cmdline}
     return None
 
 
-def parse_desktop_file(path: str) -> Dict[str, str]:
-    cp = configparser.ConfigParser(interpolation=None)
-    try:
-        cp.read(path, encoding="utf-8")
-    except Exception:
-        return {}
-    if "Desktop Entry" not in cp:
-        return {}
-    entry = cp["Desktop Entry"]
-    return {
-        "StartupWMClass": entry.get("StartupWMClass", "").strip(),
-        "Name": entry.get("Name", "").strip(),
-        "Exec": entry.get("Exec", "").strip(),
-    }
+def _desktop_result(entry: DesktopEntry) -> Tuple[str, str]:
+    return entry.file_id, entry.name or entry.file_id
 
 
-# Module-level cache for .desktop file contents so we don't re-parse
-# every file on every call to find_desktop_for_wm_class.
-_desktop_cache: Optional[List[Tuple[str, dict]]] = None
-
-
-def _get_desktop_candidates() -> List[Tuple[str, dict]]:
-    global _desktop_cache
-    if _desktop_cache is not None:
-        return _desktop_cache
-    candidates = []
-    for d in DESKTOP_DIRS:
-        if not os.path.isdir(d):
-            continue
-        try:
-            for fn in os.listdir(d):
-                if not fn.endswith(".desktop"):
-                    continue
-                path = os.path.join(d, fn)
-                info = parse_desktop_file(path)
-                if info:
-                    candidates.append((fn, info))
-        except Exception:
-            continue
-    _desktop_cache = candidates
-    return _desktop_cache
-
-
-def find_desktop_for_wm_class(
-    wm_class: Optional[str], wm_name: Optional[str] = None
+def _find_desktop_linear(
+    candidates: List[DesktopEntry], wm_class: Optional[str], wm_name: Optional[str]
 ) -> Optional[Tuple[str, str]]:
+    """Reference implementation of find_desktop_for_wm_class (four scans).
+
+    Kept to check _DesktopMatcher against (tests/test_desktop_matcher.py).
+    """
     if not wm_class and not wm_name:
         return None
 
-    candidates = _get_desktop_candidates()
-
     # 1) StartupWMClass exact
     if wm_class:
-        for fn, info in candidates:
-            if info.get("StartupWMClass") and info["StartupWMClass"] == wm_class:
-                return fn[:-8], info.get("Name") or fn[:-8]
+        for entry in candidates:
+            if entry.startup_wm_class and entry.startup_wm_class == wm_class:
+                return _desktop_result(entry)
 
     # 2) Name exact with wm_name
     if wm_name:
-        for fn, info in candidates:
-            if info.get("Name") and info["Name"] == wm_name:
-                return fn[:-8], info.get("Name") or fn[:-8]
+        for entry in candidates:
+            if entry.name and entry.name == wm_name:
+                return _desktop_result(entry)
 
     # 3) filename contains wm_class or startswith
     if wm_class:
         lc = wm_class.lower()
-        for fn, info in candidates:
-            base = fn[:-8].lower()
+        for entry in candidates:
+            base = entry.file_id.lower()
             if lc in base or base.startswith(lc):
-                return fn[:-8], info.get("Name") or fn[:-8]
+                return _desktop_result(entry)
 
     # 4) Exec contains wm_class
     if wm_class:
-        for fn, info in candidates:
-            if info.get("Exec") and wm_class in info["Exec"]:
-                return fn[:-8], info.get("Name") or fn[:-8]
+        for entry in candidates:
+            if entry.exec and wm_class in entry.exec:
+                return _desktop_result(entry)
 
     return None
 
 
+def _trigrams(text: str) -> Set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class _DesktopMatcher:
+    """Lookup tables for find_desktop_for_wm_class over one index generation.
+
+    The exact tiers (StartupWMClass, Name) are dicts holding the first entry
+    per value. The substring tiers (file name, Exec) use a trigram index over
+    the lower-cased text: the entries sharing all trigrams of the needle are
+    checked against the original condition in index order, so the first hit
+    is the one a linear scan would return. Results are memoized per
+    (wm_class, wm_name).
+    """
+
+    MEMO_SIZE = 1024
+
+    def __init__(self, candidates: List[DesktopEntry], generation: int):
+        self.candidates = candidates
+        self.generation = generation
+        self._by_wm_class: Dict[str, DesktopEntry] = {}
+        self._by_name: Dict[str, DesktopEntry] = {}
+        self._file_ids = [entry.file_id.lower() for entry in candidates]
+        # trigram -> ascending candidate positions
+        self._file_grams: Dict[str, List[int]] = {}
+        self._exec_grams: Dict[str, List[int]] = {}
+        self._memo: Dict[tuple, Optional[Tuple[str, str]]] = {}
+        for i, entry in enumerate(candidates):
+            if entry.startup_wm_class:
+                self._by_wm_class.setdefault(entry.startup_wm_class, entry)
+            if entry.name:
+                self._by_name.setdefault(entry.name, entry)
+            for gram in _trigrams(self._file_ids[i]):
+                self._file_grams.setdefault(gram, []).append(i)
+            for gram in _trigrams(entry.exec.lower()):
+                self._exec_grams.setdefault(gram, []).append(i)
+
+    def _first(self, grams: Dict[str, List[int]], needle: str, matches):
+        """First candidate position satisfying ``matches`` among those
+        containing every trigram of ``needle`` (all of them if it is short)."""
+        if len(needle) < 3:
+            positions = range(len(self.candidates))
+        else:
+            postings = []
+            for gram in _trigrams(needle):
+                posting = grams.get(gram)
+                if posting is None:
+                    return None
+                postings.append(posting)
+            postings.sort(key=len)
+            common = set(postings[0])
+            for posting in postings[1:]:
+                common.intersection_update(posting)
+            positions = sorted(common)
+        for i in positions:
+            if matches(i):
+                return i
+        return None
+
+    def _find(self, wm_class, wm_name) -> Optional[Tuple[str, str]]:
+        if wm_class and wm_class in self._by_wm_class:
+            return _desktop_result(self._by_wm_class[wm_class])
+        if wm_name and wm_name in self._by_name:
+            return _desktop_result(self._by_name[wm_name])
+        if not wm_class:
+            return None
+        lc = wm_class.lower()
+        i = self._first(self._file_grams, lc, lambda i: lc in self._file_ids[i])
+        if i is None:
+            i = self._first(
+                self._exec_grams, lc, lambda i: wm_class in self.candidates[i].exec
+            )
+        return _desktop_result(self.candidates[i]) if i is not None else None
+
+    def find(self, wm_class, wm_name) -> Optional[Tuple[str, str]]:
+        key = (wm_class, wm_name)
+        if key in self._memo:
+            return self._memo[key]
+        result = self._find(wm_class, wm_name)
+        if len(self._memo) >= self.MEMO_SIZE:
+            # Window titles change constantly; don't let them pile up.
+            self._memo.clear()
+        self._memo[key] = result
+        return result
+
+
+_desktop_matcher: Optional[_DesktopMatcher] = None
+
+
+def find_desktop_for_wm_class(
+    wm_class: Optional[str], wm_name: Optional[str] = None
+) -> Optional[Tuple[str, str]]:
+    global _desktop_matcher
+    if not wm_class and not wm_name:
+        return None
+
+    # Generation and entries of the same refresh; icon workers may refresh
+    # the index concurrently.
+    generation, entries = get_desktop_index().snapshot()
+    matcher = _desktop_matcher
+    if matcher is None or matcher.generation != generation:
+        matcher = _DesktopMatcher(
+            [entry for entry in entries if entry.valid], generation
+        )
+        _desktop_matcher = matcher
+    return matcher.find(wm_class, wm_name)
+
+
 def load_mapping(path: Optional[str]) -> Dict[str, str]:
     if not path:
         return {}
@@ -328,17 +1186,44 @@ def get_active_app(mapping_path: Optional[str] = None) -> Dict[str, Optional[str
 if __name__ == "__main__":
     import argparse
     import pprint
-    import time
 
     parser = argparse.ArgumentParser(description="Active window resolver test")
     parser.add_argument("--mapping", help="Path to json File", default=None)
+    parser.add_argument(
+        "--xprop",
+        action="store_true",
+        help="Use the xprop fallback instead of the native X11 connection",
+    )
     parser.add_argument(
         "--delay",
         type=int,
         default=3,
         help="Seconds to wait before capturing (default: 3)",
     )
+    parser.add_argument(
+        "--idle",
+        type=float,
+        metavar="SECONDS",
+        help="Report going AFK after SECONDS without input and coming back",
+    )
     args = parser.parse_args()
+    if args.idle is not None:
+        watcher = IdleWatcher(
+            lambda idle, ts: print(
+                time.strftime("%H:%M:%S", time.localtime(ts)),
+                "idle" if idle else "back",
+            ),
+            args.idle,
+        )
+        print(f"Idle for {watcher._x11.idle_seconds():.1f}s, Ctrl+C to stop")
+        watcher.start()
+        try:
+            watcher.join()
+        except KeyboardInterrupt:
+            watcher.stop()
+        raise SystemExit(0)
+    if args.xprop:
+        _x11_failed = True
 
     print(f"Switching to the target window... capturing in {args.delay}s")
     for i in range(args.delay, 0, -1):